@@ -2,7 +2,35 @@
 
 from __future__ import annotations
 
-from constants.constants import DEFAULT_WEBSOCKET_PORT, DEFAULT_SERVICES_DIRECTORY_PATH, DEFAULT_LOGGING_LEVEL, DEFAULT_LOGGING_FILENAME, DEFAULT_LOGGING_DIRECTORY
+from constants.constants import (
+    DEFAULT_WEBSOCKET_PORT,
+    DEFAULT_SERVICES_DIRECTORY_PATH,
+    DEFAULT_LOGGING_LEVEL,
+    DEFAULT_LOGGING_FILENAME,
+    DEFAULT_LOGGING_DIRECTORY,
+    DEFAULT_LOGGING_MAX_BYTES,
+    DEFAULT_LOGGING_BACKUP_COUNT,
+    DEFAULT_SERVICE_QUEUE_SIZE,
+    DEFAULT_SERVICE_QUEUE_POLICY,
+    DEFAULT_SLOW_CLIENT_MAX_PENDING_PACKETS,
+    DEFAULT_DISTANCE_SENSORS,
+    DEFAULT_SERVICE_FILTERS,
+    DEFAULT_PROCESS_SERVICES,
+    DEFAULT_RECORDING_DIRECTORY,
+    DEFAULT_HARDWARE_BACKEND,
+    DEFAULT_SIMULATED_ECHOES,
+    DEFAULT_SIMULATED_STALL_PROBABILITY,
+    DEFAULT_PROFILING_DURATION,
+    DEFAULT_WEBSOCKET_WORKERS,
+    DEFAULT_HUB_SOCKET_PATH,
+    DEFAULT_CAMERA_SOURCE,
+    DEFAULT_CAMERA_RESOLUTION,
+    DEFAULT_CAMERA_RATE,
+    DEFAULT_COMMAND_QUEUE_SIZE,
+    DEFAULT_REPLAY_RING_SIZE,
+    DEFAULT_SESSION_LINGER_SECONDS,
+    DEFAULT_HISTORY_SIZE,
+)
 from utils import utils
 
 
@@ -26,6 +54,76 @@ class ADConfiguration:
     logging_filename: str = DEFAULT_LOGGING_FILENAME
     """Logging filename in which logs are stored"""
 
+    logging_max_bytes: int = DEFAULT_LOGGING_MAX_BYTES
+    """Size in bytes from which the main and service log files are rotated, 0 never rotates"""
+
+    logging_backup_count: int = DEFAULT_LOGGING_BACKUP_COUNT
+    """Number of rotated files kept for each log file"""
+
+    service_queue_size: int = DEFAULT_SERVICE_QUEUE_SIZE
+    """Number of values a service can have pending before its overflow policy applies"""
+
+    service_queue_policy: str = DEFAULT_SERVICE_QUEUE_POLICY
+    """Overflow policy of the service value queues (drop-oldest, coalesce or block)"""
+
+    command_queue_size: int = DEFAULT_COMMAND_QUEUE_SIZE
+    """Number of commands posted by the clients a service can have pending before the next ones are rejected"""
+
+    replay_ring_size: int = DEFAULT_REPLAY_RING_SIZE
+    """Number of values each service keeps, with their sequence number, to replay them to the clients resuming their session"""
+
+    session_linger_seconds: float = DEFAULT_SESSION_LINGER_SECONDS
+    """Time a disconnected client has to resume its session with its token, getting back its subscriptions and the values it missed"""
+
+    history_size: int = DEFAULT_HISTORY_SIZE
+    """Number of numeric values each service keeps with their timestamp in memory for the get_history queries, 16 bytes each"""
+
+    slow_client_max_pending_packets: int = DEFAULT_SLOW_CLIENT_MAX_PENDING_PACKETS
+    """Number of packets a client can have waiting on its socket before it is isolated from the broadcasts"""
+
+    distance_sensors: str = DEFAULT_DISTANCE_SENSORS
+    """HCSR04 sensors of the ultrasound array as name:trigger_pin:echo_pin entries separated by commas"""
+
+    service_filters: str = DEFAULT_SERVICE_FILTERS
+    """Value filters of the services as service_name=description entries separated by semicolons, overriding their FILTERS"""
+
+    process_services: str = DEFAULT_PROCESS_SERVICES
+    """Names of the services run in a worker process, separated by commas, on top of the ones whose module sets EXECUTION_MODE to process"""
+
+    recording_directory: str = DEFAULT_RECORDING_DIRECTORY
+    """Directory in which the samples of every service are recorded, read them back with tools/telemetry.py, empty to disable the recording"""
+
+    hardware_backend: str = DEFAULT_HARDWARE_BACKEND
+    """Hardware used by the services, raspberry-pi or simulated to run without a board"""
+
+    simulated_echoes: str = DEFAULT_SIMULATED_ECHOES
+    """Distances of the simulated ultrasound sensors as "random:min_meter:max_meter" or "script:meter,meter,x,..." (x for a lost echo), prefix an entry with sensor_name= to only apply it to that sensor, entries are separated by semicolons"""
+
+    simulated_stall_probability: float = DEFAULT_SIMULATED_STALL_PROBABILITY
+    """Probability for a simulated ultrasound sensor to stall on a ping, holding its echo high"""
+
+    profiling_duration: float = DEFAULT_PROFILING_DURATION
+    """Duration in seconds of the profiles started by SIGUSR1, a second SIGUSR1 ends the profile early"""
+
+    websocket_workers: int = DEFAULT_WEBSOCKET_WORKERS
+    """
+    Number of processes serving the websocket clients, above 1 the services run in a hub process feeding the workers,
+    which only accept the websocket transport, forward the rates asked by their clients to the hub
+    and serve the metrics of the hub along with their own, labeled by process
+    """
+
+    hub_socket_path: str = DEFAULT_HUB_SOCKET_PATH
+    """Path of the unix socket through which the service hub feeds the websocket workers"""
+
+    camera_source: str = DEFAULT_CAMERA_SOURCE
+    """Source of the camera frames, synthetic or the path of a V4L2 capture device such as a v4l2loopback /dev/videoN"""
+
+    camera_resolution: str = DEFAULT_CAMERA_RESOLUTION
+    """Resolution of the synthetic camera as widthxheight, V4L2 devices keep the resolution they are set to"""
+
+    camera_rate: float = DEFAULT_CAMERA_RATE
+    """Frame rate of the synthetic camera, V4L2 devices are read as fast as they produce frames"""
+
     def load_from_blob_of_args(self, *args, **kwargs) -> bool:
         """Function called by the main to fill the internal configuration variables from the passed values"""
 
@@ -13,4 +13,70 @@ DEFAULT_LOGGING_FILENAME: str = "auto-doodle.log"
 """Default logging filename"""
 
 DEFAULT_LOGGING_DIRECTORY: str = "./logs"
-"""Default logging directory"""
\ No newline at end of file
+"""Default logging directory"""
+
+DEFAULT_LOGGING_MAX_BYTES: int = 5 * 1024 * 1024
+"""Default size in bytes from which a log file is rotated, 0 never rotates"""
+
+DEFAULT_LOGGING_BACKUP_COUNT: int = 3
+"""Default number of rotated files kept for each log file"""
+
+DEFAULT_SERVICE_QUEUE_SIZE: int = 16
+"""Default number of values a service can have pending before its overflow policy applies"""
+
+DEFAULT_SERVICE_QUEUE_POLICY: str = "drop-oldest"
+"""Default overflow policy of the service value queues (drop-oldest, coalesce or block)"""
+
+DEFAULT_SLOW_CLIENT_MAX_PENDING_PACKETS: int = 64
+"""Default number of packets a client can have waiting on its socket before it is isolated from the broadcasts"""
+
+DEFAULT_DISTANCE_SENSORS: str = "front_distance_sensor:23:24,back_distance_sensor:17:27"
+"""Default HCSR04 sensors of the ultrasound array as name:trigger_pin:echo_pin entries separated by commas"""
+
+DEFAULT_SERVICE_FILTERS: str = ""
+"""Default value filters of the services as service_name=description entries separated by semicolons, overriding their FILTERS"""
+
+DEFAULT_PROCESS_SERVICES: str = ""
+"""Default names of the services run in a worker process, separated by commas"""
+
+DEFAULT_RECORDING_DIRECTORY: str = ""
+"""Default directory in which the samples of the services are recorded, empty to disable the recording"""
+
+DEFAULT_HARDWARE_BACKEND: str = "raspberry-pi"
+"""Default hardware used by the services, raspberry-pi or simulated"""
+
+DEFAULT_SIMULATED_ECHOES: str = "random:0.1:2.0"
+"""Default distances of the simulated ultrasound sensors"""
+
+DEFAULT_SIMULATED_STALL_PROBABILITY: float = 0.0
+"""Default probability for a simulated ultrasound sensor to stall on a ping"""
+
+DEFAULT_PROFILING_DURATION: float = 10.0
+"""Default duration in seconds of the profiles started by SIGUSR1"""
+
+DEFAULT_WEBSOCKET_WORKERS: int = 1
+"""Default number of processes serving the websocket clients"""
+
+DEFAULT_HUB_SOCKET_PATH: str = "/tmp/auto-doodle-hub.sock"
+"""Default path of the unix socket through which the service hub feeds the websocket workers"""
+
+DEFAULT_CAMERA_SOURCE: str = "synthetic"
+"""Default source of the camera frames, synthetic or the path of a V4L2 capture device"""
+
+DEFAULT_CAMERA_RESOLUTION: str = "640x480"
+"""Default resolution of the synthetic camera"""
+
+DEFAULT_CAMERA_RATE: float = 15.0
+"""Default frame rate of the synthetic camera"""
+
+DEFAULT_COMMAND_QUEUE_SIZE: int = 16
+"""Default number of commands a service can have pending before the next ones are rejected"""
+
+DEFAULT_REPLAY_RING_SIZE: int = 256
+"""Default number of values each service keeps for the reconnecting clients"""
+
+DEFAULT_SESSION_LINGER_SECONDS: float = 60.0
+"""Default time a disconnected client has to resume its session"""
+
+DEFAULT_HISTORY_SIZE: int = 8192
+"""Default number of numeric values each service keeps for the history queries"""
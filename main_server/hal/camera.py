@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import fcntl
+import os
+import select
+import struct
+import time
+
+import numpy
+
+PIXEL_FORMAT_GRAY8: str = "gray8"
+"""One byte of luminance per pixel"""
+
+PIXEL_FORMAT_RGB24: str = "rgb24"
+"""Three bytes of red, green and blue per pixel"""
+
+PIXEL_FORMAT_JPEG: str = "jpeg"
+"""Compressed frame, its size isn't known from its resolution"""
+
+PIXEL_CHANNELS: dict[str, int] = {PIXEL_FORMAT_GRAY8: 1, PIXEL_FORMAT_RGB24: 3}
+
+CAMERA_SOURCE_SYNTHETIC: str = "synthetic"
+"""Generated frames, to run the camera services without a camera"""
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE: int = 1
+
+V4L2_FORMAT_OFFSET: int = struct.calcsize("P")
+"""struct v4l2_format starts with a u32 type followed by a union aligned on pointers"""
+
+VIDIOC_G_FMT: int = (3 << 30) | ((V4L2_FORMAT_OFFSET + 200) << 16) | (ord("V") << 8) | 4
+"""_IOWR('V', 4, struct v4l2_format)"""
+
+V4L2_PIXEL_FORMATS: dict[str, str] = {"GREY": PIXEL_FORMAT_GRAY8, "RGB3": PIXEL_FORMAT_RGB24, "YUYV": PIXEL_FORMAT_GRAY8, "MJPG": PIXEL_FORMAT_JPEG, "JPEG": PIXEL_FORMAT_JPEG}
+"""V4L2 fourcc codes read by ADV4L2Camera, YUYV frames are reduced to their luminance"""
+
+
+class ADFrame:
+    """
+    Frame of a camera, its data is not copied nor modified once captured
+    """
+
+    __slots__ = ("data", "width", "height", "pixel_format", "timestamp_ns")
+
+    def __init__(self, data: bytes | memoryview, width: int, height: int, pixel_format: str, timestamp_ns: int) -> None:
+        self.data: bytes | memoryview = data
+        self.width: int = width
+        self.height: int = height
+        self.pixel_format: str = pixel_format
+        self.timestamp_ns: int = timestamp_ns
+
+    def __repr__(self) -> str:
+        return f'ADFrame({self.width}x{self.height} {self.pixel_format}, {len(self.data)} bytes)'
+
+    def pixels(self) -> numpy.ndarray:
+        """
+        View of a raw frame as a height x width x channels array, without copying it
+        """
+        return numpy.frombuffer(self.data, numpy.uint8).reshape(self.height, self.width, PIXEL_CHANNELS[self.pixel_format])
+
+
+class ADSyntheticCamera:
+    """
+    Gray gradient scrolling by one pixel per frame, with a band showing the frame number in binary
+    """
+
+    def __init__(self, width: int, height: int, rate: float) -> None:
+        self.width: int = width
+        self.height: int = height
+        self.period: float = 1 / rate
+        self.gradient: numpy.ndarray = numpy.tile(numpy.arange(width + 256, dtype=numpy.uint8), (height, 1))
+        self.deadline: float = 0.0
+        self.count: int = 0
+
+    def __repr__(self) -> str:
+        return f'{CAMERA_SOURCE_SYNTHETIC} ({self.width}x{self.height} at {1 / self.period:g} fps)'
+
+    def open(self) -> None:
+        self.deadline = time.monotonic()
+
+    def read(self) -> ADFrame:
+        """
+        Wait for the next frame period and render the frame
+        """
+        self.deadline += self.period
+        time.sleep(max(0.0, self.deadline - time.monotonic()))
+        offset: int = self.count % 256
+        pixels: numpy.ndarray = numpy.ascontiguousarray(self.gradient[:, offset:offset + self.width])
+        band: int = max(1, self.height // 16)
+        bit_width: int = max(1, self.width // 32)
+        for bit in range(32):
+            pixels[:band, bit * bit_width:(bit + 1) * bit_width] = 255 if self.count >> bit & 1 else 0
+        self.count += 1
+        return ADFrame(memoryview(pixels).cast("B"), self.width, self.height, PIXEL_FORMAT_GRAY8, time.time_ns())
+
+    def close(self) -> None:
+        pass
+
+
+class ADV4L2Camera:
+    """
+    V4L2 capture device read with the read() I/O method, such as a v4l2loopback device
+    fed by ffmpeg or gstreamer, the format is the one set by the device or its producer
+    """
+
+    READ_TIMEOUT_SECONDS: float = 0.5
+    """Max time a read waits for a frame, so that the capture thread can notice it was stopped"""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.fd: int = -1
+        self.width: int = 0
+        self.height: int = 0
+        self.fourcc: str = None
+        self.frame_size: int = 0
+
+    def __repr__(self) -> str:
+        return f'{self.path} ({self.width}x{self.height} {self.fourcc})'
+
+    def open(self) -> None:
+        self.fd = os.open(self.path, os.O_RDONLY)
+        v4l2_format: bytearray = bytearray(V4L2_FORMAT_OFFSET + 200)
+        struct.pack_into("I", v4l2_format, 0, V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        fcntl.ioctl(self.fd, VIDIOC_G_FMT, v4l2_format)
+        self.width, self.height, pixel_format, _, _, self.frame_size = struct.unpack_from("6I", v4l2_format, V4L2_FORMAT_OFFSET)
+        self.fourcc = pixel_format.to_bytes(4, "little").decode("ascii", "replace")
+        if self.fourcc not in V4L2_PIXEL_FORMATS:
+            self.close()
+            raise ValueError(f"unsupported pixel format {self.fourcc} of {self.path}, expected one of {[*V4L2_PIXEL_FORMATS.keys()]}")
+
+    def read(self) -> ADFrame:
+        """
+        Each read() returns one frame, in a new buffer so the previous frames stay valid,
+        None is returned when no frame came within READ_TIMEOUT_SECONDS
+        """
+        readable, _, _ = select.select([self.fd], [], [], self.READ_TIMEOUT_SECONDS)
+        if len(readable) == 0:
+            return None
+        data: bytes = os.read(self.fd, self.frame_size)
+        timestamp_ns: int = time.time_ns()
+        if self.fourcc == "YUYV":
+            return ADFrame(data[::2], self.width, self.height, PIXEL_FORMAT_GRAY8, timestamp_ns)
+        return ADFrame(data, self.width, self.height, V4L2_PIXEL_FORMATS[self.fourcc], timestamp_ns)
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_camera(source: str, resolution: str, rate: float) -> ADSyntheticCamera | ADV4L2Camera:
+    """
+    Open the synthetic camera or the V4L2 device at the given path,
+    the resolution and rate only apply to the synthetic camera
+    """
+    if source == CAMERA_SOURCE_SYNTHETIC:
+        width, _, height = resolution.partition("x")
+        camera = ADSyntheticCamera(int(width), int(height), rate)
+    else:
+        camera = ADV4L2Camera(source)
+    camera.open()
+    return camera
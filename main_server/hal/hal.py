@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from ad_types.configuration import ADConfiguration
+
+from utils.utils import parse_sensor_pins
+
+from logger.logger import logging
+
+from .simulated import ADSimulatedEcho, ADSimulatedGPIO, ADSimulatedSysfs
+
+HARDWARE_BACKEND_RASPBERRY_PI: str = "raspberry-pi"
+"""Real GPIO module and sysfs of the board"""
+
+HARDWARE_BACKEND_SIMULATED: str = "simulated"
+"""Simulated GPIO and sysfs to run the daemon and its services without a Raspberry Pi"""
+
+HARDWARE_BACKENDS: list[str] = [HARDWARE_BACKEND_RASPBERRY_PI, HARDWARE_BACKEND_SIMULATED]
+
+
+class ADSysfs:
+    """
+    sysfs files of the board
+    """
+
+    def __repr__(self) -> str:
+        return 'ADSysfs'
+
+    def read(self, path: str) -> str:
+        with open(path, "r") as file:
+            return file.read()
+
+
+class ADRaspberryPiHardware:
+    """
+    GPIO module is only imported when a service needs it,
+    services using it fail to load on a machine without it
+    """
+
+    sysfs: ADSysfs = ADSysfs()
+
+    def __repr__(self) -> str:
+        return HARDWARE_BACKEND_RASPBERRY_PI
+
+    @property
+    def gpio(self):
+        import GPIO
+        return GPIO
+
+
+class ADSimulatedHardware:
+    def __init__(self, gpio: ADSimulatedGPIO, sysfs: ADSimulatedSysfs) -> None:
+        self.gpio: ADSimulatedGPIO = gpio
+        self.sysfs: ADSimulatedSysfs = sysfs
+
+    def __repr__(self) -> str:
+        return f'{HARDWARE_BACKEND_SIMULATED} ({self.gpio}, {self.sysfs})'
+
+
+hardware = ADRaspberryPiHardware()
+"""Hardware used by the services of this process, chosen by setup_hardware"""
+
+
+def parse_simulated_echoes(description: str) -> dict[str, ADSimulatedEcho]:
+    """
+    Parse a "echo;sensor_name=echo;..." description into {sensor_name: ADSimulatedEcho},
+    the entry without a sensor name is stored under None and applies to the other sensors
+    """
+    echoes: dict[str, ADSimulatedEcho] = {}
+    for entry in filter(None, map(str.strip, description.split(";"))):
+        name, _, echo = entry.rpartition("=")
+        echoes[name.strip() or None] = ADSimulatedEcho(echo.strip())
+    if None not in echoes:
+        raise ValueError("missing the default simulated echo")
+    return echoes
+
+
+def setup_hardware(configuration: ADConfiguration) -> bool:
+    """
+    Select the hardware backend of the configuration, done by the daemon and by each worker process
+    """
+    global hardware
+    if configuration.hardware_backend == HARDWARE_BACKEND_RASPBERRY_PI:
+        hardware = ADRaspberryPiHardware()
+    elif configuration.hardware_backend == HARDWARE_BACKEND_SIMULATED:
+        try:
+            echoes: dict[str, ADSimulatedEcho] = parse_simulated_echoes(configuration.simulated_echoes)
+        except ValueError as e:
+            logging.critical(f"Invalid simulated echoes \"{configuration.simulated_echoes}\": {e}")
+            return False
+        hardware = ADSimulatedHardware(ADSimulatedGPIO(parse_sensor_pins(configuration.distance_sensors), echoes, configuration.simulated_stall_probability), ADSimulatedSysfs())
+    else:
+        logging.critical(f"Unknown hardware backend \"{configuration.hardware_backend}\", expected one of {HARDWARE_BACKENDS}")
+        return False
+    logging.info(f"Using {hardware} hardware")
+    return True
+
+
+def get_hardware() -> ADRaspberryPiHardware | ADSimulatedHardware:
+    return hardware
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import random
+import threading
+import time
+from typing import Callable
+
+from logger.logger import logging
+
+
+class ADSimulatedEcho:
+    """
+    Distances returned by a simulated ultrasound sensor, described by either
+    "random:min_meter:max_meter" for uniformly drawn distances or
+    "script:meter,meter,x,..." for distances replayed in a loop, x being a lost echo
+    """
+
+    def __init__(self, description: str) -> None:
+        self.description: str = description
+        kind, _, arguments = description.partition(":")
+        self.script: list[float] = None
+        if kind == "random":
+            minimum, maximum = map(float, arguments.split(":"))
+            if not 0 < minimum <= maximum:
+                raise ValueError(f"invalid random range {arguments}")
+            self.range: tuple[float, float] = (minimum, maximum)
+        elif kind == "script":
+            self.script = [None if distance.strip() == "x" else float(distance) for distance in arguments.split(",")]
+            self.steps = itertools.cycle(self.script)
+        else:
+            raise ValueError(f"unknown simulated echo \"{kind}\", expected random or script")
+
+    def __repr__(self) -> str:
+        return self.description
+
+    def next(self) -> float:
+        """
+        Distance of the next echo in meter, None when the echo is lost
+        """
+        if self.script is not None:
+            return next(self.steps)
+        return random.uniform(*self.range)
+
+
+class ADSimulatedGPIO:
+    """
+    In-memory GPIO with the API of the Raspberry Pi GPIO module
+    Each trigger pin of the distance_sensors configuration is wired to a simulated
+    ultrasound sensor: the falling edge of a trigger pulse schedules the rise and fall
+    of the echo pin, played by a timer thread which also calls the edge callbacks
+    """
+
+    OUT: int = 0
+    IN: int = 1
+    LOW: int = 0
+    HIGH: int = 1
+    RISING: int = 31
+    FALLING: int = 32
+    BOTH: int = 33
+
+    ECHO_DELAY_SECONDS: float = 0.00045
+    """Time taken by the sensor to send its ultrasound burst after the trigger pulse"""
+
+    STALL_SECONDS: float = 0.2
+    """Time a stalled sensor holds its echo pin high"""
+
+    SOUND_SPEED_IN_AIR_METER_PER_SECOND: float = 331.29
+
+    def __init__(self, sensors: dict[str, tuple[int, int]], echoes: dict[str, ADSimulatedEcho], stall_probability: float) -> None:
+        self.wiring: dict[int, tuple[int, ADSimulatedEcho]] = {trigger_pin: (echo_pin, echoes.get(name, echoes.get(None))) for name, (trigger_pin, echo_pin) in sensors.items()}
+        """Echo pin and distances of the sensor of each trigger pin"""
+
+        self.stall_probability: float = stall_probability
+        self.levels: dict[int, int] = {}
+        self.callbacks: dict[int, Callable[[int], None]] = {}
+        self.events: list[tuple[int, int, int, int]] = []
+        """Heap of the (deadline_ns, sequence, pin, level) changes to play"""
+
+        self.sequence = itertools.count()
+        self.condition: threading.Condition = threading.Condition()
+        self.thread: threading.Thread = None
+
+    def __repr__(self) -> str:
+        return f'ADSimulatedGPIO({", ".join(f"{trigger}->{echo}: {source}" for trigger, (echo, source) in self.wiring.items())})'
+
+    def setup(self, pin: int, mode: int, *args, **kwargs) -> None:
+        with self.condition:
+            self.levels[pin] = self.LOW
+
+    def input(self, pin: int) -> int:
+        return self.levels.get(pin, self.LOW)
+
+    def output(self, pin: int, value) -> None:
+        with self.condition:
+            previous: int = self.levels.get(pin, self.LOW)
+            self.levels[pin] = self.HIGH if value else self.LOW
+            if previous == self.HIGH and not value and pin in self.wiring:
+                self.echo(*self.wiring[pin])
+
+    def add_event_detect(self, pin: int, edge: int, callback: Callable[[int], None] = None, bouncetime: int = None) -> None:
+        self.callbacks[pin] = callback
+
+    def remove_event_detect(self, pin: int) -> None:
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self, *pins: int) -> None:
+        with self.condition:
+            for pin in pins if len(pins) != 0 else [*self.levels.keys()]:
+                self.levels.pop(pin, None)
+                self.callbacks.pop(pin, None)
+
+    def echo(self, echo_pin: int, source: ADSimulatedEcho) -> None:
+        """
+        Schedule the echo pulse of a trigger, called with the condition held
+        """
+        if random.random() < self.stall_probability:
+            width_seconds: float = self.STALL_SECONDS
+        else:
+            distance_meter: float = source.next()
+            if distance_meter is None:
+                return
+            width_seconds = 2 * distance_meter / self.SOUND_SPEED_IN_AIR_METER_PER_SECOND
+        rise_ns: int = time.perf_counter_ns() + int(self.ECHO_DELAY_SECONDS * 1e9)
+        heapq.heappush(self.events, (rise_ns, next(self.sequence), echo_pin, self.HIGH))
+        heapq.heappush(self.events, (rise_ns + int(width_seconds * 1e9), next(self.sequence), echo_pin, self.LOW))
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.play, name="SimulatedGPIO", daemon=True)
+            self.thread.start()
+        self.condition.notify()
+
+    def play(self) -> None:
+        """
+        Thread applying the scheduled level changes and calling the edge callbacks
+        """
+        while True:
+            with self.condition:
+                while len(self.events) == 0 or self.events[0][0] > time.perf_counter_ns():
+                    self.condition.wait((self.events[0][0] - time.perf_counter_ns()) / 1e9 if len(self.events) != 0 else None)
+                _, _, pin, level = heapq.heappop(self.events)
+                if pin not in self.levels:
+                    continue
+                self.levels[pin] = level
+                callback: Callable[[int], None] = self.callbacks.get(pin)
+            if callback is not None:
+                callback(pin)
+
+
+class ADSimulatedSysfs:
+    """
+    sysfs files of a simulated board, the thermal zones report a slowly
+    oscillating temperature with some noise
+    """
+
+    TEMPERATURE_CELSIUS: float = 45.0
+    """Mean temperature of the thermal zones"""
+
+    TEMPERATURE_SWING_CELSIUS: float = 5.0
+    """Amplitude of the temperature oscillation"""
+
+    TEMPERATURE_PERIOD_SECONDS: float = 600.0
+
+    TEMPERATURE_NOISE_CELSIUS: float = 0.3
+    """Standard deviation of the noise added to every reading"""
+
+    def __repr__(self) -> str:
+        return 'ADSimulatedSysfs'
+
+    def temperature(self) -> float:
+        phase: float = 2 * math.pi * time.monotonic() / self.TEMPERATURE_PERIOD_SECONDS
+        return self.TEMPERATURE_CELSIUS + self.TEMPERATURE_SWING_CELSIUS * math.sin(phase) + random.gauss(0, self.TEMPERATURE_NOISE_CELSIUS)
+
+    def read(self, path: str) -> str:
+        if path.startswith("/sys/class/thermal/thermal_zone") and path.endswith("/temp"):
+            return f'{int(self.temperature() * 1000)}\n'
+        logging.debug("No simulated sysfs file at %s", path)
+        raise FileNotFoundError(f"no simulated sysfs file at {path}")
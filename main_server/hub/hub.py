@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Callable
+
+from ad_types.configuration import ADConfiguration
+
+from logger.logger import logging, setupLogger
+
+from service_scheduler.service import ADServiceWrapper
+from service_scheduler.service_scheduler import ADServiceScheduler
+from service_scheduler.discovery import ADServiceMetadata
+from service_scheduler.command_queue import ADCommand
+from service_scheduler.watcher import ADServiceWatcher
+from service_scheduler.replay_ring import ADReplayEntry
+from websocket_scheduler.websocket_scheduler import WebsocketScheduler
+from websocket_scheduler.wire_format import WIRE_FORMAT_JSON
+from metrics.metrics import metrics
+from profiler.profiler import ADProfiler
+
+HUB_LINE_LIMIT: int = 16 * 1024 * 1024
+"""Maximum size of a message exchanged between the hub and a worker, messages are JSON [event, packet] lines"""
+
+HUB_MAX_BUFFERED_BYTES: int = 1024 * 1024
+"""Bytes a worker can have waiting on its connection before the values published to it are dropped"""
+
+
+def encode_message(event: str, packet) -> bytes:
+    return json.dumps([event, packet]).encode() + b"\n"
+
+
+class ADHubWorker:
+    """
+    Connection of a websocket worker as seen by the hub, it subscribes to the services
+    on behalf of its clients like a client would, so it is indexed by the same registry
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+        self.index: int = None
+        self.pid: int = None
+        self.connected: bool = True
+        self.wire_format: str = WIRE_FORMAT_JSON
+        self.batcher = None
+        self.demands: dict[str, float] = {}
+        """Fastest rate asked by the clients of the worker for each service, None when one of them takes every value"""
+
+        self.dropped: int = 0
+        """Values not written to this worker because it was too far behind"""
+
+    def __repr__(self) -> str:
+        return f'worker#{self.index}@{self.pid}'
+
+    async def join(self, room: str) -> None:
+        """
+        The hub writes every value of a service to its subscribed workers, there are no rooms
+        """
+        pass
+
+    async def leave(self, room: str) -> None:
+        pass
+
+    async def send(self, event: str, packet) -> None:
+        self.write(encode_message(event, packet))
+
+    def write(self, message: bytes) -> None:
+        if self.connected and not self.writer.is_closing():
+            self.writer.write(message)
+
+    def publish(self, message: bytes) -> bool:
+        """
+        Write values to the worker unless its connection is backing up
+        """
+        if self.writer.transport.get_write_buffer_size() > HUB_MAX_BUFFERED_BYTES:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logging.warning(f"{self} is too slow, {self.dropped} value(s) dropped so far")
+            return False
+        self.write(message)
+        return True
+
+    def close(self) -> None:
+        self.connected = False
+        self.writer.close()
+
+
+class ADHubServiceWrapper(ADServiceWrapper):
+    """
+    Service run by the hub, its filtered values are published to the subscribed workers
+    which encode them for their clients
+    """
+
+    async def ensure_running(self) -> bool:
+        """
+        Frames aren't relayed to the workers, frame streams are only served without websocket workers
+        """
+        if not await super().ensure_running():
+            return False
+        if self.is_frame_stream:
+            logging.error(f"<{self.name}> is a frame stream, which can't be served by websocket workers")
+            self.stop()
+            return False
+        return True
+
+    async def catch_up(self, subscription, after_sequence: int = None) -> None:
+        """
+        Workers get the latest values with their subscription, their clients are caught up by the worker
+        """
+        pass
+
+    def requested_rate(self) -> float:
+        """
+        Fastest rate asked by the clients of the subscribed workers,
+        None when one of them takes every value or a worker didn't tell its demand yet
+        """
+        rate: float = 0.0
+        for subscription in self.subscriptions.of_service(self.name):
+            demand: float = subscription.client.demands.get(self.name)
+            if demand is None:
+                return None
+            rate = max(rate, demand)
+        return rate if rate != 0.0 else None
+
+    async def deliver(self, values: dict, timestamp_ns: int, sequence: int) -> None:
+        """
+        Sequence numbers are given by the hub so that every worker agrees on them
+        """
+        self.last_values = values
+        self.unit = values.get("unit")
+        self.history.append(sequence, timestamp_ns, values)
+        self.server.publish(self, values, timestamp_ns, sequence)
+
+
+class ADServiceHub:
+    """
+    Process owning the services when several worker processes serve the websocket clients:
+    services own hardware so they only run once, here, the workers route the subscriptions
+    of their clients to the hub through a unix socket and get the values of these services back
+    """
+
+    RESTART_DELAY_SECONDS: float = 1.0
+    """Delay between the checks of the worker processes, dead ones are restarted"""
+
+    def __init__(self, configuration: ADConfiguration) -> None:
+        self.configuration: ADConfiguration = configuration
+        self.scheduler: ADServiceScheduler = ADServiceScheduler(configuration, self, ADHubServiceWrapper)
+        """The hub is the server of its services, they publish their values through it"""
+
+        self.workers: list[ADHubWorker] = []
+        """Connected workers"""
+
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: list[multiprocessing.Process] = [None] * configuration.websocket_workers
+        self.listening_socket: socket.socket = None
+        """Socket of the websocket port, shared by the workers"""
+
+        self.stopped: asyncio.Event = None
+        self.profiler: ADProfiler = ADProfiler(configuration.logging_directory)
+
+    def __repr__(self) -> str:
+        return f'ADServiceHub({self.configuration.hub_socket_path}, {len(self.processes)} workers)'
+
+    def services_description(self) -> dict[str, dict]:
+        """
+        What the workers need to know about the services to wrap them without importing them
+        """
+        return {name: {"id": service.service_id, "filepath": service.metadata.filepath, "execution_mode": service.metadata.execution_mode, "mtime": service.metadata.mtime} for name, service in self.scheduler.services.items()}
+
+    def publish(self, service: ADServiceWrapper, values: dict, timestamp_ns: int, sequence: int) -> None:
+        """
+        Values are encoded once and written to every worker subscribed to the service
+        """
+        message: bytes = encode_message("values", [service.name, values, timestamp_ns, sequence])
+        for subscription in self.scheduler.subscriptions.of_service(service.name):
+            subscription.client.publish(message)
+
+    def latest(self, service_name: str) -> list:
+        """
+        Latest values of a service as [sequence, timestamp_ns, values], the workers start their history with it
+        """
+        service: ADServiceWrapper = self.scheduler.services.get(service_name)
+        entry: ADReplayEntry = service.history.latest() if service is not None else None
+        return [entry.sequence, entry.timestamp_ns, entry.values] if entry is not None else None
+
+    async def reload(self, filepaths: set[str]) -> None:
+        await self.scheduler.reload(filepaths)
+        services: dict[str, dict] = self.services_description()
+        for worker in self.workers:
+            await worker.send("services", services)
+
+    async def serve_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        worker: ADHubWorker = ADHubWorker(reader, writer)
+        self.workers.append(worker)
+        try:
+            while True:
+                line: bytes = await reader.readline()
+                if line == b"":
+                    break
+                event, packet = json.loads(line)
+                if event == "hello":
+                    worker.index, worker.pid = packet["index"], packet["pid"]
+                    logging.info(f"{worker} connected to the hub")
+                    await worker.send("services", self.services_description())
+                elif event == "subscribe":
+                    success: bool = await self.scheduler.subscribe(packet, worker)
+                    await worker.send("subscribed", {"service_name": packet, "success": success, "latest": self.latest(packet)})
+                elif event == "unsubscribe":
+                    worker.demands.pop(packet, None)
+                    await self.scheduler.unsubscribe(packet, worker)
+                elif event == "demand":
+                    worker.demands[packet["service_name"]] = packet["rate"]
+                    service: ADServiceWrapper = self.scheduler.services.get(packet["service_name"])
+                    if service is not None and service.running:
+                        service.update_demand()
+                elif event == "history":
+                    history: dict = await self.scheduler.get_history(packet["service_name"], packet["window_seconds"], packet["max_points"], packet["mode"])
+                    await worker.send("history", {"id": packet["id"], "history": history})
+                elif event == "metrics":
+                    await worker.send("metrics", {"id": packet["id"], "metrics": metrics.render(self.scheduler.services.values(), [], self.scheduler.subscriptions)})
+                elif event == "post":
+                    if not self.scheduler.post(packet["service_name"], ADCommand(worker, packet["values"], packet["id"], packet["coalesce"])):
+                        await worker.send("post", {"service_name": packet["service_name"], "id": packet["id"], "error": f"service {packet['service_name']} isn't running"})
+        except (ConnectionError, ValueError) as e:
+            logging.error(f"Connection of {worker} failed: {e}")
+        finally:
+            logging.info(f"{worker} disconnected from the hub")
+            self.workers.remove(worker)
+            worker.close()
+            await self.scheduler.unsubscribe_all(worker)
+
+    def spawn(self, index: int) -> None:
+        process: multiprocessing.Process = self.context.Process(target=worker_main, args=(index, self.configuration, self.listening_socket), name=f"websocket-worker-{index}", daemon=True)
+        process.start()
+        self.processes[index] = process
+        logging.info(f"Started websocket worker #{index} (pid {process.pid})")
+
+    def on_profile_signal(self) -> None:
+        """
+        SIGUSR1 profiles the hub, where the services run, the workers handle their own SIGUSR1
+        """
+        if not self.profiler.stop():
+            self.profiler.start(self.configuration.profiling_duration)
+
+    async def serve(self) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for signum in [signal.SIGINT, signal.SIGTERM]:
+            loop.add_signal_handler(signum, self.stopped.set)
+        loop.add_signal_handler(signal.SIGUSR1, self.on_profile_signal)
+        if os.path.exists(self.configuration.hub_socket_path):
+            os.unlink(self.configuration.hub_socket_path)
+        server: asyncio.AbstractServer = await asyncio.start_unix_server(self.serve_worker, self.configuration.hub_socket_path, limit=HUB_LINE_LIMIT)
+        self.scheduler.watcher = ADServiceWatcher(self.configuration.services_directory_path, ".py", self.reload)
+        """The workers learn about the changes of the services directory from the hub"""
+        self.scheduler.watch()
+        metrics.start_loop_monitor()
+        for index in range(len(self.processes)):
+            self.spawn(index)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), self.RESTART_DELAY_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                for index, process in enumerate(self.processes):
+                    if not self.stopped.is_set() and not process.is_alive():
+                        logging.error(f"Websocket worker #{index} (pid {process.pid}) died with exit code {process.exitcode}, restarting it")
+                        self.spawn(index)
+        finally:
+            server.close()
+            for process in self.processes:
+                process.terminate()
+            for process in self.processes:
+                await loop.run_in_executor(None, process.join)
+            for worker in [*self.workers]:
+                worker.close()
+            os.unlink(self.configuration.hub_socket_path)
+
+    def start(self) -> None:
+        logging.info(f"Service hub started with {self.scheduler} service(s)")
+        self.listening_socket = socket.create_server(("127.0.0.1", self.configuration.websocket_scheduler_port))
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            logging.warning(f"Service hub stopped: {e}")
+        self.listening_socket.close()
+        self.scheduler.stop()
+        logging.info("Service hub stopped")
+
+
+class ADRemoteServiceWrapper(ADServiceWrapper):
+    """
+    Service run by the hub, this wrapper of a websocket worker
+    only fans its values out to the clients of the worker
+    """
+
+    def __init__(self, metadata: ADServiceMetadata, configuration: ADConfiguration, server, latest_value: Callable[[str], float], subscriptions, link: ADHubLink) -> None:
+        super().__init__(metadata, configuration, server, latest_value, subscriptions)
+        self.link: ADHubLink = link
+
+    def load(self) -> bool:
+        return True
+
+    async def ensure_running(self) -> bool:
+        """
+        The first subscriber of this worker subscribes the worker to the service on the hub
+        """
+        if not self.running:
+            self.running = await self.link.subscribe(self.name)
+        return self.running
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        self.link.unsubscribe(self.name)
+
+    def update_demand(self) -> None:
+        """
+        The sampling job of the service runs in the hub, which combines the demands of its workers
+        """
+        self.link.set_demand(self.name, self.requested_rate())
+
+    def post(self, command: ADCommand) -> bool:
+        """
+        Commands are queued by the hub, which acknowledges them through this worker
+        """
+        if not self.running:
+            return False
+        self.link.post(self.name, command)
+        return True
+
+    def remember(self, sequence: int, timestamp_ns: int, values: dict) -> None:
+        """
+        Start the history with the latest values of the hub, for the snapshot of the first subscriber of this worker
+        """
+        latest: ADReplayEntry = self.history.latest()
+        if latest is None or latest.sequence < sequence:
+            self.history.append(sequence, timestamp_ns, values)
+            self.last_values = values
+
+    async def get_history(self, window_seconds: float, max_points: int, mode: str) -> dict:
+        """
+        Values are only kept by the hub, where the service runs
+        """
+        return await self.link.get_history(self.name, window_seconds, max_points, mode)
+
+    async def receive(self, values: dict, timestamp_ns: int, sequence: int) -> None:
+        if not self.running:
+            return
+        broadcast_start: float = time.perf_counter()
+        await self.deliver(values, timestamp_ns, sequence)
+        metrics.observe_broadcast(self.name, time.perf_counter() - broadcast_start)
+
+
+class ADHubLink:
+    """
+    Connection of a websocket worker to the service hub
+    """
+
+    def __init__(self, path: str, index: int) -> None:
+        self.path: str = path
+        self.index: int = index
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+        self.scheduler: ADServiceScheduler = None
+        self.pending: dict[str, asyncio.Future] = {}
+        """Subscriptions waiting for the answer of the hub, by service name"""
+
+        self.commands: dict[int, ADCommand] = {}
+        """Commands forwarded to the hub and not acknowledged yet, by identifier given by this worker"""
+
+        self.next_command_id: int = 0
+        self.queries: dict[int, asyncio.Future] = {}
+        """History and metrics queries waiting for the answer of the hub, by identifier given by this worker"""
+
+        self.next_query_id: int = 0
+        self.task: asyncio.Task = None
+        self.on_lost: Callable[[], None] = None
+
+    def __repr__(self) -> str:
+        return f'ADHubLink({self.path}, worker#{self.index})'
+
+    def service_wrapper(self, *arguments) -> ADRemoteServiceWrapper:
+        return ADRemoteServiceWrapper(*arguments, self)
+
+    async def connect(self, scheduler: ADServiceScheduler, on_lost: Callable[[], None]) -> None:
+        """
+        Connect to the hub and wait for its services before the worker accepts clients
+        """
+        self.scheduler = scheduler
+        self.on_lost = on_lost
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path, limit=HUB_LINE_LIMIT)
+        self.send("hello", {"index": self.index, "pid": os.getpid()})
+        event, packet = json.loads(await self.reader.readline())
+        await self.sync_services(packet)
+        self.task = asyncio.get_running_loop().create_task(self.receive())
+
+    def send(self, event: str, packet) -> None:
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(encode_message(event, packet))
+
+    async def subscribe(self, service_name: str) -> bool:
+        """
+        Concurrent subscriptions to the same service share the request sent to the hub
+        """
+        pending: asyncio.Future = self.pending.get(service_name)
+        if pending is None:
+            pending = self.pending[service_name] = asyncio.get_running_loop().create_future()
+            self.send("subscribe", service_name)
+        return await asyncio.shield(pending)
+
+    def unsubscribe(self, service_name: str) -> None:
+        self.send("unsubscribe", service_name)
+
+    def set_demand(self, service_name: str, rate: float) -> None:
+        self.send("demand", {"service_name": service_name, "rate": rate})
+
+    async def query(self, event: str, packet: dict) -> dict:
+        """
+        Send a query to the hub and wait for its answer, None when the hub is lost
+        """
+        self.next_query_id += 1
+        query: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queries[self.next_query_id] = query
+        self.send(event, {"id": self.next_query_id, **packet})
+        return await query
+
+    async def get_history(self, service_name: str, window_seconds: float, max_points: int, mode: str) -> dict:
+        answer: dict = await self.query("history", {"service_name": service_name, "window_seconds": window_seconds, "max_points": max_points, "mode": mode})
+        return answer.get("history") if answer is not None else None
+
+    async def get_metrics(self) -> str:
+        """
+        Prometheus text exposition of the hub, empty when the hub is lost
+        """
+        answer: dict = await self.query("metrics", {})
+        return answer["metrics"] if answer is not None else ""
+
+    def post(self, service_name: str, command: ADCommand) -> None:
+        self.next_command_id += 1
+        self.commands[self.next_command_id] = command
+        self.send("post", {"service_name": service_name, "values": command.values, "id": self.next_command_id, "coalesce": command.key})
+
+    async def acknowledge(self, acknowledgement: dict) -> None:
+        """
+        Give the acknowledgement of the hub the identifier and timestamp of the client
+        """
+        command: ADCommand = self.commands.pop(acknowledgement["id"], None)
+        if command is None or not command.client.connected:
+            return
+        acknowledgement["id"] = command.command_id
+        if command.timestamp is not None:
+            acknowledgement["timestamp"] = command.timestamp
+        await command.client.send("post", acknowledgement)
+
+    async def sync_services(self, services: dict[str, dict]) -> None:
+        """
+        Follow the services of the hub: removed ones are removed along with their subscriptions,
+        new ones are wrapped and every service takes the identifier given by the hub
+        """
+        for name, service in [*self.scheduler.services.items()]:
+            if name not in services:
+                await self.scheduler.remove_service(service)
+        for name, description in services.items():
+            service: ADServiceWrapper = self.scheduler.services.get(name)
+            if service is None:
+                service = self.scheduler.services[name] = self.scheduler.wrap(ADServiceMetadata(description["filepath"], name, description["execution_mode"], description["mtime"]))
+            service.service_id = description["id"]
+
+    async def receive(self) -> None:
+        try:
+            while True:
+                line: bytes = await self.reader.readline()
+                if line == b"":
+                    break
+                event, packet = json.loads(line)
+                if event == "values":
+                    service_name, values, timestamp_ns, sequence = packet
+                    service: ADRemoteServiceWrapper = self.scheduler.services.get(service_name)
+                    if service is not None:
+                        await service.receive(values, timestamp_ns, sequence)
+                elif event == "subscribed":
+                    service: ADRemoteServiceWrapper = self.scheduler.services.get(packet["service_name"])
+                    if service is not None and packet["success"] and packet.get("latest") is not None:
+                        service.remember(*packet["latest"])
+                    pending: asyncio.Future = self.pending.pop(packet["service_name"], None)
+                    if pending is not None:
+                        pending.set_result(packet["success"])
+                elif event == "services":
+                    await self.sync_services(packet)
+                elif event in ("history", "metrics"):
+                    query: asyncio.Future = self.queries.pop(packet.pop("id"), None)
+                    if query is not None:
+                        query.set_result(packet)
+                elif event == "post":
+                    await self.acknowledge(packet)
+        except (ConnectionError, ValueError) as e:
+            logging.error(f"{self} failed: {e}")
+        logging.critical(f"{self} lost the service hub, stopping the worker")
+        for pending in self.pending.values():
+            pending.set_result(False)
+        self.pending = {}
+        for query in self.queries.values():
+            query.set_result(None)
+        self.queries = {}
+        self.writer.close()
+        self.on_lost()
+
+
+def worker_main(index: int, configuration: ADConfiguration, listening_socket: socket.socket) -> None:
+    """
+    Entry point of a websocket worker process, it serves its share of the clients
+    of the websocket port with the services of the hub
+    """
+    setupLogger(configuration.logging_level, os.path.join(configuration.logging_directory, configuration.logging_filename))
+    """Log files are only rotated by the hub"""
+
+    configuration.recording_directory = ""
+    """Values are recorded by the hub"""
+
+    websocket_scheduler: WebsocketScheduler = WebsocketScheduler(configuration, ADHubLink(configuration.hub_socket_path, index))
+    websocket_scheduler.start([listening_socket])
@@ -2,12 +2,100 @@
 
 from __future__ import annotations
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 
 LOG_FORMAT: str = '[%(levelname)-8s] [%(asctime)s] [#%(threadName)-8s] [%(filename)s:%(lineno)d] -- %(message)s'
 
-def setupLogger(loglevel: str, logfilename: str) -> bool:
+LOG_QUEUE: queue.SimpleQueue = queue.SimpleQueue()
+"""Records of every logger and service log file, written to their files by the logging thread"""
+
+
+class ADDispatchHandler(logging.Handler):
+    """
+    Handler of the logging thread, the lines of the service log files go to their own file
+    and every other record goes to the handlers of the main log
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.main_handlers: list[logging.Handler] = []
+        self.file_handlers: dict[str, logging.Handler] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        handler: logging.Handler = self.file_handlers.get(record.name)
+        if handler is None:
+            for handler in self.main_handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        elif getattr(record, "close_file", False):
+            self.file_handlers.pop(record.name).close()
+        else:
+            handler.handle(record)
+
+
+dispatch_handler: ADDispatchHandler = ADDispatchHandler()
+
+listener: logging.handlers.QueueListener = None
+"""Logging thread, started by setupLogger"""
+
+
+class ADLogFile:
+    """
+    File like object given to the services as their log file
+    Complete lines are queued to the logging thread which writes them to a rotating file,
+    so that a service or the event loop never waits on the disk
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int) -> None:
+        self.name: str = filename
+        self.key: str = f'{filename}#{id(self)}'
+        """Name of the records of this file, the same file can be opened again by a reloaded service"""
+
+        self.buffer: str = ""
+        """Last line written, until it is complete"""
+
+        self.lock: threading.Lock = threading.Lock()
+        self.closed: bool = False
+        handler: logging.Handler = logging.handlers.RotatingFileHandler(filename, 'a', max_bytes, backup_count)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        dispatch_handler.file_handlers[self.key] = handler
+
+    def __repr__(self) -> str:
+        return f'ADLogFile({self.name})'
+
+    def queue_line(self, line: str, **extra) -> None:
+        LOG_QUEUE.put_nowait(logging.makeLogRecord({"name": self.key, "msg": line, "levelno": logging.INFO, **extra}))
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            *lines, self.buffer = (self.buffer + text).split("\n")
+            for line in lines:
+                self.queue_line(line)
+        return len(text)
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.buffer != "":
+                self.queue_line(self.buffer)
+                self.buffer = ""
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.queue_line("", close_file=True)
+
+    def writable(self) -> bool:
+        return True
+
+
+def setupLogger(loglevel: str, logfilename: str, max_bytes: int = 0, backup_count: int = 0) -> bool:
     LOG_LEVELS = {
         "CRITICAL": logging.CRITICAL,
         "ERROR": logging.ERROR,
@@ -15,6 +103,7 @@ def setupLogger(loglevel: str, logfilename: str) -> bool:
         "INFO": logging.INFO,
         "DEBUG": logging.DEBUG
     }
+    global listener
 
     loglevel = loglevel.upper()
 
@@ -28,12 +117,31 @@ def setupLogger(loglevel: str, logfilename: str) -> bool:
     if not os.path.exists(log_directory):
         os.makedirs(os.path.dirname(logfilename))
 
-    logging.basicConfig(
-        format=LOG_FORMAT,
-        level=loglevel,
-        handlers=[
-            logging.FileHandler(logfilename, 'a'),
-            logging.StreamHandler()
-        ],
-    )
+    formatter: logging.Formatter = logging.Formatter(LOG_FORMAT)
+    dispatch_handler.main_handlers = [
+        logging.handlers.RotatingFileHandler(logfilename, 'a', max_bytes, backup_count),
+        logging.StreamHandler()
+    ]
+    for handler in dispatch_handler.main_handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler: logging.Handler = logging.handlers.QueueHandler(LOG_QUEUE)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    """Only the message is merged in the calling thread, the log format is applied by the logging thread"""
+
+    logging.basicConfig(level=loglevel, handlers=[queue_handler])
+    if listener is None:
+        listener = logging.handlers.QueueListener(LOG_QUEUE, dispatch_handler)
+        listener.start()
+        atexit.register(stopLogger)
     return True
+
+
+def stopLogger() -> None:
+    """
+    Write the queued records and stop the logging thread
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -10,7 +10,9 @@ from logger.logger import setupLogger, logging
 
 from ad_types.configuration import ADConfiguration
 from utils.utils import get_object_member_variables
+from hal.hal import setup_hardware
 from websocket_scheduler.websocket_scheduler import WebsocketScheduler
+from hub.hub import ADServiceHub
 
 VERSION: float = 0.1
 
@@ -32,12 +34,20 @@ def main(argv: list[str]) -> int:
 
     main_ad_configuration.load_from_blob_of_args(**parser_members)
 
-    if not setupLogger(main_ad_configuration.logging_level, os.path.join(main_ad_configuration.logging_directory, main_ad_configuration.logging_filename)):
+    if not setupLogger(main_ad_configuration.logging_level, os.path.join(main_ad_configuration.logging_directory, main_ad_configuration.logging_filename), main_ad_configuration.logging_max_bytes, main_ad_configuration.logging_backup_count):
+        return 1
+
+    if not setup_hardware(main_ad_configuration):
         return 1
 
     logging.info(f"Starting Auto-Doodle v{VERSION}")
     logging.debug(main_ad_configuration)
 
+    if main_ad_configuration.websocket_workers > 1:
+        service_hub: ADServiceHub = ADServiceHub(main_ad_configuration)
+        service_hub.start()
+        return 0
+
     websocket_scheduler: WebsocketScheduler = WebsocketScheduler(
         main_ad_configuration)
 
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import threading
+import time
+from typing import Iterable
+
+LATENCY_BUCKETS_SECONDS: list[float] = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0]
+"""Upper bounds of the duration histograms, the +Inf bucket is implicit"""
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class ADHistogram:
+    """
+    Prometheus histogram, observe() only bumps a bucket so it can be used on the hot path
+    """
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: list[float] = LATENCY_BUCKETS_SECONDS) -> None:
+        self.bounds: list[float] = bounds
+        self.counts: list[int] = [0] * (len(bounds) + 1)
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines: list[str] = []
+        cumulated: int = 0
+        for bound, count in zip([*map(str, self.bounds), "+Inf"], self.counts):
+            cumulated += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels != "" else ""}le="{bound}"}} {cumulated}')
+        selector: str = f'{{{labels}}}' if labels != "" else ""
+        lines.append(f'{name}_sum{selector} {self.sum}')
+        lines.append(f'{name}_count{selector} {cumulated}')
+        return lines
+
+
+class ADMetrics:
+    """
+    Metrics of the daemon, counters are updated by the schedulers
+    and gauges are read from their state when the metrics are rendered
+    """
+
+    LOOP_LAG_PERIOD_SECONDS: float = 0.5
+    """Period at which the event loop lag is sampled"""
+
+    def __init__(self) -> None:
+        self.values_total: dict[str, int] = {}
+        """Values broadcast by each service"""
+
+        self.frames_total: dict[str, int] = {}
+        """Frames published by each frame stream"""
+
+        self.setup_seconds: dict[str, float] = {}
+        """Duration of the last setup of each service"""
+
+        self.cleanup_seconds: dict[str, float] = {}
+        """Duration of the last cleanup of each service"""
+
+        self.broadcast_seconds: dict[str, ADHistogram] = {}
+        """Time taken to encode and emit each value of each service"""
+
+        self.command_seconds: dict[str, ADHistogram] = {}
+        """Time between the reception of each command posted to each service and the return of its post()"""
+
+        self.sampling_lateness: dict[str, ADHistogram] = {}
+        """Delay between each deadline of each sampling job and the start of its sample"""
+
+        self.sampling_overruns: dict[str, int] = {}
+        """Deadlines skipped by each sampling job"""
+
+        self.sampling_rate: dict[str, float] = {}
+        """Current rate of each registered sampling job"""
+
+        self.loop_lag: ADHistogram = ADHistogram()
+        self.last_loop_lag: float = 0.0
+        self.loop_monitor: asyncio.Task = None
+
+    def observe_broadcast(self, service_name: str, seconds: float) -> None:
+        histogram: ADHistogram = self.broadcast_seconds.get(service_name)
+        if histogram is None:
+            histogram = self.broadcast_seconds[service_name] = ADHistogram()
+            self.values_total[service_name] = 0
+        histogram.observe(seconds)
+        self.values_total[service_name] += 1
+
+    def observe_command(self, service_name: str, seconds: float) -> None:
+        histogram: ADHistogram = self.command_seconds.get(service_name)
+        if histogram is None:
+            histogram = self.command_seconds[service_name] = ADHistogram()
+        histogram.observe(seconds)
+
+    def observe_sampling(self, job_name: str, lateness: float) -> None:
+        """
+        Called from the sampling threads, a sample is only ever missed by a render
+        """
+        histogram: ADHistogram = self.sampling_lateness.get(job_name)
+        if histogram is None:
+            histogram = self.sampling_lateness[job_name] = ADHistogram()
+        histogram.observe(lateness)
+
+    def observe_sampling_overrun(self, job_name: str, count: int = 1) -> None:
+        self.sampling_overruns[job_name] = self.sampling_overruns.get(job_name, 0) + count
+
+    def observe_frame(self, service_name: str) -> None:
+        self.frames_total[service_name] = self.frames_total.get(service_name, 0) + 1
+
+    def start_loop_monitor(self) -> None:
+        """
+        Sample the event loop lag from the running loop, it is how late a sleep wakes up
+        """
+        self.loop_monitor = asyncio.get_running_loop().create_task(self.monitor_loop())
+
+    async def monitor_loop(self) -> None:
+        while True:
+            start: float = time.perf_counter()
+            await asyncio.sleep(self.LOOP_LAG_PERIOD_SECONDS)
+            self.last_loop_lag = max(time.perf_counter() - start - self.LOOP_LAG_PERIOD_SECONDS, 0.0)
+            self.loop_lag.observe(self.last_loop_lag)
+
+    def render(self, services: Iterable, clients: Iterable, subscriptions) -> str:
+        """
+        Prometheus text exposition of the metrics of the given ADServiceWrapper and ADClient
+        and of their ADSubscriptionRegistry
+        """
+        services = [*services]
+        clients = [*clients]
+        lines: list[str] = []
+
+        def family(name: str, kind: str, description: str) -> None:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        family("ad_service_subscribers", "gauge", "Number of clients subscribed to the service")
+        lines.extend(f'ad_service_subscribers{{service="{escape_label(service.name)}"}} {subscriptions.count(service.name)}' for service in services)
+        family("ad_service_running", "gauge", "Whether the service is set up")
+        lines.extend(f'ad_service_running{{service="{escape_label(service.name)}"}} {int(service.running)}' for service in services)
+        family("ad_service_values_total", "counter", "Values broadcast by the service")
+        lines.extend(f'ad_service_values_total{{service="{escape_label(name)}"}} {count}' for name, count in self.values_total.items())
+        family("ad_service_frames_total", "counter", "Frames published by the frame stream")
+        lines.extend(f'ad_service_frames_total{{service="{escape_label(name)}"}} {count}' for name, count in self.frames_total.items())
+        family("ad_service_dropped_values_total", "counter", "Values dropped or coalesced by the service queue")
+        lines.extend(f'ad_service_dropped_values_total{{service="{escape_label(service.name)}"}} {service.queue.dropped + service.queue.coalesced}' for service in services)
+        family("ad_service_setup_seconds", "gauge", "Duration of the last setup of the service")
+        lines.extend(f'ad_service_setup_seconds{{service="{escape_label(name)}"}} {seconds}' for name, seconds in self.setup_seconds.items())
+        family("ad_service_cleanup_seconds", "gauge", "Duration of the last cleanup of the service")
+        lines.extend(f'ad_service_cleanup_seconds{{service="{escape_label(name)}"}} {seconds}' for name, seconds in self.cleanup_seconds.items())
+        family("ad_service_broadcast_seconds", "histogram", "Time taken to encode and emit a value to the subscribers")
+        for name, histogram in self.broadcast_seconds.items():
+            lines.extend(histogram.render("ad_service_broadcast_seconds", f'service="{escape_label(name)}"'))
+        family("ad_service_command_seconds", "histogram", "Time taken to queue and handle a command posted to the service")
+        for name, histogram in self.command_seconds.items():
+            lines.extend(histogram.render("ad_service_command_seconds", f'service="{escape_label(name)}"'))
+        family("ad_sampling_rate_hz", "gauge", "Current rate of the sampling job, driven by its subscribers and idle backoff")
+        lines.extend(f'ad_sampling_rate_hz{{job="{escape_label(name)}"}} {rate}' for name, rate in [*self.sampling_rate.items()])
+        family("ad_sampling_lateness_seconds", "histogram", "Delay between the deadline of a sample and its start")
+        for name, histogram in [*self.sampling_lateness.items()]:
+            lines.extend(histogram.render("ad_sampling_lateness_seconds", f'job="{escape_label(name)}"'))
+        family("ad_sampling_overruns_total", "counter", "Deadlines skipped because the previous sample was still running or whole periods were missed")
+        lines.extend(f'ad_sampling_overruns_total{{job="{escape_label(name)}"}} {count}' for name, count in [*self.sampling_overruns.items()])
+
+        family("ad_clients", "gauge", "Number of connected clients")
+        lines.append(f'ad_clients {len(clients)}')
+        family("ad_client_pending_packets", "gauge", "Packets queued by engine.io and not yet written to the socket of the client")
+        lines.extend(f'ad_client_pending_packets{{client="{escape_label(client)}"}} {client.pending_packets()}' for client in clients)
+        family("ad_client_send_lag_seconds", "gauge", "Time since the socket queue of the client was last seen empty")
+        lines.extend(f'ad_client_send_lag_seconds{{client="{escape_label(client)}"}} {client.send_lag()}' for client in clients)
+        family("ad_client_subscriptions", "gauge", "Number of services the client is subscribed to")
+        lines.extend(f'ad_client_subscriptions{{client="{escape_label(client)}"}} {len(subscriptions.of_client(client))}' for client in clients)
+        frame_subscriptions: list = [subscription for client in clients for subscription in subscriptions.of_client(client) if subscription.slot is not None]
+        family("ad_client_frames_sent_total", "counter", "Frames sent to the client")
+        lines.extend(f'ad_client_frames_sent_total{{client="{escape_label(subscription.client)}",service="{escape_label(subscription.service_name)}"}} {subscription.slot.sent}' for subscription in frame_subscriptions)
+        family("ad_client_frames_dropped_total", "counter", "Frames replaced by a newer one before being sent to the client")
+        lines.extend(f'ad_client_frames_dropped_total{{client="{escape_label(subscription.client)}",service="{escape_label(subscription.service_name)}"}} {subscription.slot.dropped}' for subscription in frame_subscriptions)
+
+        family("ad_event_loop_lag_seconds", "histogram", "Delay of the event loop in waking up a sleeping task")
+        lines.extend(self.loop_lag.render("ad_event_loop_lag_seconds", ""))
+        family("ad_event_loop_last_lag_seconds", "gauge", "Last sampled event loop lag")
+        lines.append(f'ad_event_loop_last_lag_seconds {self.last_loop_lag}')
+        family("ad_threads", "gauge", "Number of threads of the daemon")
+        lines.append(f'ad_threads {threading.active_count()}')
+        return "\n".join(lines) + "\n"
+
+
+metrics: ADMetrics = ADMetrics()
+"""Metrics of this process"""
+
+
+def merge_expositions(expositions: list[tuple[str, str]]) -> str:
+    """
+    Merge the Prometheus text expositions of several processes given as (process, exposition) pairs,
+    the samples of each family are gathered under a single header and labeled with their process
+    """
+    headers: dict[str, list[str]] = {}
+    samples: dict[str, list[str]] = {}
+    for process, exposition in expositions:
+        label: str = f'process="{escape_label(process)}"'
+        name: str = None
+        for line in exposition.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split(" ")[2]
+                if name not in headers:
+                    headers[name] = [line]
+                    samples[name] = []
+            elif line.startswith("# TYPE "):
+                if len(headers[name]) == 1:
+                    headers[name].append(line)
+            elif line != "":
+                metric, value = line.rsplit(" ", 1)
+                metric = metric.replace("{", f'{{{label},', 1) if "{" in metric else f'{metric}{{{label}}}'
+                samples[name].append(f'{metric} {value}')
+    return "\n".join(line for name in headers for line in [*headers[name], *samples[name]]) + "\n"
+
+
+class ADMetricsApp:
+    """
+    ASGI application serving the metrics at /metrics next to the Socket.IO application
+    """
+
+    def __init__(self, scheduler) -> None:
+        self.scheduler = scheduler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        if scope["path"] != "/metrics":
+            await send({"type": "http.response.start", "status": 404, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"not found"})
+            return
+        exposition: str = metrics.render(self.scheduler.service_scheduler.services.values(), self.scheduler.clients.values(), self.scheduler.service_scheduler.subscriptions)
+        hub_link = self.scheduler.hub_link
+        if hub_link is not None:
+            exposition = merge_expositions([(f'worker#{hub_link.index}', exposition), ("hub", await hub_link.get_metrics())])
+            """The services run in the hub, each worker serves their metrics along with its own"""
+        body: bytes = exposition.encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8")]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from logger.logger import logging
+
+
+class ADThreadSampler:
+    """
+    Sample the stacks of every other thread of the process, the samples are
+    written in the collapsed stack format read by flamegraph.pl and speedscope
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval: float = interval
+        self.stacks: collections.Counter = collections.Counter()
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=self.sample, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self) -> None:
+        own_ident: int = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names: dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack: list[str] = []
+                while frame is not None:
+                    stack.append(f'{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+    def threads_summary(self) -> dict[str, int]:
+        """
+        Number of samples of each thread
+        """
+        summary: collections.Counter = collections.Counter()
+        for stack, count in self.stacks.items():
+            summary[stack.partition(";")[0]] += count
+        return dict(summary)
+
+
+class ADProfiler:
+    """
+    Time bounded profile of the running daemon: cProfile of the event loop thread,
+    stack sampling of every other thread and optionally a tracemalloc snapshot
+    Nothing is installed while no capture is running
+    """
+
+    SAMPLING_INTERVAL_SECONDS: float = 0.005
+    """Period at which the stacks of the threads are sampled"""
+
+    MAX_DURATION_SECONDS: float = 300.0
+
+    def __init__(self, directory: str) -> None:
+        self.directory: str = directory
+        self.task: asyncio.Task = None
+        self.stop_requested: asyncio.Event = None
+        """Set to end the running capture before its duration"""
+
+    def __repr__(self) -> str:
+        return f'ADProfiler({self.directory})'
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, duration: float, trace_memory: bool = False) -> asyncio.Task:
+        """
+        Start a capture from the event loop, the returned task gives the written files
+        None is returned when a capture is already running
+        """
+        if self.running:
+            return None
+        if not 0 < duration <= self.MAX_DURATION_SECONDS:
+            raise ValueError(f"profiling duration must be in ]0, {self.MAX_DURATION_SECONDS}] seconds")
+        self.stop_requested = asyncio.Event()
+        self.task = asyncio.get_running_loop().create_task(self.capture(duration, trace_memory))
+        return self.task
+
+    def stop(self) -> bool:
+        """
+        End the running capture early, its files are still written
+        """
+        if not self.running:
+            return False
+        self.stop_requested.set()
+        return True
+
+    async def capture(self, duration: float, trace_memory: bool) -> list[str]:
+        prefix: str = os.path.join(self.directory, f'profile-{time.strftime("%Y%m%d-%H%M%S")}')
+        logging.warning(f"Profiling the daemon for {duration}s{' with tracemalloc' if trace_memory else ''}")
+        started_tracemalloc: bool = trace_memory and not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        sampler: ADThreadSampler = ADThreadSampler(self.SAMPLING_INTERVAL_SECONDS)
+        profile: cProfile.Profile = cProfile.Profile()
+        sampler.start()
+        profile.enable()
+        try:
+            await asyncio.wait_for(self.stop_requested.wait(), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            profile.disable()
+            sampler.stop()
+        snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot() if trace_memory else None
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        files: list[str] = [f'{prefix}-loop.pstats', f'{prefix}-threads.folded']
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, profile.dump_stats, files[0])
+        await loop.run_in_executor(None, sampler.write, files[1])
+        if snapshot is not None:
+            files.append(f'{prefix}.tracemalloc')
+            await loop.run_in_executor(None, snapshot.dump, files[2])
+            for statistic in snapshot.statistics("lineno")[:10]:
+                logging.info(f"Memory: {statistic}")
+        logging.warning(f"Profile written to {files}, samples per thread: {sampler.threads_summary()}")
+        return files
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from logger.logger import logging
+
+from .command_queue import ADCommand, ADCommandQueue, COMMAND_STATUS_DONE, COMMAND_STATUS_ERROR, COMMAND_STATUS_COALESCED, COMMAND_STATUS_REJECTED, COMMAND_STATUS_DROPPED
+from metrics.metrics import metrics
+
+
+class ADCommandHandler:
+    """
+    Hands the commands posted by the clients to post() of a running service and acknowledges them,
+    async services get their commands from a task, the others from a thread as their post() may block
+    """
+
+    def __init__(self, name: str, maxsize: int) -> None:
+        self.name: str = name
+        self.queue: ADCommandQueue = ADCommandQueue(name, maxsize)
+        """Commands posted by the clients, handed to post() of the service"""
+
+        self.service = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.consumer: threading.Thread | asyncio.Task = None
+        self.acknowledgement_tasks: set[asyncio.Task] = set()
+
+    def __repr__(self) -> str:
+        return f'{self.queue}'
+
+    def start(self, service, is_async: bool) -> None:
+        """
+        Called from the event loop once the service is set up
+        """
+        self.service = service
+        self.loop = asyncio.get_running_loop()
+        self.queue.open()
+        if is_async:
+            self.consumer = self.loop.create_task(self.handle_async())
+        else:
+            self.consumer = threading.Thread(target=self.handle, name=f"{self.name}-commands", daemon=True)
+            self.consumer.start()
+
+    def stop(self) -> None:
+        """
+        The pending commands are acknowledged as dropped and the consumer is waited for
+        """
+        for command in self.queue.close():
+            self.acknowledge(command, COMMAND_STATUS_DROPPED)
+        if isinstance(self.consumer, asyncio.Task):
+            if not self.consumer.get_loop().is_closed():
+                self.consumer.cancel()
+        elif self.consumer is not None:
+            self.consumer.join()
+        self.consumer = None
+
+    def post(self, command: ADCommand) -> None:
+        """
+        Queue a command, it is acknowledged once post() of the service returned
+        or right away when it can't be queued
+        """
+        queued, replaced = self.queue.put(command)
+        if replaced is not None:
+            self.acknowledge(replaced, COMMAND_STATUS_COALESCED)
+        if not queued:
+            self.acknowledge(command, COMMAND_STATUS_REJECTED)
+
+    def acknowledge(self, command: ADCommand, status: str, started_ns: int = None, finished_ns: int = None, error: str = None) -> None:
+        """
+        Called from the event loop, acknowledgements are sent without waiting for the client
+        """
+        if finished_ns is not None:
+            metrics.observe_command(self.name, (finished_ns - command.received_ns) / 1e9)
+        if not command.client.connected or self.loop.is_closed():
+            return
+        task: asyncio.Task = self.loop.create_task(command.client.send("post", command.acknowledgement(self.name, status, started_ns, finished_ns, error)))
+        self.acknowledgement_tasks.add(task)
+        task.add_done_callback(self.acknowledgement_tasks.discard)
+
+    def handle(self) -> None:
+        """
+        Thread handing the commands to post() of a threaded or process service
+        """
+        while (command := self.queue.get()) is not None:
+            started_ns: int = time.monotonic_ns()
+            status, error = COMMAND_STATUS_DONE, None
+            try:
+                self.service.post(command.values)
+            except Exception as e:
+                status, error = COMMAND_STATUS_ERROR, str(e)
+                logging.error(f"<{self.name}> failed to handle {command}: {e}")
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.acknowledge, command, status, started_ns, time.monotonic_ns(), error)
+
+    async def handle_async(self) -> None:
+        while (command := await self.queue.get_async()) is not None:
+            started_ns: int = time.monotonic_ns()
+            status, error = COMMAND_STATUS_DONE, None
+            try:
+                await self.service.post(command.values)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status, error = COMMAND_STATUS_ERROR, str(e)
+                logging.error(f"<{self.name}> failed to handle {command}: {e}")
+            self.acknowledge(command, status, started_ns, time.monotonic_ns(), error)
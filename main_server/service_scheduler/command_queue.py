@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import threading
+import time
+
+from logger.logger import logging
+
+COMMAND_STATUS_DONE: str = "done"
+"""post() of the service returned"""
+
+COMMAND_STATUS_ERROR: str = "error"
+"""post() of the service raised"""
+
+COMMAND_STATUS_COALESCED: str = "coalesced"
+"""A newer command with the same coalescing key replaced this one before it was handled"""
+
+COMMAND_STATUS_REJECTED: str = "rejected"
+"""The command queue of the service was full"""
+
+COMMAND_STATUS_DROPPED: str = "dropped"
+"""The service stopped before handling the command"""
+
+
+class ADCommand:
+    """
+    Values posted by a client to a service
+    """
+
+    __slots__ = ("client", "values", "command_id", "key", "timestamp", "received_ns")
+
+    def __init__(self, client, values: dict, command_id=None, key: str = None, timestamp=None) -> None:
+        self.client = client
+        self.values: dict = values
+        self.command_id = command_id
+        """Identifier given by the client, echoed in the acknowledgement"""
+
+        self.key: str = key
+        """Coalescing key, a pending command with the same key is replaced, None to never coalesce"""
+
+        self.timestamp = timestamp
+        """Client clock when it sent the command, echoed in the acknowledgement to measure the round trip"""
+
+        self.received_ns: int = time.monotonic_ns()
+
+    def __repr__(self) -> str:
+        return f'command {self.command_id} of {self.client}'
+
+    def acknowledgement(self, service_name: str, status: str, started_ns: int = None, finished_ns: int = None, error: str = None) -> dict:
+        """
+        Packet of the post event answering this command, with the time it waited in the queue
+        and the time post() took, in milliseconds
+        """
+        acknowledgement: dict = {"service_name": service_name, "id": self.command_id, "status": status}
+        if self.timestamp is not None:
+            acknowledgement["timestamp"] = self.timestamp
+        if started_ns is not None:
+            acknowledgement["queued_ms"] = (started_ns - self.received_ns) / 1e6
+        if finished_ns is not None:
+            acknowledgement["post_ms"] = (finished_ns - started_ns) / 1e6
+        if error is not None:
+            acknowledgement["error"] = error
+        return acknowledgement
+
+
+class ADCommandQueue:
+    """
+    Bounded queue of the commands posted to a service, filled from the event loop
+    and drained in order by a single consumer: a thread calling post() of the threaded
+    and process services, which may block, or a task awaiting post() of the async services
+    A command whose key is pending replaces it in place, the last write wins
+    """
+
+    def __init__(self, name: str, maxsize: int) -> None:
+        self.name: str = name
+        self.maxsize: int = max(1, maxsize)
+        self.commands: collections.deque[ADCommand] = collections.deque()
+        self.keys: dict[str, ADCommand] = {}
+        """Pending commands by coalescing key"""
+
+        self.condition: threading.Condition = threading.Condition()
+        self.available: asyncio.Event = asyncio.Event()
+        self.closed: bool = True
+        self.rejected: int = 0
+        self.coalesced: int = 0
+
+    def __repr__(self) -> str:
+        return f'{self.name} commands[{len(self.commands)}/{self.maxsize}]'
+
+    def open(self) -> None:
+        with self.condition:
+            self.closed = False
+
+    def put(self, command: ADCommand) -> tuple[bool, ADCommand]:
+        """
+        Enqueue a command from the event loop, returns whether it was queued
+        and the pending command it replaced, if any
+        """
+        with self.condition:
+            if self.closed:
+                return False, None
+            previous: ADCommand = self.keys.get(command.key) if command.key is not None else None
+            if previous is not None:
+                self.commands[self.commands.index(previous)] = command
+                self.keys[command.key] = command
+                self.coalesced += 1
+                return True, previous
+            if len(self.commands) >= self.maxsize:
+                self.rejected += 1
+                return False, None
+            self.commands.append(command)
+            if command.key is not None:
+                self.keys[command.key] = command
+            self.condition.notify()
+        self.available.set()
+        return True, None
+
+    def pop(self) -> ADCommand:
+        """
+        Called with the condition held
+        """
+        command: ADCommand = self.commands.popleft()
+        if command.key is not None and self.keys.get(command.key) is command:
+            del self.keys[command.key]
+        return command
+
+    def get(self) -> ADCommand:
+        """
+        Wait for the next command from the consumer thread, None once the queue is closed
+        """
+        with self.condition:
+            while len(self.commands) == 0 and not self.closed:
+                self.condition.wait()
+            return self.pop() if not self.closed else None
+
+    async def get_async(self) -> ADCommand:
+        """
+        Wait for the next command from the consumer task, the queue is only filled from the event loop
+        """
+        while True:
+            with self.condition:
+                if self.closed:
+                    return None
+                if len(self.commands) != 0:
+                    return self.pop()
+            self.available.clear()
+            await self.available.wait()
+
+    def close(self) -> list[ADCommand]:
+        """
+        Stop the consumer and return the commands that were not handled
+        """
+        with self.condition:
+            self.closed = True
+            pending: list[ADCommand] = [*self.commands]
+            self.commands.clear()
+            self.keys = {}
+            self.condition.notify_all()
+        self.available.set()
+        if self.rejected != 0 or self.coalesced != 0:
+            logging.info(f"Command queue <{self.name}> closed with {self.rejected} rejected and {self.coalesced} coalesced command(s)")
+        return pending
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import ast
+import os
+
+from logger.logger import logging
+
+from .process_service import EXECUTION_MODE_THREAD
+
+
+class ADServiceMetadata:
+    """
+    What is known about a service module without importing it
+    """
+
+    def __init__(self, filepath: str, name: str, execution_mode: str, mtime: float, instance: str = None) -> None:
+        self.filepath: str = filepath
+        self.name: str = name
+        self.execution_mode: str = execution_mode
+        """Module level EXECUTION_MODE when it is a string literal"""
+
+        self.mtime: float = mtime
+        """Modification time of the module when it was scanned"""
+
+        self.instance: str = instance
+        """Argument of the Service constructor when the module serves several services, None otherwise"""
+
+    def __repr__(self) -> str:
+        return f'{self.name} ({self.execution_mode})'
+
+
+def scan_service_module(filepath: str) -> ADServiceMetadata:
+    """
+    Statically check that a module defines a Service class and read its metadata,
+    None is returned when the file isn't a service module
+    """
+    name, _ = os.path.splitext(os.path.basename(filepath))
+    try:
+        with open(filepath, "r") as file:
+            tree: ast.Module = ast.parse(file.read(), filename=filepath)
+        mtime: float = os.path.getmtime(filepath)
+    except (OSError, SyntaxError, ValueError) as e:
+        logging.critical(f"Failed to scan <{name}> service at \"{os.path.realpath(filepath)}\" ({e})")
+        return None
+
+    has_service: bool = False
+    execution_mode: str = EXECUTION_MODE_THREAD
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "Service":
+            has_service = True
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets: list = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(target, ast.Name) and target.id == "Service" for target in targets):
+                has_service = True
+            if any(isinstance(target, ast.Name) and target.id == "EXECUTION_MODE" for target in targets):
+                if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                    execution_mode = node.value.value
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) and any(alias.asname == "Service" or alias.name == "Service" for alias in node.names):
+            has_service = True
+
+    if not has_service:
+        logging.critical(f"No Service class found in <{name}> service at \"{os.path.realpath(filepath)}\"")
+        return None
+    return ADServiceMetadata(filepath, name, execution_mode, mtime)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from logger.logger import logging
+
+from .subscriptions import ADSubscriptionRegistry
+from metrics.metrics import metrics
+
+
+class ADFrameStream:
+    """
+    Frames of a service following ADFrameServiceTemplate, handed by the event loop
+    to the ADFrameSlot of every client subscribed to their tier
+    """
+
+    def __init__(self, name: str, subscriptions: ADSubscriptionRegistry) -> None:
+        self.name: str = name
+        self.subscriptions: ADSubscriptionRegistry = subscriptions
+        """Subscriptions of every service, shared with the service scheduler"""
+
+        self.service = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.running: bool = False
+        """Frames are only published between start() and stop()"""
+
+        self.tiers: set[str] = set()
+        """Tiers of the frame stream having subscribers"""
+
+        self.sequence: int = 0
+        self.pending: dict[str, tuple[bytes | memoryview, dict]] = {}
+        """Latest frame of each tier published by the service thread and not handed to the event loop yet"""
+
+        self.lock: threading.Lock = threading.Lock()
+        self.scheduled: bool = False
+        """A callback of the event loop is due to publish the pending frames"""
+
+    def __repr__(self) -> str:
+        return f'frame stream <{self.name}>{sorted(self.tiers)}'
+
+    def start(self, service) -> None:
+        """
+        Called from the event loop before the service is set up, so that it can publish right away
+        """
+        self.service = service
+        self.loop = asyncio.get_running_loop()
+        self.tiers = set()
+        self.running = True
+
+    def stop(self) -> None:
+        self.running = False
+
+    def update_tiers(self) -> None:
+        """
+        Tell a running frame stream which of its tiers have subscribers
+        """
+        if not self.running:
+            return
+        tiers: set[str] = {subscription.slot.tier for subscription in self.subscriptions.of_service(self.name) if subscription.slot is not None}
+        if tiers != self.tiers:
+            self.tiers = tiers
+            logging.info(f"<{self.name}> streams the tiers {sorted(tiers)}")
+            self.service.set_tiers(set(tiers))
+
+    def publish(self, tier: str, frame: bytes | memoryview, metadata: dict) -> None:
+        """
+        Called from the service thread, only the latest frame of each tier is kept until the event loop publishes it
+        and a single callback of the loop is scheduled at a time, however fast the frames come
+        """
+        with self.lock:
+            self.pending[tier] = (frame, metadata)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.loop.call_soon_threadsafe(self.publish_pending)
+
+    def publish_pending(self) -> None:
+        with self.lock:
+            frames, self.pending = self.pending, {}
+            self.scheduled = False
+        for tier, (frame, metadata) in frames.items():
+            self.publish_frame(tier, frame, metadata)
+
+    def publish_frame(self, tier: str, frame: bytes | memoryview, metadata: dict) -> None:
+        """
+        Hand a frame to the slot of every client of its tier, the frame is shared by these clients
+        and a memoryview given by the service is kept as it is, the slots only copy the frames they send
+        """
+        if not self.running:
+            return
+        self.sequence += 1
+        payload: dict = {"service": self.name, "tier": tier, "sequence": self.sequence, "timestamp_ns": time.time_ns(), **metadata, "frame": frame}
+        for subscription in self.subscriptions.of_service(self.name):
+            if subscription.slot is not None and subscription.slot.tier == tier:
+                subscription.slot.put(payload)
+        metrics.observe_frame(self.name)
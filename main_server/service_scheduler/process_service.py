@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+from typing import Callable, TextIO
+
+from ad_types.configuration import ADConfiguration
+
+from logger.logger import logging, setupLogger, stopLogger, ADLogFile
+
+from .shared_ring import ADSharedRing
+from hal.hal import setup_hardware
+
+EXECUTION_MODE_THREAD: str = "thread"
+"""The service runs inside the daemon process"""
+
+EXECUTION_MODE_PROCESS: str = "process"
+"""The service runs in its own worker process"""
+
+
+def worker_main(service_filepath: str, service_name: str, configuration: ADConfiguration, ring: ADSharedRing, connection: multiprocessing.connection.Connection) -> None:
+    """
+    Entry point of a service worker process, it loads the service module
+    and executes the commands received on the control channel
+    Only services following ADServiceTemplate can run in a worker, async services and frame streams
+    need the event loop of the daemon and fail their setup
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    """The daemon handles the interruptions and cleans its workers up"""
+
+    setupLogger(configuration.logging_level, os.path.join(configuration.logging_directory, configuration.logging_filename))
+    setup_hardware(configuration)
+    spec = importlib.util.spec_from_file_location(service_name, service_filepath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    service = module.Service()
+    supported: bool = not inspect.iscoroutinefunction(getattr(service, "run", None)) and not isinstance(getattr(service, "TIERS", None), dict)
+    if not supported:
+        logging.critical(f"<{service_name}> is an async service or a frame stream, which can't run in a worker process")
+    log_file: TextIO = ADLogFile(os.path.join(configuration.logging_directory, f'{service_name}.log'), 0, 0)
+    """Log files are only rotated by the daemon"""
+
+    def notify(values: dict) -> None:
+        if not ring.put(json.dumps(values).encode()):
+            logging.debug("Worker of <%s> dropped %s", service_name, values)
+
+    try:
+        while True:
+            command, *arguments = connection.recv()
+            if command == "setup":
+                connection.send(supported and service.setup(configuration, notify, log_file) != False)
+            elif command == "post":
+                try:
+                    service.post(*arguments)
+                    connection.send(None)
+                except Exception as e:
+                    connection.send(str(e))
+            elif command == "cleanup":
+                service.cleanup()
+                connection.send(True)
+                return
+    except EOFError:
+        logging.warning(f"Worker of <{service_name}> lost its control channel, exiting")
+    finally:
+        log_file.close()
+        ring.close()
+        stopLogger()
+
+
+class ADProcessService:
+    """
+    ADServiceTemplate running the Service of a module in a worker process
+    Values come back through a shared memory ring, setup/cleanup/post go through a pipe,
+    a worker that dies is restarted without affecting the daemon
+    """
+
+    RING_SLOTS: int = 64
+    """Number of values the worker can publish before the daemon reads them"""
+
+    RING_SLOT_SIZE: int = 4096
+    """Max size in bytes of the json encoded values"""
+
+    COMMAND_TIMEOUT_SECONDS: float = 10.0
+    """Max time waited for the worker to acknowledge setup, post and cleanup"""
+
+    RESTART_DELAY_SECONDS: float = 1.0
+    """Time waited before restarting a worker that died"""
+
+    def __init__(self, service_filepath: str, service_name: str) -> None:
+        self.service_filepath: str = service_filepath
+        self.service_name: str = service_name
+        self.context = multiprocessing.get_context("spawn")
+        self.lock: threading.Lock = threading.Lock()
+        self.stopped: threading.Event = threading.Event()
+        self.process: multiprocessing.Process = None
+        self.connection: multiprocessing.connection.Connection = None
+        self.ring: ADSharedRing = None
+        self.reader: threading.Thread = None
+        self.restarts: int = 0
+
+    def __repr__(self) -> str:
+        return f'<{self.service_name}> worker (pid {self.process.pid if self.process is not None else None})'
+
+    def command(self, *command, wait_reply: bool = False):
+        with self.lock:
+            return self.send_command(*command, wait_reply=wait_reply)
+
+    def send_command(self, *command, wait_reply: bool = False):
+        """
+        Called with the lock held, False is returned when the worker can't be reached or doesn't answer in time
+        """
+        try:
+            self.connection.send(command)
+            if not wait_reply:
+                return True
+            if not self.connection.poll(self.COMMAND_TIMEOUT_SECONDS):
+                logging.error(f"{self} didn't answer to {command[0]}")
+                return False
+            return self.connection.recv()
+        except (OSError, EOFError) as e:
+            logging.error(f"Failed to send {command[0]} to {self}: {e}")
+            return False
+
+    def spawn(self) -> bool:
+        """
+        Called with the lock held, it blocks until the worker is set up
+        """
+        self.ring = ADSharedRing(self.RING_SLOTS, self.RING_SLOT_SIZE)
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(target=worker_main, args=(self.service_filepath, self.service_name, self.configuration, self.ring, child_connection), name=f"{self.service_name}-worker", daemon=True)
+        self.process.start()
+        child_connection.close()
+        logging.info(f"Started {self}")
+        return self.send_command("setup", wait_reply=True)
+
+    def release(self) -> None:
+        """
+        Called with the lock held
+        """
+        if self.process.is_alive():
+            self.process.join(self.COMMAND_TIMEOUT_SECONDS)
+        if self.process.is_alive():
+            logging.warning(f"{self} didn't exit, terminating it")
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+        if self.ring.dropped != 0:
+            logging.warning(f"{self} dropped {self.ring.dropped} value(s)")
+        self.ring.close()
+        self.process = None
+
+    def read_values(self) -> None:
+        """
+        Thread forwarding the values of the worker and restarting it when it dies
+        """
+        while not self.stopped.is_set():
+            for payload in self.ring.get_all(0.5):
+                self.notify(json.loads(payload))
+            if self.process.is_alive() or self.stopped.is_set():
+                continue
+            logging.error(f"{self} died with exit code {self.process.exitcode}, restarting it")
+            with self.lock:
+                self.release()
+            self.restarts += 1
+            if self.stopped.wait(self.RESTART_DELAY_SECONDS):
+                return
+            with self.lock:
+                if not self.spawn():
+                    logging.error(f"Failed to restart {self}")
+
+    def setup(self, configuration: ADConfiguration, callable_async_get: Callable[[dict], None], log_file: TextIO) -> bool:
+        """
+        Blocks until the worker is set up, the service wrapper calls it from an executor
+        """
+        self.configuration: ADConfiguration = configuration
+        self.notify: Callable[[dict], None] = callable_async_get
+        self.stopped.clear()
+        with self.lock:
+            if not self.spawn():
+                self.stopped.set()
+                self.connection.close()
+                """The worker exits once its control channel is closed"""
+                self.release()
+                return False
+        self.reader = threading.Thread(target=self.read_values, name=f"{self.service_name}-reader")
+        self.reader.start()
+        return True
+
+    def cleanup(self) -> None:
+        self.stopped.set()
+        self.reader.join()
+        with self.lock:
+            if self.process is not None:
+                self.send_command("cleanup", wait_reply=True)
+                self.release()
+        self.ring = None
+
+    def post(self, values: dict) -> None:
+        """
+        Returns once post() of the worker returned, its errors are raised again so the command is acknowledged as failed
+        """
+        error = self.command("post", values, wait_reply=True)
+        if error is False:
+            raise RuntimeError(f"{self} didn't handle the values")
+        if error is not None:
+            raise RuntimeError(error)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import os
+import struct
+import threading
+
+import numpy
+
+from logger.logger import logging
+
+TELEMETRY_EXTENSION: str = ".telemetry"
+
+HEADER: struct.Struct = struct.Struct("<8sIIQ")
+"""Magic, version, records per chunk and number of records written"""
+
+MAGIC: bytes = b"ADTLMTRY"
+
+VERSION: int = 1
+
+CHUNK_RECORDS: int = 4096
+"""
+Records are stored by chunks holding CHUNK_RECORDS int64 nanosecond timestamps followed by as many float64 values,
+the first timestamp of every chunk makes the time index of the file
+"""
+
+CHUNK_SIZE: int = CHUNK_RECORDS * 16
+
+
+class ADTelemetryFile:
+    """
+    Append-only columnar file of the (timestamp, value) samples of a service
+    Samples are appended by batches, the record count of the header is only updated
+    once the samples are written so that readers never see partial records
+    """
+
+    def __init__(self, filepath: str, writable: bool = False) -> None:
+        self.filepath: str = filepath
+        self.writable: bool = writable
+        self.fd: int = os.open(filepath, (os.O_RDWR | os.O_CREAT) if writable else os.O_RDONLY, 0o644)
+        header: bytes = os.pread(self.fd, HEADER.size, 0)
+        if len(header) < HEADER.size and writable:
+            self.count: int = 0
+            os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, CHUNK_RECORDS, 0), 0)
+        else:
+            magic, version, chunk_records, self.count = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or chunk_records != CHUNK_RECORDS:
+                os.close(self.fd)
+                raise ValueError(f"\"{filepath}\" is not a version {VERSION} telemetry file")
+        self.last_timestamp_ns: int = self.read_last_timestamp() if self.count != 0 else 0
+
+    def __repr__(self) -> str:
+        return f'ADTelemetryFile({self.filepath}, {self.count} records)'
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def columns(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Read-only memory mapped views of the timestamps and values of every chunk, shaped (chunks, CHUNK_RECORDS)
+        """
+        chunks: int = -(-self.count // CHUNK_RECORDS)
+        if chunks == 0:
+            return numpy.empty((0, CHUNK_RECORDS), numpy.int64), numpy.empty((0, CHUNK_RECORDS), numpy.float64)
+        memory: numpy.memmap = numpy.memmap(self.filepath, numpy.uint8, "r", HEADER.size, (chunks * CHUNK_SIZE,))
+        chunked: numpy.ndarray = memory.reshape(chunks, 2, CHUNK_RECORDS * 8)
+        return chunked[:, 0].view(numpy.int64), chunked[:, 1].view(numpy.float64)
+
+    def read_last_timestamp(self) -> int:
+        index: int = self.count - 1
+        offset: int = HEADER.size + (index // CHUNK_RECORDS) * CHUNK_SIZE + (index % CHUNK_RECORDS) * 8
+        return int.from_bytes(os.pread(self.fd, 8, offset), "little", signed=True)
+
+    def append(self, timestamps_ns: numpy.ndarray, values: numpy.ndarray) -> None:
+        """
+        Write a batch of samples, chunk by chunk, then publish them in the header
+        """
+        written: int = 0
+        while written < len(timestamps_ns):
+            chunk, position = divmod(self.count + written, CHUNK_RECORDS)
+            length: int = min(CHUNK_RECORDS - position, len(timestamps_ns) - written)
+            chunk_offset: int = HEADER.size + chunk * CHUNK_SIZE
+            os.pwrite(self.fd, timestamps_ns[written:written + length].astype("<i8").tobytes(), chunk_offset + position * 8)
+            os.pwrite(self.fd, values[written:written + length].astype("<f8").tobytes(), chunk_offset + (CHUNK_RECORDS + position) * 8)
+            written += length
+        self.count += written
+        self.last_timestamp_ns = int(timestamps_ns[-1])
+        size: int = HEADER.size + -(-self.count // CHUNK_RECORDS) * CHUNK_SIZE
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, CHUNK_RECORDS, self.count), 0)
+
+    def read(self, start_ns: int = None, end_ns: int = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Timestamps and values of the samples in [start_ns, end_ns), the time index
+        selects the chunks to look at so only these pages are read from the disk
+        """
+        timestamps, values = self.columns()
+        if self.count == 0:
+            return numpy.empty(0, numpy.int64), numpy.empty(0, numpy.float64)
+        index: numpy.ndarray = timestamps[:, 0]
+        first_chunk: int = max(int(numpy.searchsorted(index, start_ns, "left")) - 1, 0) if start_ns is not None else 0
+        last_chunk: int = int(numpy.searchsorted(index, end_ns, "left")) if end_ns is not None else len(index)
+        end: int = min(last_chunk * CHUNK_RECORDS, self.count) - first_chunk * CHUNK_RECORDS
+        if end <= 0:
+            return numpy.empty(0, numpy.int64), numpy.empty(0, numpy.float64)
+        timestamps = timestamps[first_chunk:last_chunk].reshape(-1)[:end]
+        values = values[first_chunk:last_chunk].reshape(-1)[:end]
+        low: int = int(numpy.searchsorted(timestamps, start_ns, "left")) if start_ns is not None else 0
+        high: int = int(numpy.searchsorted(timestamps, end_ns, "left")) if end_ns is not None else len(timestamps)
+        return numpy.array(timestamps[low:high]), numpy.array(values[low:high])
+
+
+def read_service(directory: str, service_name: str, start_ns: int = None, end_ns: int = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Timestamps (nanoseconds since epoch) and values recorded for a service between start_ns and end_ns
+    """
+    telemetry_file: ADTelemetryFile = ADTelemetryFile(os.path.join(directory, f'{service_name}{TELEMETRY_EXTENSION}'))
+    try:
+        return telemetry_file.read(start_ns, end_ns)
+    finally:
+        telemetry_file.close()
+
+
+class ADTelemetryRecorder:
+    """
+    Record the numeric value of every broadcast sample of every service
+    record() only appends to an in-memory batch, a background thread writes
+    the batches every FLUSH_PERIOD_SECONDS so the SD card isn't hit per sample
+    """
+
+    FLUSH_PERIOD_SECONDS: float = 1.0
+    """Period at which the recorded samples are written"""
+
+    def __init__(self, directory: str) -> None:
+        self.directory: str = directory
+        os.makedirs(directory, exist_ok=True)
+        self.batches: dict[str, tuple[list[int], list[float]]] = {}
+        """Samples of each service waiting to be written"""
+
+        self.files: dict[str, ADTelemetryFile] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=self.worker, name="recorder")
+        self.thread.start()
+        logging.info(f"Recording services telemetry to \"{os.path.realpath(directory)}\"")
+
+    def __repr__(self) -> str:
+        return f'ADTelemetryRecorder({self.directory})'
+
+    def record(self, service_name: str, timestamp_ns: int, values: dict) -> None:
+        """
+        Called from the event loop for every sample, samples without a numeric "value" are not recorded
+        """
+        value = values.get("value")
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return
+        with self.lock:
+            batch: tuple[list[int], list[float]] = self.batches.get(service_name)
+            if batch is None:
+                batch = self.batches[service_name] = ([], [])
+            batch[0].append(timestamp_ns)
+            batch[1].append(value)
+
+    def flush(self) -> None:
+        with self.lock:
+            batches, self.batches = self.batches, {}
+        for service_name, (timestamps, values) in batches.items():
+            try:
+                telemetry_file: ADTelemetryFile = self.files.get(service_name)
+                if telemetry_file is None:
+                    telemetry_file = self.files[service_name] = ADTelemetryFile(os.path.join(self.directory, f'{service_name}{TELEMETRY_EXTENSION}'), writable=True)
+                timestamps_ns: numpy.ndarray = numpy.maximum.accumulate(numpy.array(timestamps, numpy.int64))
+                """The wall clock can step back, timestamps are kept sorted for the time index"""
+
+                numpy.maximum(timestamps_ns, telemetry_file.last_timestamp_ns, out=timestamps_ns)
+                telemetry_file.append(timestamps_ns, numpy.array(values, numpy.float64))
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to record {len(timestamps)} sample(s) of <{service_name}>: {e}")
+
+    def worker(self) -> None:
+        while not self.stopped.wait(self.FLUSH_PERIOD_SECONDS):
+            self.flush()
+        self.flush()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        for telemetry_file in self.files.values():
+            telemetry_file.close()
+        self.files = {}
+        logging.info(f"Stopped {self}")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import collections
+
+
+class ADReplayEntry:
+    """
+    Values delivered by a service with their sequence number
+    """
+
+    __slots__ = ("sequence", "timestamp_ns", "values")
+
+    def __init__(self, sequence: int, timestamp_ns: int, values: dict) -> None:
+        self.sequence: int = sequence
+        self.timestamp_ns: int = timestamp_ns
+        self.values: dict = values
+
+    def __repr__(self) -> str:
+        return f'#{self.sequence} {self.values}'
+
+
+class ADReplayRing:
+    """
+    Bounded history of the values delivered by a service, in sequence order,
+    the oldest values are dropped once the ring is full
+    The ring only holds contiguous sequences so that a replay is never missing values:
+    it starts over on a hole, as when a websocket worker subscribes again to the hub
+    """
+
+    def __init__(self, size: int) -> None:
+        self.entries: collections.deque[ADReplayEntry] = collections.deque(maxlen=max(1, size))
+
+    def __repr__(self) -> str:
+        if len(self.entries) == 0:
+            return 'replay ring(empty)'
+        return f'replay ring(#{self.entries[0].sequence}..#{self.entries[-1].sequence})'
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, sequence: int, timestamp_ns: int, values: dict) -> None:
+        if len(self.entries) != 0 and sequence != self.entries[-1].sequence + 1:
+            self.entries.clear()
+        self.entries.append(ADReplayEntry(sequence, timestamp_ns, values))
+
+    def latest(self) -> ADReplayEntry:
+        return self.entries[-1] if len(self.entries) != 0 else None
+
+    def since(self, sequence: int) -> list[ADReplayEntry]:
+        """
+        Entries following the given sequence number, None when some of them were already dropped
+        or when the sequence is ahead of the ring, as it is for a client of a previous run of the daemon
+        """
+        if len(self.entries) == 0:
+            return None
+        if sequence > self.entries[-1].sequence:
+            return None
+        if sequence + 1 < self.entries[0].sequence:
+            return None
+        entries: list[ADReplayEntry] = []
+        for entry in reversed(self.entries):
+            if entry.sequence <= sequence:
+                break
+            entries.append(entry)
+        entries.reverse()
+        return entries
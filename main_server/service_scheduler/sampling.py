@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import inspect
+import math
+import threading
+import time
+from typing import Awaitable, Callable
+
+from logger.logger import logging
+from metrics.metrics import metrics
+
+SAMPLING_OVERRUN: str = "overrun"
+"""Returned by a sampling callback whose previous sample is still pending elsewhere, the job counts an overrun"""
+
+
+class ADSamplingJob:
+    """
+    Periodic job of a service, fired by the ADSamplingScheduler on absolute monotonic deadlines
+    so that the time spent sampling never shifts the next sample
+    Its rate is the fastest rate requested by the subscribers of the service, bounded by max_rate,
+    and is halved after every IDLE_SAMPLES samples reported as idle, down to min_rate
+    """
+
+    IDLE_SAMPLES: int = 10
+    """Consecutive idle samples after which the rate is halved"""
+
+    def __init__(self, name: str, callback: Callable[[], bool | None] | Callable[[], Awaitable[bool | None]], rate: float, max_rate: float, min_rate: float) -> None:
+        self.name: str = name
+        self.callback = callback
+        """Takes a sample, it returns False when the sample didn't change anything so the job can back off, or SAMPLING_OVERRUN"""
+
+        self.loop: asyncio.AbstractEventLoop = asyncio.get_running_loop() if inspect.iscoroutinefunction(callback) else None
+        """Loop running a coroutine callback, other callbacks run on the threads of the scheduler"""
+
+        self.rate: float = rate
+        """Rate used when a subscriber doesn't ask for one"""
+
+        self.max_rate: float = max(rate, max_rate)
+        self.min_rate: float = min(rate, min_rate)
+        self.demand: float = None
+        """Fastest rate asked by the subscribers, None when one of them takes every value"""
+
+        self.backoff: int = 1
+        """Divider of the rate applied while the samples are idle"""
+
+        self.period: float = 1 / rate
+        self.deadline: float = 0.0
+        self.deadline_tick: int = 0
+        self.busy: bool = False
+        self.closed: bool = False
+        self.samples: int = 0
+        self.overruns: int = 0
+        """Deadlines skipped because the previous sample was still running or the scheduler was late by whole periods"""
+
+        self.idle_samples: int = 0
+        self.max_lateness: float = 0.0
+
+    def __repr__(self) -> str:
+        return f'sampling job <{self.name}> at {1 / self.period:g}Hz'
+
+    def effective_rate(self) -> float:
+        rate: float = min(self.max_rate, self.demand if self.demand is not None else self.rate)
+        if self.backoff == 1:
+            return rate
+        return max(rate / self.backoff, min(rate, self.min_rate))
+
+    def close(self) -> None:
+        """
+        Stop firing the job, a running sample is not interrupted
+        """
+        sampling_scheduler.unregister(self)
+
+    def sampled(self, deadline: float, started: float, result) -> None:
+        """
+        Record how late the sample started and back off or speed up depending on whether it was idle
+        """
+        if result == SAMPLING_OVERRUN:
+            with sampling_scheduler.condition:
+                self.overruns += 1
+            metrics.observe_sampling_overrun(self.name)
+            return
+        lateness: float = max(0.0, started - deadline)
+        self.samples += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        metrics.observe_sampling(self.name, lateness)
+        if result is False:
+            self.idle_samples += 1
+            if self.idle_samples % self.IDLE_SAMPLES == 0 and self.effective_rate() > self.min_rate:
+                self.backoff *= 2
+                sampling_scheduler.update(self)
+        else:
+            self.idle_samples = 0
+            if self.backoff != 1:
+                self.backoff = 1
+                sampling_scheduler.update(self)
+
+    def run(self, deadline: float) -> None:
+        started: float = time.monotonic()
+        result = None
+        try:
+            result = self.callback()
+        except Exception as e:
+            logging.error(f"Sampling job <{self.name}> failed: {e}")
+        finally:
+            self.busy = False
+        self.sampled(deadline, started, result)
+
+    async def run_async(self, deadline: float) -> None:
+        started: float = time.monotonic()
+        result = None
+        try:
+            result = await self.callback()
+        except Exception as e:
+            logging.error(f"Sampling job <{self.name}> failed: {e}")
+        finally:
+            self.busy = False
+        self.sampled(deadline, started, result)
+
+
+class ADSamplingScheduler:
+    """
+    Single thread firing the periodic jobs of every service of the process from a hashed timer wheel:
+    each job sits in the slot of its next deadline, the thread sleeps until the next slot holding a job
+    and hands the due jobs to a small thread pool, or to their event loop for coroutine callbacks
+    A job still running at its next deadline skips it and counts an overrun instead of piling up
+    """
+
+    TICK_SECONDS: float = 0.002
+    """Resolution of the wheel, deadlines are rounded up to a tick so jobs are never fired early"""
+
+    WHEEL_SLOTS: int = 512
+    """Slots of the wheel, a job further than a turn away stays in its slot for the following turns"""
+
+    WORKERS: int = 4
+    """Threads running the samples, a sample may block for a short while, as a sysfs read does"""
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, ADSamplingJob] = {}
+        self.demands: dict[str, float] = {}
+        """Rates asked by the subscribers of each service, kept for the jobs registered after the subscription"""
+
+        self.wheel: list[set[ADSamplingJob]] = [set() for _ in range(self.WHEEL_SLOTS)]
+        self.origin: float = time.monotonic()
+        self.tick: int = 0
+        """Last tick processed by the thread"""
+
+        self.condition: threading.Condition = threading.Condition()
+        self.thread: threading.Thread = None
+        self.executor: concurrent.futures.ThreadPoolExecutor = None
+
+    def __repr__(self) -> str:
+        return f'ADSamplingScheduler{[*self.jobs.keys()]}'
+
+    def tick_of(self, deadline: float) -> int:
+        return math.ceil((deadline - self.origin) / self.TICK_SECONDS)
+
+    def schedule(self, job: ADSamplingJob, deadline: float) -> None:
+        """
+        Called with the condition held
+        """
+        self.wheel[job.deadline_tick % self.WHEEL_SLOTS].discard(job)
+        job.deadline = deadline
+        job.deadline_tick = max(self.tick_of(deadline), self.tick + 1)
+        self.wheel[job.deadline_tick % self.WHEEL_SLOTS].add(job)
+        self.condition.notify()
+
+    def register(self, name: str, callback: Callable[[], bool | None] | Callable[[], Awaitable[bool | None]], rate: float, max_rate: float = None, min_rate: float = None) -> ADSamplingJob:
+        """
+        Fire the callback of a service periodically, at rate unless its subscribers ask for more, up to max_rate,
+        or its samples are idle, down to min_rate; a coroutine callback must be registered from its event loop
+        The job is named after the service so that the subscribers of the service drive its rate
+        """
+        job: ADSamplingJob = ADSamplingJob(name, callback, rate, max_rate if max_rate is not None else rate, min_rate if min_rate is not None else rate)
+        with self.condition:
+            if name in self.jobs:
+                self.jobs[name].closed = True
+                self.wheel[self.jobs[name].deadline_tick % self.WHEEL_SLOTS].discard(self.jobs[name])
+            self.jobs[name] = job
+            job.demand = self.demands.get(name)
+            job.period = 1 / job.effective_rate()
+            if self.thread is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(self.WORKERS, thread_name_prefix="sampling")
+                self.thread = threading.Thread(target=self.worker, name="sampling", daemon=True)
+                self.thread.start()
+            self.schedule(job, time.monotonic())
+        metrics.sampling_rate[name] = 1 / job.period
+        logging.info(f"Registered {job} (rate: {rate:g}Hz, max: {job.max_rate:g}Hz, min: {job.min_rate:g}Hz)")
+        return job
+
+    def unregister(self, job: ADSamplingJob) -> None:
+        with self.condition:
+            if job.closed:
+                return
+            job.closed = True
+            self.wheel[job.deadline_tick % self.WHEEL_SLOTS].discard(job)
+            if self.jobs.get(job.name) is job:
+                del self.jobs[job.name]
+            if len(self.jobs) == 0 and self.thread is not None:
+                self.thread = None
+                self.executor.shutdown(wait=False)
+                self.condition.notify()
+        metrics.sampling_rate.pop(job.name, None)
+        logging.info(f"Unregistered {job} after {job.samples} sample(s), {job.overruns} overrun(s), up to {job.max_lateness * 1000:.1f}ms late")
+
+    def set_demand(self, name: str, rate: float) -> None:
+        """
+        Called by the service wrapper whenever its subscribers change with the fastest rate they ask for,
+        None when one of them takes every value
+        """
+        with self.condition:
+            if rate is None:
+                self.demands.pop(name, None)
+            else:
+                self.demands[name] = rate
+            job: ADSamplingJob = self.jobs.get(name)
+            if job is None:
+                return
+            job.demand = rate
+        self.update(job)
+
+    def update(self, job: ADSamplingJob) -> None:
+        """
+        Apply a new rate to a job, a faster rate takes effect right away from its last deadline
+        """
+        with self.condition:
+            if job.closed:
+                return
+            period: float = 1 / job.effective_rate()
+            if period == job.period:
+                return
+            last_deadline: float = job.deadline - job.period
+            job.period = period
+            if last_deadline + period < job.deadline:
+                self.schedule(job, max(last_deadline + period, time.monotonic()))
+        metrics.sampling_rate[job.name] = 1 / period
+        logging.info(f"Sampling <{job.name}> at {1 / period:g}Hz")
+
+    def fire(self, job: ADSamplingJob, now: float) -> None:
+        """
+        Called with the condition held, the next deadline is the current one plus the period
+        unless whole periods were missed, which are skipped
+        """
+        deadline: float = job.deadline
+        if job.busy:
+            job.overruns += 1
+            metrics.observe_sampling_overrun(job.name)
+        else:
+            job.busy = True
+            if job.loop is not None:
+                if job.loop.is_closed():
+                    job.busy = False
+                else:
+                    asyncio.run_coroutine_threadsafe(job.run_async(deadline), job.loop)
+            else:
+                self.executor.submit(job.run, deadline)
+        next_deadline: float = deadline + job.period
+        if next_deadline <= now:
+            missed: int = int((now - next_deadline) / job.period) + 1
+            job.overruns += missed
+            metrics.observe_sampling_overrun(job.name, missed)
+            next_deadline += missed * job.period
+        self.schedule(job, next_deadline)
+
+    def next_tick(self) -> int:
+        """
+        Called with the condition held, tick of the next slot holding a job, None when the wheel is empty
+        """
+        for offset in range(1, self.WHEEL_SLOTS + 1):
+            if len(self.wheel[(self.tick + offset) % self.WHEEL_SLOTS]) != 0:
+                return self.tick + offset
+        return None
+
+    def worker(self) -> None:
+        """
+        Thread turning the wheel, the ticks missed while it slept or fired are processed on wake up
+        """
+        with self.condition:
+            thread: threading.Thread = self.thread
+            while self.thread is thread:
+                now: float = time.monotonic()
+                current_tick: int = int((now - self.origin) / self.TICK_SECONDS)
+                self.tick = max(self.tick, current_tick - self.WHEEL_SLOTS)
+                """A single turn visits every slot, the rest of a long sleep doesn't need to be replayed"""
+
+                while self.tick < current_tick:
+                    self.tick += 1
+                    for job in [*self.wheel[self.tick % self.WHEEL_SLOTS]]:
+                        if job.deadline_tick <= self.tick:
+                            self.fire(job, now)
+                next_tick: int = self.next_tick()
+                self.condition.wait(None if next_tick is None else self.origin + next_tick * self.TICK_SECONDS - time.monotonic())
+
+
+sampling_scheduler: ADSamplingScheduler = ADSamplingScheduler()
+"""Sampling scheduler of this process, shared by its services"""
@@ -4,14 +4,34 @@ from __future__ import annotations
 
 
 import asyncio
+import inspect
 import os
 import importlib.util
-from typing import Callable, TextIO
+from typing import Awaitable, Callable, TextIO
 import datetime
+import time
 
 from ad_types.configuration import ADConfiguration
 
-from logger.logger import logging
+from logger.logger import logging, ADLogFile
+
+from .value_queue import ADValueQueue
+from .command_queue import ADCommand
+from .command_handler import ADCommandHandler
+from .frame_stream import ADFrameStream
+from .subscription_filter import ADSubscriptionFilter
+from .subscriptions import ADSubscription, ADSubscriptionRegistry
+from .value_filters import ADFilterChain
+from .process_service import ADProcessService, EXECUTION_MODE_PROCESS
+from .discovery import ADServiceMetadata
+from .recorder import ADTelemetryRecorder
+from .replay_ring import ADReplayEntry, ADReplayRing
+from .time_series import ADTimeSeries, downsample
+from .sampling import sampling_scheduler
+from websocket_scheduler import wire_format
+from websocket_scheduler.frame_slot import ADFrameSlot
+from websocket_scheduler.batcher import send_batch
+from metrics.metrics import metrics
 
 
 class ADServiceTemplate:
@@ -35,73 +55,559 @@ class ADServiceTemplate:
         pass
 
 
+class ADAsyncServiceTemplate:
+    """
+    Services defining an async run() are run as tasks of the scheduler event loop, without any thread
+    """
+
+    def setup(self, configuration: ADConfiguration, log_file: TextIO) -> bool:
+        """
+        Function called the first time the service is loaded, before run
+        """
+        return True
+
+    async def run(self, emit: Callable[[dict], Awaitable[None]]) -> None:
+        """
+        Task started the first time the service is loaded and cancelled when it is unloaded
+        the passed emit coroutine should be awaited whenever new values are ready
+        """
+        pass
+
+    def cleanup(self) -> None:
+        """
+        Function called when the service is unloaded, after its run task was cancelled
+        """
+        pass
+
+    async def post(self, values: dict) -> None:
+        """
+        Function called when new values are to be used
+        """
+        pass
+
+
+class ADFrameServiceTemplate:
+    """
+    Services defining TIERS stream binary frames, each tier being a resolution and quality
+    clients choose when subscribing, every client only ever gets the latest frame of its tier
+    """
+
+    TIERS: dict[str, dict] = {"low": {}, "high": {}}
+    """Tiers the clients can subscribe to"""
+
+    DEFAULT_TIER: str = "low"
+    """Tier of the clients not asking for one"""
+
+    def setup(self, configuration: ADConfiguration, callable_publish_frame: Callable[[str, bytes, dict], None], log_file: TextIO) -> bool:
+        """
+        Function called the first time the service is loaded
+        the passed callable_publish_frame(tier, frame, metadata) can be called from any thread whenever a frame
+        of a tier is ready, the frame being bytes or a memoryview that is not modified afterwards
+        """
+        return True
+
+    def set_tiers(self, tiers: set[str]) -> None:
+        """
+        Function called with the tiers having subscribers whenever they change, only these need to be produced
+        """
+        pass
+
+    def cleanup(self) -> None:
+        """
+        Function called when the service is unloaded
+        """
+        pass
+
+    def post(self, values: dict) -> None:
+        """
+        Function called when new values are to be used
+        """
+        pass
+
+
 class ADServiceWrapper:
-    def __init__(self, service_filepath: str, configuration: ADConfiguration) -> None:
+    def __init__(self, metadata: ADServiceMetadata, configuration: ADConfiguration, server, latest_value: Callable[[str], float], subscriptions: ADSubscriptionRegistry) -> None:
         self.configuration = configuration
-        realpath: str = os.path.realpath(service_filepath)
-        filename: str = os.path.basename(service_filepath)
-        service_name, _ = os.path.splitext(filename)
-        self.runner_loop = asyncio.get_event_loop()
+        self.server = server
+        self.latest_value: Callable[[str], float] = latest_value
+        self.metadata: ADServiceMetadata = metadata
+        """Statically scanned metadata, the module itself is only imported by the first subscription"""
+
+        service_name: str = metadata.name
+        self.service: ADServiceTemplate = None
+        self.logging_file: TextIO = None
+        self.execution_mode: str = EXECUTION_MODE_PROCESS if service_name in configuration.process_services.split(",") and metadata.instance is None else metadata.execution_mode
+        """The services sharing a module with others stay in this process, the module may share state between them"""
+        self.is_async: bool = False
+        """The service follows ADAsyncServiceTemplate instead of ADServiceTemplate"""
+
+        self.is_frame_stream: bool = False
+        """The service follows ADFrameServiceTemplate instead of ADServiceTemplate"""
+
+        self.name: str = service_name
+        self.service_id: int = 0
+        """Numeric identifier of the service used by the binary wire formats, set by the service scheduler"""
+
+        self.unit: str = None
+        """Unit of the last values, binary clients get it through the schema"""
+
+        self.last_values: dict = None
+        """Last values sent to the clients"""
+
+        self.sequence: int = 0
+        """Sequence number of the last values, it keeps growing across the restarts and reloads of the service"""
+
+        self.history: ADReplayRing = ADReplayRing(configuration.replay_ring_size)
+        """Last values with their sequence number, the latest is sent to new subscribers and resuming clients get the ones they missed"""
+
+        self.series: ADTimeSeries = None
+        """Numeric values of the service for the history queries, allocated with the first one"""
+
+        self.value_filters: ADFilterChain = ADFilterChain([])
+        """Filters applied to the values posted by the service before they are broadcast"""
+
+        self.room: str = f'service/{service_name}'
+        """Socket.IO room gathering the clients receiving the values of this service"""
+
+        self.subscriptions: ADSubscriptionRegistry = subscriptions
+        """Subscriptions of every service, shared with the service scheduler"""
+
+        self.queue: ADValueQueue = ADValueQueue(service_name, configuration.service_queue_size, configuration.service_queue_policy)
+
+        self.frames: ADFrameStream = ADFrameStream(service_name, subscriptions)
+        """Frames of a frame stream, handed to the slots of its subscribers"""
+
+        self.task: asyncio.Task = None
+        """Task running an async service"""
+
+        self.commands: ADCommandHandler = ADCommandHandler(service_name, configuration.command_queue_size)
+        """Commands posted by the clients, handed to post() of the service"""
+
+        self.running: bool = False
+        """The service was set up and not cleaned up yet"""
+
+        self.start_lock: asyncio.Lock = asyncio.Lock()
+        """Held while the service is loaded and set up"""
+
+        self.recorder: ADTelemetryRecorder = None
+        """Recorder of the broadcast samples, set by the service scheduler when the recording is enabled"""
+
+    def __del__(self):
+        if self.running:
+            self.stop()
+
+    def load(self) -> bool:
+        """
+        Import the service module and build its Service, done once by the first subscription
+        from an executor so that a slow import doesn't stall the loop
+        """
+        if self.service is not None:
+            return True
+        realpath: str = os.path.realpath(self.metadata.filepath)
+        load_start: float = time.perf_counter()
         try:
-            spec = importlib.util.spec_from_file_location(
-                service_name, service_filepath)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            self.service: ADServiceTemplate = module.Service()
-            self.logging_file: TextIO = open(os.path.join(configuration.logging_directory, f'{service_name}.log'), 'a')
-            logging.info(f"Successfully loaded <{service_name}> service at \"{realpath}\" with logfile at \"{self.logging_file.name}\"")
+            if self.execution_mode == EXECUTION_MODE_PROCESS:
+                self.service = ADProcessService(self.metadata.filepath, self.name)
+            else:
+                spec = importlib.util.spec_from_file_location(
+                    self.name, self.metadata.filepath)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.service = module.Service() if self.metadata.instance is None else module.Service(self.metadata.instance)
+            self.logging_file = ADLogFile(os.path.join(self.configuration.logging_directory, f'{self.name}.log'), self.configuration.logging_max_bytes, self.configuration.logging_backup_count)
         except Exception as e:
             self.service = None
-            logging.critical(f"Failed to load <{service_name}> service at \"{realpath}\" ({e})")
-        self.name: str = service_name
-        self.clients = []
+            logging.critical(f"Failed to load <{self.name}> service at \"{realpath}\" ({e})")
+            return False
+        self.is_async = inspect.iscoroutinefunction(getattr(self.service, "run", None))
+        self.is_frame_stream = isinstance(getattr(self.service, "TIERS", None), dict)
+        logging.info(f"Successfully loaded <{self.name}> service at \"{realpath}\" with logfile at \"{self.logging_file.name}\" in {(time.perf_counter() - load_start) * 1000:.1f}ms")
+        return True
 
-    def __del__(self):
-        if len(self.clients) != 0:
-            self.service.cleanup()
+    def stop(self) -> None:
+        """
+        Close the value queue before cleaning up the service so that
+        a worker blocked on a full queue can be joined
+        """
+        if not self.running:
+            return
+        self.running = False
+        logging.info(f"Cleaning up service <{self.name}>")
+        self.commands.stop()
+        if self.is_async:
+            if self.task is not None and not self.task.get_loop().is_closed():
+                self.task.cancel()
+            self.task = None
+        elif self.is_frame_stream:
+            self.frames.stop()
+        else:
+            self.queue.close()
+        cleanup_start: float = time.perf_counter()
+        self.service.cleanup()
+        metrics.cleanup_seconds[self.name] = time.perf_counter() - cleanup_start
+
+    def close_logging_file(self) -> None:
+        """
+        Called once the wrapper is discarded, a reloaded service opens the file again
+        """
+        if self.logging_file is not None:
+            self.logging_file.close()
+
+    async def start(self) -> bool:
+        """
+        Set up the service for its first subscriber, threaded services get
+        a value queue while async services get a task on the running loop
+        A worker process is set up from an executor as it takes until the worker imported the service
+        """
+        logging.info(f"Setting up service <{self.name}>")
+        now: datetime.datetime = datetime.datetime.now()
+        self.logging_file.write(f'[{now.strftime("%Y-%m-%d %H:%M:%S")}] <{self.name}> service started\n')
+        self.value_filters = ADFilterChain.from_description(self.filters_description(), self.latest_value)
+        if len(self.value_filters) != 0:
+            logging.info(f"Filtering values of <{self.name}> through {self.value_filters}")
+        setup_start: float = time.perf_counter()
+        if self.is_async:
+            status: bool = self.service.setup(self.configuration, self.logging_file)
+            if status == False:
+                logging.critical(f'Could not setup service <{self.name}>')
+                return False
+            self.task = asyncio.get_running_loop().create_task(self.run())
+            self.running = True
+            self.commands.start(self.service, self.is_async)
+            metrics.setup_seconds[self.name] = time.perf_counter() - setup_start
+            return True
+        if self.is_frame_stream:
+            self.frames.start(self.service)
+            status: bool = self.service.setup(self.configuration, self.frames.publish, self.logging_file)
+            if status == False:
+                logging.critical(f'Could not setup service <{self.name}>')
+                self.frames.stop()
+                return False
+            self.running = True
+            self.commands.start(self.service, self.is_async)
+            metrics.setup_seconds[self.name] = time.perf_counter() - setup_start
+            self.frames.update_tiers()
+            return True
+        self.queue.start(self.broadcast_values)
+        if self.execution_mode == EXECUTION_MODE_PROCESS:
+            status: bool = await asyncio.get_running_loop().run_in_executor(None, self.service.setup, self.configuration, self.__on_event_callable_wrapper, self.logging_file)
+        else:
+            status: bool = self.service.setup(self.configuration,
+                               self.__on_event_callable_wrapper, self.logging_file)
+        if status == False:
+            logging.critical(f'Could not setup service <{self.name}>')
+            self.queue.close()
+            return False
+        self.running = True
+        self.commands.start(self.service, self.is_async)
+        metrics.setup_seconds[self.name] = time.perf_counter() - setup_start
+        return True
+
+    async def ensure_running(self) -> bool:
+        """
+        Load and set up the service for its first subscriber, concurrent subscribers wait for the first one
+        """
+        async with self.start_lock:
+            return self.running or (await asyncio.get_running_loop().run_in_executor(None, self.load) and await self.start())
+
+    async def run(self) -> None:
+        try:
+            await self.service.run(self.emit)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Service <{self.name}> stopped running: {e}")
+
+    async def emit(self, values: dict) -> None:
+        """
+        Called from the task of an async service, values are broadcast right away
+        """
+        await self.broadcast_values([values])
 
     def __repr__(self) -> str:
         return f'{self.name}'
 
-    async def broadcast(self, event, packet) -> None:
-        logging.debug(f"Broadcasting to {len(self.clients)} clients")
-        for client in self.clients:
-            await client.send(event, packet)
+    def room_for(self, client_wire_format: str) -> str:
+        """
+        Each wire format gets its own room so that every payload is encoded once per format
+        """
+        if client_wire_format == wire_format.WIRE_FORMAT_JSON:
+            return self.room
+        return f'{self.room}/{client_wire_format}'
+
+    def schema(self) -> dict:
+        return wire_format.schema(self.service_id, self.name, self.unit)
+
+    @property
+    def clients(self) -> list:
+        return [subscription.client for subscription in self.subscriptions.of_service(self.name)]
+
+    def requested_rate(self) -> float:
+        """
+        Fastest rate asked by the subscribers through their max_hz or min_interval_ms,
+        None when one of them takes every value
+        """
+        rate: float = 0.0
+        for subscription in self.subscriptions.of_service(self.name):
+            if subscription.subscription_filter is None or subscription.subscription_filter.min_interval == 0:
+                return None
+            rate = max(rate, 1 / subscription.subscription_filter.min_interval)
+        return rate if rate != 0.0 else None
+
+    def update_demand(self) -> None:
+        """
+        Tell the sampling job of the service, if it has one, how fast its subscribers want values
+        """
+        sampling_scheduler.set_demand(self.name, self.requested_rate())
+
+    async def isolate_slow_clients(self) -> None:
+        """
+        Move the clients whose socket queue is backing up out of the room
+        so they don't get more packets until they caught up
+        """
+        max_pending_packets: int = self.configuration.slow_client_max_pending_packets
+        for subscription in [*self.subscriptions.of_service(self.name)]:
+            client = subscription.client
+            lagging: bool = client.pending_packets() > max_pending_packets
+            if lagging and not subscription.isolated:
+                logging.warning(f"{client} is too slow, isolating it from service <{self.name}>")
+                subscription.isolated = True
+                if subscription.in_room:
+                    await client.leave(self.room_for(subscription.wire_format))
+            elif not lagging and subscription.isolated:
+                logging.info(f"{client} caught up, rejoining service <{self.name}>")
+                subscription.isolated = False
+                if subscription.in_room:
+                    await client.join(self.room_for(subscription.wire_format))
+
+    def recipients(self, values: dict) -> dict[str, tuple[list[str], list]]:
+        """
+        Rooms to emit the values to and batchers to add them to for each wire format in use:
+        the service room and every individually delivered client accepting these values
+        """
+        now: float = time.monotonic()
+        recipients: dict[str, tuple[list[str], list]] = {}
+        for subscription in self.subscriptions.of_service(self.name):
+            if subscription.wire_format not in recipients:
+                recipients[subscription.wire_format] = ([self.room_for(subscription.wire_format)], [])
+            if subscription.in_room or subscription.isolated:
+                continue
+            if subscription.subscription_filter is not None and not subscription.subscription_filter.accept(values, now):
+                continue
+            rooms, batchers = recipients[subscription.wire_format]
+            if subscription.batcher is not None:
+                batchers.append(subscription.batcher)
+            else:
+                rooms.append(subscription.client.sid)
+        return recipients
+
+    async def update_unit(self, values: dict) -> None:
+        """
+        Binary payloads don't carry the unit, the schema is sent again whenever it changes
+        """
+        unit: str = values.get("unit")
+        if unit == self.unit:
+            return
+        self.unit = unit
+        binary_rooms: list[str] = [self.room_for(client_wire_format) for client_wire_format in {subscription.wire_format for subscription in self.subscriptions.of_service(self.name)} if client_wire_format != wire_format.WIRE_FORMAT_JSON]
+        if len(binary_rooms) != 0:
+            await self.server.emit("schema", self.schema(), room=binary_rooms)
+
+    async def broadcast(self, event, packet, rooms: list[str] = None) -> None:
+        """
+        The packet is encoded once by the Socket.IO manager
+        and written to every client of the rooms concurrently
+        """
+        logging.debug("Broadcasting to %d clients", self.subscriptions.count(self.name))
+        await self.isolate_slow_clients()
+        await self.server.emit(event, packet, room=rooms if rooms is not None else self.room)
+
+    def filters_description(self) -> str:
+        """
+        The service_filters configuration overrides the FILTERS attribute of the service
+        """
+        for entry in self.configuration.service_filters.split(";"):
+            name, _, description = entry.partition("=")
+            if name.strip() == self.name:
+                return description
+        return getattr(self.service, "FILTERS", "")
+
+    async def broadcast_values(self, batch: list[dict]) -> None:
+        batch = self.value_filters.process(batch)
+        for values in batch:
+            broadcast_start: float = time.perf_counter()
+            timestamp_ns: int = time.time_ns()
+            if self.recorder is not None:
+                self.recorder.record(self.name, timestamp_ns, values)
+            self.sequence += 1
+            self.record_series(values, timestamp_ns)
+            await self.deliver(values, timestamp_ns, self.sequence)
+            metrics.observe_broadcast(self.name, time.perf_counter() - broadcast_start)
+
+    def record_series(self, values: dict, timestamp_ns: int) -> None:
+        value = values.get("value")
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return
+        if self.series is None:
+            self.series = ADTimeSeries(self.configuration.history_size)
+        self.series.append(timestamp_ns, value)
+
+    async def get_history(self, window_seconds: float, max_points: int, mode: str) -> dict:
+        """
+        Numeric values of the last window_seconds downsampled to max_points,
+        the window is cut on the event loop and downsampled on a thread of the loop
+        """
+        end_ns: int = time.time_ns()
+        start_ns: int = end_ns - int(window_seconds * 1e9)
+        timestamps, values = (self.series if self.series is not None else ADTimeSeries(2)).window(start_ns, end_ns)
+        points: dict[str, list] = await asyncio.get_running_loop().run_in_executor(None, downsample, timestamps, values, start_ns, end_ns, max_points, mode)
+        return {"service_name": self.name, "unit": self.unit, "mode": mode, "start_ns": start_ns, "end_ns": end_ns, "samples": len(timestamps), **points}
+
+    async def deliver(self, values: dict, timestamp_ns: int, sequence: int) -> None:
+        """
+        Encode the filtered values once per wire format in use and send them to the subscribers
+        """
+        self.last_values = values
+        self.history.append(sequence, timestamp_ns, values)
+        await self.update_unit(values)
+        for client_wire_format, (rooms, batchers) in self.recipients(values).items():
+            payload = wire_format.encode(client_wire_format, self.service_id, self.name, self.unit, values, timestamp_ns, sequence)
+            await self.broadcast("notify_values", payload, rooms)
+            for batcher in batchers:
+                batcher.add(payload)
+
+    def post(self, command: ADCommand) -> bool:
+        """
+        Queue a command posted by a client, it is acknowledged once post() of the service returned
+        or right away when it can't be queued
+        """
+        if not self.running:
+            return False
+        self.commands.post(command)
+        return True
 
     def __on_event_callable_wrapper(self, values: dict) -> None:
-        logging.debug(f"Service <{self.name}> posting {values}...")
-        task = self.runner_loop.create_task(self.broadcast("notify_values", {"service": self.name, "values": values}))
-        self.runner_loop.run_until_complete(task)
-        logging.debug(f"Service <{self.name}> posted {values}")
-
-    def subscribe(self, client) -> bool:
-        if client not in self.clients:
-            if len(self.clients) == 0:
-                logging.info(f"Setting up service <{self.name}>")
-                now: datetime.datetime = datetime.datetime.now()
-                print(f'[{now.strftime("%Y-%m-%d %H:%M:%S")}] <{self.name}> service started', file=self.logging_file, flush=True)
-                status: bool = self.service.setup(self.configuration,
-                                   self.__on_event_callable_wrapper, self.logging_file)
-                if status == False:
-                    logging.critical(f'Could not setup service <{self.name}>')
-                    return False
-            self.clients.append(client)
-            client.subscribe(self)
-            return True
-        else:
+        """
+        Called from the service thread, the values are handed to the event loop
+        through the service queue so that the service never waits on the clients
+        """
+        self.queue.put(values)
+
+    async def subscribe(self, client, subscription_filter: ADSubscriptionFilter = None, tier: str = None, frame_ack: bool = False, after_sequence: int = None) -> bool:
+        """
+        The tier and frame acknowledgements only apply to frame streams,
+        they are delivered to each client through its own ADFrameSlot
+        A resuming client gives the sequence number of the last values it got to be sent the following ones
+        """
+        if self.subscriptions.get(client, self.name) is not None:
             logging.warning(
                 f"{client} is already subscribed to service <{self.name}>")
             return False
+        if not await self.ensure_running():
+            return False
+        subscription: ADSubscription = ADSubscription(client, self.name, client.wire_format, subscription_filter, client.batcher)
+        if self.is_frame_stream:
+            tier = tier if tier is not None else self.service.DEFAULT_TIER
+            if tier not in self.service.TIERS:
+                logging.warning(f"{client} asked for unknown tier {tier} of <{self.name}>, available ones are {[*self.service.TIERS.keys()]}")
+                if self.subscriptions.count(self.name) == 0:
+                    self.stop()
+                return False
+            subscription.slot = ADFrameSlot(client, tier, frame_ack)
+            subscription.batcher = None
+            subscription.subscription_filter = None
+            logging.info(f"{client} subscribed to the {tier} tier of <{self.name}>")
+        self.subscriptions.add(subscription)
+        self.frames.update_tiers()
+        self.update_demand()
+        if subscription.wire_format != wire_format.WIRE_FORMAT_JSON:
+            await client.send("schema", self.schema())
+        if subscription.batcher is not None:
+            logging.info(f"{client} subscribed to <{self.name}> through its {subscription.batcher}")
+        if subscription_filter is not None:
+            logging.info(f"{client} subscribed to <{self.name}> with {subscription_filter}")
+        if subscription.in_room:
+            await client.join(self.room_for(subscription.wire_format))
+        await self.catch_up(subscription, after_sequence)
+        return True
 
-    def unsubscribe(self, client) -> bool:
-        try:
-            self.clients.remove(client)
-            client.unsubscribe(self)
-            if len(self.clients) == 0:
-                logging.info(f"Cleaning up service <{self.name}>")
-                self.service.cleanup()
-            return True
-        except:
+    def encode_entry(self, subscription: ADSubscription, entry: ADReplayEntry):
+        return wire_format.encode(subscription.wire_format, self.service_id, self.name, self.unit, entry.values, entry.timestamp_ns, entry.sequence)
+
+    async def catch_up(self, subscription: ADSubscription, after_sequence: int = None) -> None:
+        """
+        Send the values following after_sequence to a resuming subscriber in a single notify_batch frame,
+        the other subscribers, and the resuming ones whose values are no longer all in the history,
+        get a snapshot of the latest values, marked as such with its timestamp in json
+        The subscriber joined the room beforehand so nothing is missed, a value delivered meanwhile
+        can be sent twice and clients drop the sequence numbers they already have
+        """
+        if self.is_frame_stream:
+            return
+        if after_sequence is not None:
+            entries: list[ADReplayEntry] = self.history.since(after_sequence)
+            if entries is not None:
+                if len(entries) != 0:
+                    logging.info(f"Replaying {len(entries)} value(s) of <{self.name}> to {subscription.client}")
+                    await send_batch(subscription.client, subscription.wire_format, [self.encode_entry(subscription, entry) for entry in entries])
+                return
+            logging.info(f"{subscription.client} missed values of <{self.name}> that are no longer in its {self.history}, sending a snapshot")
+        entry: ADReplayEntry = self.history.latest()
+        if entry is None:
+            return
+        if subscription.subscription_filter is not None:
+            subscription.subscription_filter.accept(entry.values)
+        payload = self.encode_entry(subscription, entry)
+        if isinstance(payload, dict):
+            payload["snapshot"] = True
+            payload["timestamp_ns"] = entry.timestamp_ns
+        await subscription.client.send("notify_values", payload)
+
+    async def unsubscribe(self, client) -> bool:
+        subscription: ADSubscription = self.subscriptions.remove(client, self.name)
+        if subscription is None:
             logging.warning(
                 f"{client} is not subscribed to service <{self.name}> but tried to unsubscribe")
             return False
+        await self.release(subscription)
+        return True
+
+    async def release(self, subscription: ADSubscription) -> None:
+        """
+        Take a client, whose subscription was removed from the registry, out of the room
+        and stop the service once it has no subscriber left
+        """
+        if subscription.in_room and not subscription.isolated and subscription.client.connected:
+            await subscription.client.leave(self.room_for(subscription.wire_format))
+        if subscription.slot is not None:
+            logging.info(f"{subscription.client} left <{self.name}> after its {subscription.slot}")
+            subscription.slot.close()
+            self.frames.update_tiers()
+        if self.subscriptions.count(self.name) == 0:
+            self.stop()
+        else:
+            self.update_demand()
+
+    async def take_over(self, previous: ADServiceWrapper) -> bool:
+        """
+        Replace a previous version of the same service: the previous one is cleaned up before
+        this one is set up, the subscriptions are indexed by service name and rooms are named
+        after the service so the subscribers don't notice the change
+        """
+        self.service_id = previous.service_id
+        self.unit = previous.unit
+        self.last_values = previous.last_values
+        self.sequence = previous.sequence
+        self.history = previous.history
+        self.series = previous.series
+        self.frames.sequence = previous.frames.sequence
+        previous.stop()
+        previous.close_logging_file()
+        subscribers: int = self.subscriptions.count(self.name)
+        if subscribers == 0:
+            return True
+        if not await self.ensure_running():
+            logging.error(f"<{self.name}> failed to restart, its {subscribers} subscriber(s) wait for the next change")
+            return False
+        logging.info(f"Moved {subscribers} subscriber(s) to the new version of <{self.name}>")
+        return True
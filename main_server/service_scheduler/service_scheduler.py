@@ -2,39 +2,146 @@
 
 from __future__ import annotations
 
+import asyncio
+import os
+import time
+from typing import Callable
+
 from ad_types.configuration import ADConfiguration
-from utils.utils import get_matching_filenames_in_directory
+from utils.utils import get_matching_filenames_in_directory, parse_sensor_pins
 from logger.logger import logging
 from .service import ADServiceWrapper
+from .discovery import ADServiceMetadata, scan_service_module
+from .process_service import EXECUTION_MODE_THREAD
+from .watcher import ADServiceWatcher
+from .recorder import ADTelemetryRecorder
+from .subscription_filter import ADSubscriptionFilter
+from .command_queue import ADCommand
+from .subscriptions import ADSubscription, ADSubscriptionRegistry, match_services
 from websocket_scheduler.client import ADClient
 
+DISTANCE_SENSOR_MODULE: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "services", "sensors", "distance_sensor.py")
+"""Module of the services publishing the sensors of the distance_sensors configuration"""
+
 
 class ADServiceScheduler:
-    def __init__(self, configuration: ADConfiguration) -> None:
+    def __init__(self, configuration: ADConfiguration, server, service_wrapper: Callable[..., ADServiceWrapper] = ADServiceWrapper) -> None:
+        self.configuration: ADConfiguration = configuration
+        self.server = server
+        self.service_wrapper: Callable[..., ADServiceWrapper] = service_wrapper
+        """Builds the wrapper of each service, the hub and its workers replace how values are delivered"""
+
+        self.subscriptions: ADSubscriptionRegistry = ADSubscriptionRegistry()
+        self.recorder: ADTelemetryRecorder = ADTelemetryRecorder(configuration.recording_directory) if configuration.recording_directory != "" else None
+        discovery_start: float = time.perf_counter()
         files: list[str] = get_matching_filenames_in_directory(
             configuration.services_directory_path, ".py")
         self.services: dict[str, ADServiceWrapper] = {
-            i.name: i for i in filter(lambda x: x.service != None, map(lambda file: ADServiceWrapper(file, configuration), files))}
+            i.name: self.wrap(i) for i in filter(None, map(scan_service_module, files))}
+        for metadata in self.distance_sensors():
+            if metadata.name in self.services:
+                logging.warning(f"Distance sensor <{metadata.name}> is shadowed by the service module of the same name in {configuration.services_directory_path}")
+            else:
+                self.services[metadata.name] = self.wrap(metadata)
+        for service_id, service in enumerate(self.services.values()):
+            service.service_id = service_id
+        self.next_service_id: int = len(self.services)
+        """Identifiers are never reused so that binary clients can't mix up a removed service with a new one"""
+
+        self.watcher: ADServiceWatcher = ADServiceWatcher(configuration.services_directory_path, ".py", self.reload)
+        self.reload_lock: asyncio.Lock = asyncio.Lock()
+        logging.info(f"Discovered {len(self.services)} service(s) in {(time.perf_counter() - discovery_start) * 1000:.1f}ms, they are loaded on their first subscription")
 
     def __repr__(self) -> str:
         return f"{[*self.services.keys()]}"
 
+    def wrap(self, metadata: ADServiceMetadata) -> ADServiceWrapper:
+        service: ADServiceWrapper = self.service_wrapper(metadata, self.configuration, self.server, self.latest_value, self.subscriptions)
+        service.recorder = self.recorder
+        return service
+
+    def distance_sensors(self) -> list[ADServiceMetadata]:
+        """
+        One service per sensor of the distance_sensors configuration, named after it,
+        they are all fed by the HCSR04Array shared by the process
+        """
+        mtime: float = os.path.getmtime(DISTANCE_SENSOR_MODULE)
+        return [ADServiceMetadata(DISTANCE_SENSOR_MODULE, name, EXECUTION_MODE_THREAD, mtime, name) for name in parse_sensor_pins(self.configuration.distance_sensors)]
+
+    def match(self, service_names: list[str]) -> list[str]:
+        """
+        Expand the glob patterns ("*", "sensor_?", ...) of the requested services against the known ones
+        """
+        return match_services(service_names, self.services.keys())
+
+    def latest_value(self, service_name: str) -> float:
+        """
+        Last numeric value sent by a service, None if it has none
+        """
+        service: ADServiceWrapper = self.services.get(service_name)
+        if service is None or service.last_values is None:
+            return None
+        value = service.last_values.get("value")
+        return value if isinstance(value, (int, float)) else None
+
+    def watch(self) -> None:
+        """
+        Reload the services whose module changes, must be called from the running event loop
+        """
+        self.watcher.start()
+
+    async def reload(self, filepaths: set[str]) -> None:
+        """
+        Apply the changes of the service directory: new modules are added, deleted ones are removed
+        and modified ones are rebuilt, keeping their subscribers
+        A module that fails to scan while it still exists keeps its previous version running
+        """
+        async with self.reload_lock:
+            for filepath in sorted(filepaths):
+                name, _ = os.path.splitext(os.path.basename(filepath))
+                previous: ADServiceWrapper = self.services.get(name)
+                if not os.path.isfile(filepath):
+                    if previous is not None and previous.metadata.filepath == filepath:
+                        await self.remove_service(previous)
+                    continue
+                metadata: ADServiceMetadata = scan_service_module(filepath)
+                if metadata is None or (previous is not None and previous.metadata.mtime == metadata.mtime):
+                    continue
+                service: ADServiceWrapper = self.wrap(metadata)
+                self.services[name] = service
+                if previous is None:
+                    service.service_id = self.next_service_id
+                    self.next_service_id += 1
+                    logging.info(f"Added service <{name}>")
+                else:
+                    logging.info(f"Reloading service <{name}>")
+                    await service.take_over(previous)
+
+    async def remove_service(self, service: ADServiceWrapper) -> None:
+        logging.info(f"Removing service <{service.name}> and its {self.subscriptions.count(service.name)} subscriber(s)")
+        self.services.pop(service.name)
+        for subscription in [*self.subscriptions.of_service(service.name)]:
+            await service.unsubscribe(subscription.client)
+            await subscription.client.send("service_removed", {"service_name": service.name})
+        service.close_logging_file()
+
     def stop(self) -> None:
         logging.info("Cleaning up all services")
+        self.watcher.stop()
         for name, service in self.services.items():
-            if len(service.clients) != 0:
-                logging.info(f"Cleaning up service <{name}>")
-                service.service.cleanup()
+            service.stop()
         self.services = []
+        if self.recorder is not None:
+            self.recorder.stop()
         logging.info("Successfully cleaned up all services")
 
-    async def subscribe(self, service_name: str, client: ADClient) -> bool:
+    async def subscribe(self, service_name: str, client: ADClient, subscription_filter: ADSubscriptionFilter = None, tier: str = None, frame_ack: bool = False, after_sequence: int = None) -> bool:
         if service_name not in self.services:
             logging.warning(
                 f"Client {client} tried to subscribe to non existing service {service_name}")
             return False
         logging.debug(f"{client} subscribing to <{service_name}> ...")
-        if not self.services[service_name].subscribe(client):
+        if not await self.services[service_name].subscribe(client, subscription_filter, tier, frame_ack, after_sequence):
             return False
         else:
             logging.info(f"{client} subscribed to <{service_name}>")
@@ -46,8 +153,44 @@ class ADServiceScheduler:
                 f"Client {client} tried to unsubscribe to non existing service {service_name}")
             return False
         logging.debug(f"{client} unsubscribing from <{service_name}> ...")
-        if not self.services[service_name].unsubscribe(client):
+        if not await self.services[service_name].unsubscribe(client):
             return False
         else:
             logging.info(f"{client} unsubscribed from <{service_name}>")
             return True
+
+    async def unsubscribe_all(self, client: ADClient) -> int:
+        """
+        Remove every subscription of a client at once, used when it disconnects,
+        services left without subscribers are stopped
+        """
+        subscriptions: list[ADSubscription] = self.subscriptions.remove_client(client)
+        for subscription in subscriptions:
+            service: ADServiceWrapper = self.services.get(subscription.service_name)
+            if service is not None:
+                await service.release(subscription)
+        if len(subscriptions) != 0:
+            logging.info(f"{client} unsubscribed from {len(subscriptions)} service(s)")
+        return len(subscriptions)
+
+    async def get_history(self, service_name: str, window_seconds: float, max_points: int, mode: str) -> dict:
+        """
+        Downsampled values of the last window_seconds of a service, None if the service doesn't exist
+        """
+        service: ADServiceWrapper = self.services.get(service_name)
+        if service is None:
+            return None
+        return await service.get_history(window_seconds, max_points, mode)
+
+    def post(self, service_name: str, command: ADCommand) -> bool:
+        """
+        Queue a command for a running service, services are started by their first subscription
+        """
+        service: ADServiceWrapper = self.services.get(service_name)
+        if service is None:
+            logging.warning(f"{command.client} tried to post to non existing service {service_name}")
+            return False
+        if not service.post(command):
+            logging.warning(f"{command.client} tried to post to <{service_name}> which isn't running")
+            return False
+        return True
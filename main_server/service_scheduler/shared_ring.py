@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import multiprocessing
+import multiprocessing.shared_memory
+import struct
+import threading
+
+HEADER: struct.Struct = struct.Struct("<QQQ")
+"""Write index, read index and number of dropped values at the start of the shared memory"""
+
+SLOT_LENGTH: struct.Struct = struct.Struct("<I")
+"""Length of the payload stored at the start of each slot"""
+
+
+class ADSharedRing:
+    """
+    Single consumer ring buffer of fixed size slots in shared memory
+    The producer writes a slot, publishes it by bumping the write index and releases
+    the semaphore, which also acts as the memory barrier for the consumer
+    """
+
+    def __init__(self, slots: int, slot_size: int, name: str = None, semaphore=None) -> None:
+        self.slots: int = slots
+        self.slot_size: int = slot_size
+        self.owner: bool = name is None
+        size: int = HEADER.size + slots * slot_size
+        self.memory: multiprocessing.shared_memory.SharedMemory = multiprocessing.shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.semaphore = semaphore if semaphore is not None else multiprocessing.get_context("spawn").Semaphore(0)
+        self.lock: threading.Lock = threading.Lock()
+        if self.owner:
+            HEADER.pack_into(self.memory.buf, 0, 0, 0, 0)
+
+    def __getstate__(self) -> dict:
+        return {"slots": self.slots, "slot_size": self.slot_size, "name": self.memory.name, "semaphore": self.semaphore}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["slots"], state["slot_size"], state["name"], state["semaphore"])
+
+    @property
+    def dropped(self) -> int:
+        return HEADER.unpack_from(self.memory.buf, 0)[2]
+
+    def put(self, data: bytes) -> bool:
+        """
+        Write a payload from the producer process, it is dropped if the ring is full or if it doesn't fit in a slot
+        """
+        with self.lock:
+            write_index, read_index, dropped = HEADER.unpack_from(self.memory.buf, 0)
+            if write_index - read_index >= self.slots or len(data) > self.slot_size - SLOT_LENGTH.size:
+                struct.pack_into("<Q", self.memory.buf, 16, dropped + 1)
+                return False
+            offset: int = HEADER.size + (write_index % self.slots) * self.slot_size
+            SLOT_LENGTH.pack_into(self.memory.buf, offset, len(data))
+            self.memory.buf[offset + SLOT_LENGTH.size:offset + SLOT_LENGTH.size + len(data)] = data
+            struct.pack_into("<Q", self.memory.buf, 0, write_index + 1)
+        self.semaphore.release()
+        return True
+
+    def get_all(self, timeout: float) -> list[bytes]:
+        """
+        Wait up to timeout seconds for payloads and read every published one from the consumer process
+        """
+        self.semaphore.acquire(timeout=timeout)
+        write_index, read_index, _ = HEADER.unpack_from(self.memory.buf, 0)
+        payloads: list[bytes] = []
+        for index in range(read_index, write_index):
+            offset: int = HEADER.size + (index % self.slots) * self.slot_size
+            length: int = SLOT_LENGTH.unpack_from(self.memory.buf, offset)[0]
+            payloads.append(bytes(self.memory.buf[offset + SLOT_LENGTH.size:offset + SLOT_LENGTH.size + length]))
+        struct.pack_into("<Q", self.memory.buf, 8, write_index)
+        return payloads
+
+    def close(self) -> None:
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
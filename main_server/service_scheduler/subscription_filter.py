@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import math
+import time
+
+
+class ADSubscriptionFilter:
+    """
+    Per subscription delivery filter
+    It throttles the values sent to a client and suppresses the ones that didn't change enough
+    """
+
+    OPTIONS: list[str] = ["max_hz", "min_interval_ms", "deadband"]
+    """Subscribe packet keys used to build a filter"""
+
+    INTERVAL_TOLERANCE: float = 0.1
+    """Fraction of the interval a value may arrive early by, services sampling at the rate asked by the client jitter around it"""
+
+    def __init__(self, min_interval: float = 0.0, deadband: float = 0.0) -> None:
+        self.min_interval: float = min_interval
+        """Minimum number of seconds between two values sent to the client"""
+
+        self.deadband: float = deadband
+        """Minimum change of a numeric value worth sending to the client"""
+
+        self.last_sent_time: float = None
+        self.last_sent_values: dict = None
+
+    def __repr__(self) -> str:
+        return f'filter(min_interval={self.min_interval}s, deadband={self.deadband})'
+
+    @staticmethod
+    def from_options(options: dict) -> ADSubscriptionFilter:
+        """
+        Build a filter from the options of a subscribe packet,
+        None is returned when the client wants every value
+        and a ValueError is raised on invalid options
+        """
+        if not any(key in options for key in ADSubscriptionFilter.OPTIONS):
+            return None
+        min_interval: float = 0.0
+        if "max_hz" in options:
+            max_hz: float = float(options["max_hz"])
+            if not math.isfinite(max_hz) or max_hz <= 0:
+                raise ValueError("\"max_hz\" must be a strictly positive number")
+            min_interval = 1.0 / max_hz
+        if "min_interval_ms" in options:
+            min_interval_ms: float = float(options["min_interval_ms"])
+            if not math.isfinite(min_interval_ms) or min_interval_ms < 0:
+                raise ValueError("\"min_interval_ms\" must be a positive number")
+            min_interval = max(min_interval, min_interval_ms / 1000)
+        deadband: float = float(options.get("deadband", 0.0))
+        if not math.isfinite(deadband) or deadband < 0:
+            raise ValueError("\"deadband\" must be a positive number")
+        return ADSubscriptionFilter(min_interval, deadband)
+
+    def changed_enough(self, values: dict) -> bool:
+        if self.deadband == 0 or self.last_sent_values is None:
+            return True
+        for key, value in values.items():
+            last_value = self.last_sent_values.get(key)
+            if isinstance(value, (int, float)) and isinstance(last_value, (int, float)):
+                if abs(value - last_value) >= self.deadband:
+                    return True
+            elif value != last_value:
+                return True
+        return False
+
+    def accept(self, values: dict, now: float = None) -> bool:
+        """
+        Tell if the values should be sent to the client and remember them if so
+        """
+        now = time.monotonic() if now is None else now
+        if self.last_sent_time is not None and now - self.last_sent_time < self.min_interval * (1 - self.INTERVAL_TOLERANCE):
+            return False
+        if not self.changed_enough(values):
+            return False
+        self.last_sent_time = now
+        self.last_sent_values = values
+        return True
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import fnmatch
+from typing import Iterable
+
+from .subscription_filter import ADSubscriptionFilter
+
+
+class ADSubscription:
+    """
+    A client subscribed to a service and the way its values are delivered
+    """
+
+    __slots__ = ("client", "service_name", "wire_format", "subscription_filter", "batcher", "slot", "isolated")
+
+    def __init__(self, client, service_name: str, wire_format: str, subscription_filter: ADSubscriptionFilter = None, batcher=None, slot=None) -> None:
+        self.client = client
+        self.service_name: str = service_name
+        self.wire_format: str = wire_format
+        """Wire format negotiated by the client when subscribing"""
+
+        self.subscription_filter: ADSubscriptionFilter = subscription_filter
+        self.batcher = batcher
+        """ADClientBatcher the values are added to instead of being emitted right away"""
+
+        self.slot = slot
+        """ADFrameSlot the frames of a frame stream are delivered through"""
+
+        self.isolated: bool = False
+        """The client was temporarily removed from the room because it can't keep up"""
+
+    def __repr__(self) -> str:
+        return f'{self.client} -> <{self.service_name}> ({self.wire_format})'
+
+    @property
+    def in_room(self) -> bool:
+        """
+        Unfiltered and unbatched subscriptions are delivered through the room of their wire format,
+        the other ones, and the frame streams, are delivered individually
+        """
+        return self.subscription_filter is None and self.batcher is None and self.slot is None
+
+
+class ADSubscriptionRegistry:
+    """
+    Index of the subscriptions by service and by client, every lookup, addition and removal
+    is a hash table operation. Subscriptions are indexed by service name so that
+    they are kept when a service is reloaded
+    """
+
+    def __init__(self) -> None:
+        self.by_service: dict[str, dict[object, ADSubscription]] = {}
+        self.by_client: dict[object, dict[str, ADSubscription]] = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.by_client.values()))
+
+    def get(self, client, service_name: str) -> ADSubscription:
+        return self.by_client.get(client, {}).get(service_name)
+
+    def of_service(self, service_name: str) -> Iterable[ADSubscription]:
+        return self.by_service.get(service_name, {}).values()
+
+    def of_client(self, client) -> Iterable[ADSubscription]:
+        return self.by_client.get(client, {}).values()
+
+    def count(self, service_name: str) -> int:
+        return len(self.by_service.get(service_name, ()))
+
+    def add(self, subscription: ADSubscription) -> None:
+        self.by_service.setdefault(subscription.service_name, {})[subscription.client] = subscription
+        self.by_client.setdefault(subscription.client, {})[subscription.service_name] = subscription
+
+    def remove(self, client, service_name: str) -> ADSubscription:
+        """
+        Remove a subscription, None is returned when the client isn't subscribed to the service
+        """
+        subscription: ADSubscription = self.by_client.get(client, {}).pop(service_name, None)
+        if subscription is None:
+            return None
+        self.by_service[service_name].pop(client)
+        if len(self.by_service[service_name]) == 0:
+            del self.by_service[service_name]
+        if len(self.by_client[client]) == 0:
+            del self.by_client[client]
+        return subscription
+
+    def remove_client(self, client) -> list[ADSubscription]:
+        """
+        Remove every subscription of a client at once
+        """
+        subscriptions: list[ADSubscription] = [*self.by_client.pop(client, {}).values()]
+        for subscription in subscriptions:
+            clients: dict[object, ADSubscription] = self.by_service[subscription.service_name]
+            clients.pop(client)
+            if len(clients) == 0:
+                del self.by_service[subscription.service_name]
+        return subscriptions
+
+
+def is_pattern(service_name: str) -> bool:
+    return any(character in service_name for character in "*?[")
+
+
+def match_services(requested: Iterable[str], service_names: Iterable[str]) -> list[str]:
+    """
+    Expand the glob patterns of the requested services against the known ones,
+    plain names are kept as is, even if unknown, so that they can be reported
+    """
+    service_names = [*service_names]
+    matched: dict[str, None] = {}
+    for name in requested:
+        for service_name in fnmatch.filter(service_names, name) if is_pattern(name) else [name]:
+            matched[service_name] = None
+    return [*matched.keys()]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import numpy
+
+HISTORY_MODE_BUCKETS: str = "buckets"
+"""The window is cut in max_points buckets of equal duration, each giving the min, max and mean of its samples"""
+
+HISTORY_MODE_LTTB: str = "lttb"
+"""Largest-Triangle-Three-Buckets downsampling, keeping max_points samples that preserve the shape of the series"""
+
+HISTORY_MODES: list[str] = [HISTORY_MODE_BUCKETS, HISTORY_MODE_LTTB]
+
+HISTORY_MAX_POINTS: int = 5000
+"""Most points a history query can ask for"""
+
+HISTORY_MAX_WINDOW_SECONDS: float = 7 * 24 * 3600
+"""Longest window a history query can ask for"""
+
+
+class ADTimeSeries:
+    """
+    Fixed size ring of the numeric values of a service with their timestamps in nanoseconds since epoch,
+    held in two preallocated NumPy arrays so its memory never grows
+    Timestamps never go back, a sample taken after the wall clock stepped back gets the timestamp
+    of the previous one so that the ring stays sorted for searchsorted
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = max(2, capacity)
+        self.timestamps: numpy.ndarray = numpy.zeros(self.capacity, numpy.int64)
+        self.values: numpy.ndarray = numpy.zeros(self.capacity, numpy.float64)
+        self.next: int = 0
+        """Index of the next sample to write"""
+
+        self.count: int = 0
+
+    def __repr__(self) -> str:
+        return f'time series({self.count}/{self.capacity})'
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp_ns: int, value: float) -> None:
+        if self.count != 0:
+            timestamp_ns = max(timestamp_ns, int(self.timestamps[self.next - 1]))
+        self.timestamps[self.next] = timestamp_ns
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, start_ns: int, end_ns: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Copy of the samples whose timestamp is within [start_ns, end_ns], oldest first,
+        so that they can be downsampled on another thread while the ring keeps being written
+        """
+        if self.count < self.capacity:
+            timestamps, values = self.timestamps[:self.count], self.values[:self.count]
+        else:
+            timestamps = numpy.concatenate((self.timestamps[self.next:], self.timestamps[:self.next]))
+            values = numpy.concatenate((self.values[self.next:], self.values[:self.next]))
+        first: int = int(numpy.searchsorted(timestamps, start_ns, side="left"))
+        last: int = int(numpy.searchsorted(timestamps, end_ns, side="right"))
+        if self.count < self.capacity:
+            return timestamps[first:last].copy(), values[first:last].copy()
+        return timestamps[first:last], values[first:last]
+
+
+def buckets(timestamps: numpy.ndarray, values: numpy.ndarray, start_ns: int, end_ns: int, max_points: int) -> dict[str, list]:
+    """
+    Min, max, mean and number of samples of each of the max_points buckets of equal duration of the window,
+    buckets without samples are left out and each bucket is timestamped by its start
+    """
+    edges: numpy.ndarray = start_ns + numpy.arange(max_points + 1, dtype=numpy.int64) * (end_ns - start_ns) // max_points
+    indices: numpy.ndarray = numpy.searchsorted(timestamps, edges[:-1], side="left")
+    counts: numpy.ndarray = numpy.diff(numpy.append(indices, len(timestamps)))
+    filled: numpy.ndarray = counts > 0
+    if not filled.any():
+        return {"timestamps_ns": [], "min": [], "max": [], "mean": [], "count": []}
+    starts: numpy.ndarray = indices[filled]
+    counts = counts[filled]
+    return {
+        "timestamps_ns": edges[:-1][filled].tolist(),
+        "min": numpy.minimum.reduceat(values, starts).tolist(),
+        "max": numpy.maximum.reduceat(values, starts).tolist(),
+        "mean": (numpy.add.reduceat(values, starts) / counts).tolist(),
+        "count": counts.tolist(),
+    }
+
+
+def lttb(timestamps: numpy.ndarray, values: numpy.ndarray, max_points: int) -> dict[str, list]:
+    """
+    Largest-Triangle-Three-Buckets: the first and last samples are kept and every bucket in between,
+    cut by sample count, keeps the sample forming the largest triangle with the previously kept one
+    and the mean of the next bucket
+    """
+    length: int = len(timestamps)
+    if length <= max_points or max_points < 3:
+        return {"timestamps_ns": timestamps.tolist(), "values": values.tolist()}
+    x: numpy.ndarray = (timestamps - timestamps[0]).astype(numpy.float64)
+    edges: numpy.ndarray = numpy.linspace(1, length - 1, max_points - 1).astype(numpy.int64)
+    selected: numpy.ndarray = numpy.zeros(max_points, numpy.int64)
+    selected[-1] = length - 1
+    previous: int = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end: int = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        mean_x: float = x[end:next_end].mean()
+        mean_y: float = values[end:next_end].mean()
+        areas: numpy.ndarray = numpy.abs((x[previous] - mean_x) * (values[start:end] - values[previous]) - (x[previous] - x[start:end]) * (mean_y - values[previous]))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return {"timestamps_ns": timestamps[selected].tolist(), "values": values[selected].tolist()}
+
+
+def downsample(timestamps: numpy.ndarray, values: numpy.ndarray, start_ns: int, end_ns: int, max_points: int, mode: str) -> dict[str, list]:
+    """
+    Samples of a window reduced to at most max_points with the given HISTORY_MODE_*
+    """
+    if mode == HISTORY_MODE_LTTB:
+        return lttb(timestamps, values, max_points)
+    return buckets(timestamps, values, start_ns, end_ns, max_points)
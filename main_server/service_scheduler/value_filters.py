@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import math
+from typing import Callable
+
+import numpy
+
+from logger.logger import logging
+
+
+SMOOTHING_MIN_DECAY: float = 1e-12
+"""Smallest 1 - gain used by smooth(), a gain of 1 copies the values up to this relative error"""
+
+SMOOTHING_MAX_EXPONENT: float = 600.0
+"""Bound of -log(decay) over a chunk of smooth(), exp(600) stays far from the float64 limit"""
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def smooth(values: numpy.ndarray, gains: numpy.ndarray, initial: float) -> numpy.ndarray:
+    """
+    First order recursion y[i] = y[i - 1] + gains[i] * (values[i] - y[i - 1]) from y[-1] = initial, without a Python loop:
+    y[i] = decay[i] * (initial + cumsum(gains * values / decay)[i]) with decay the cumulative product of 1 - gains,
+    computed over chunks short enough for 1 / decay not to overflow
+    """
+    gains = numpy.minimum(gains, 1 - SMOOTHING_MIN_DECAY)
+    max_gain: float = float(gains.max()) if len(gains) != 0 else 0.0
+    chunk: int = max(1, int(SMOOTHING_MAX_EXPONENT / -math.log(1 - max_gain))) if max_gain > 0 else max(1, len(values))
+    filtered: numpy.ndarray = numpy.empty_like(values)
+    for start in range(0, len(values), chunk):
+        decays: numpy.ndarray = numpy.cumprod(1 - gains[start:start + chunk])
+        filtered[start:start + chunk] = decays * (initial + numpy.cumsum(gains[start:start + chunk] * values[start:start + chunk] / decays))
+        initial = filtered[start:start + chunk][-1]
+    return filtered
+
+
+class ADRingBuffer:
+    """
+    Fixed size float64 history of the last values of a stream
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = max(1, capacity)
+        self.buffer: numpy.ndarray = numpy.empty(self.capacity, dtype=numpy.float64)
+        self.count: int = 0
+        self.index: int = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def extend(self, values: numpy.ndarray) -> None:
+        values = values[-self.capacity:]
+        positions: numpy.ndarray = (self.index + numpy.arange(len(values))) % self.capacity
+        self.buffer[positions] = values
+        self.index = (self.index + len(values)) % self.capacity
+        self.count += len(values)
+
+    def last(self, n: int) -> numpy.ndarray:
+        """
+        The last n values from the oldest to the newest
+        """
+        n = min(n, len(self))
+        return self.buffer[(self.index - n + numpy.arange(n)) % self.capacity]
+
+
+class ADValueFilter:
+    """
+    Stage of a filter chain, it gets a batch of values and returns
+    the filtered values along with a mask of the values to keep
+    """
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        return values, numpy.ones(len(values), dtype=bool)
+
+
+class ADOutlierFilter(ADValueFilter):
+    """
+    Reject the values further than threshold scaled median absolute deviations from the median of the previous window
+    """
+
+    MIN_DEVIATION: float = 1e-3
+    """Lower bound of the deviation so that a perfectly steady stream doesn't reject every change"""
+
+    def __init__(self, window: int = 9, threshold: float = 3.5) -> None:
+        self.window: int = max(3, window)
+        self.threshold: float = threshold
+        self.history: ADRingBuffer = ADRingBuffer(self.window)
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        previous: numpy.ndarray = self.history.last(self.window)
+        self.history.extend(values)
+        if len(previous) < self.window:
+            return values, numpy.ones(len(values), dtype=bool)
+        windows: numpy.ndarray = numpy.lib.stride_tricks.sliding_window_view(numpy.concatenate((previous, values)), self.window)[:len(values)]
+        medians: numpy.ndarray = numpy.median(windows, axis=1)
+        deviations: numpy.ndarray = numpy.maximum(numpy.median(numpy.abs(windows - medians[:, None]), axis=1) * 1.4826, self.MIN_DEVIATION)
+        return values, numpy.abs(values - medians) <= self.threshold * deviations
+
+
+class ADMedianFilter(ADValueFilter):
+    """
+    Sliding median over the last window values
+    """
+
+    def __init__(self, window: int = 5) -> None:
+        self.window: int = max(1, window)
+        self.history: ADRingBuffer = ADRingBuffer(self.window - 1)
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        previous: numpy.ndarray = self.history.last(self.window - 1) if self.window > 1 else numpy.empty(0)
+        self.history.extend(values)
+        samples: numpy.ndarray = numpy.concatenate((previous, values))
+        window: int = min(self.window, len(samples))
+        windows: numpy.ndarray = numpy.lib.stride_tricks.sliding_window_view(samples, window)[-len(values):]
+        if len(windows) < len(values):
+            """Not enough history yet, the first values are their own median"""
+            head: numpy.ndarray = values[:len(values) - len(windows)]
+            return numpy.concatenate((head, numpy.median(windows, axis=1))), numpy.ones(len(values), dtype=bool)
+        return numpy.median(windows, axis=1), numpy.ones(len(values), dtype=bool)
+
+
+class ADEMAFilter(ADValueFilter):
+    """
+    Exponential moving average, alpha being the weight of the newest value
+    """
+
+    def __init__(self, alpha: float = 0.3) -> None:
+        self.alpha: float = min(max(alpha, 0.0), 1.0)
+        self.average: float = None
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        filtered: numpy.ndarray = smooth(values, numpy.full(len(values), self.alpha), values[0] if self.average is None else self.average)
+        self.average = float(filtered[-1])
+        return filtered, numpy.ones(len(values), dtype=bool)
+
+
+class ADKalmanFilter(ADValueFilter):
+    """
+    1-D Kalman filter of a constant value model
+    The error doesn't depend on the values, its recursion P' = r (P + q) / (P + q + r) is a linear fractional map
+    solved in closed form from its fixed points, so the gains of a batch are computed at once
+    and the estimates are a smooth() with varying gains
+    """
+
+    def __init__(self, process_noise: float = 1e-3, measurement_noise: float = 1e-2) -> None:
+        if process_noise < 0 or measurement_noise <= 0:
+            raise ValueError("the process noise must be positive and the measurement noise strictly positive")
+        self.process_noise: float = process_noise
+        self.measurement_noise: float = measurement_noise
+        self.estimate: float = None
+        self.error: float = 1.0
+        self.converged_error: float = (math.sqrt(process_noise * process_noise + 4 * process_noise * measurement_noise) - process_noise) / 2
+        """Attracting fixed point of the error recursion"""
+
+        self.diverging_error: float = -(math.sqrt(process_noise * process_noise + 4 * process_noise * measurement_noise) + process_noise) / 2
+        """Repelling fixed point of the error recursion"""
+
+    def errors(self, count: int) -> numpy.ndarray:
+        """
+        Error after each of the next count values, following (P - converged) / (P - diverging) = k^n (P0 - converged) / (P0 - diverging)
+        with k the derivative of the recursion at its attracting point, or P = P0 r / (r + n P0) without process noise
+        """
+        steps: numpy.ndarray = numpy.arange(1, count + 1, dtype=numpy.float64)
+        if self.process_noise == 0:
+            return self.error * self.measurement_noise / (self.measurement_noise + steps * self.error)
+        ratio: float = (self.measurement_noise / (self.converged_error + self.process_noise + self.measurement_noise)) ** 2
+        scale: numpy.ndarray = ratio ** steps * (self.error - self.converged_error) / (self.error - self.diverging_error)
+        return (self.converged_error - scale * self.diverging_error) / (1 - scale)
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        errors: numpy.ndarray = self.errors(len(values))
+        predicted: numpy.ndarray = numpy.concatenate(([self.error], errors[:-1])) + self.process_noise
+        filtered: numpy.ndarray = smooth(values, predicted / (predicted + self.measurement_noise), values[0] if self.estimate is None else self.estimate)
+        self.estimate = float(filtered[-1])
+        self.error = float(errors[-1])
+        return filtered, numpy.ones(len(values), dtype=bool)
+
+
+class ADTemperatureCompensation(ADValueFilter):
+    """
+    Rescale distances computed with the speed of sound at 0°C, as the HCSR04 does, to the speed of sound at the given temperature
+    The temperature is either a constant in °C or the last value of another service
+    """
+
+    def __init__(self, temperature: Callable[[], float]) -> None:
+        self.temperature: Callable[[], float] = temperature
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        temperature: float = self.temperature()
+        if temperature is None:
+            return values, numpy.ones(len(values), dtype=bool)
+        return values * math.sqrt(1 + temperature / 273.15), numpy.ones(len(values), dtype=bool)
+
+
+class ADRangeFilter(ADValueFilter):
+    """
+    Reject the values under min_value and clamp the ones over max_value, such as the distances a sensor can't measure
+    """
+
+    def __init__(self, min_value: float, max_value: float) -> None:
+        self.min_value: float = min_value
+        self.max_value: float = max_value
+
+    def process(self, values: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        return numpy.minimum(values, self.max_value), values >= self.min_value
+
+
+class ADFilterChain:
+    """
+    Filters applied to the "value" of every batch of values a service posts
+    It is described by "|" separated stages with ":" separated parameters, for example
+    "temperature:board_temperature|range:0.02:2|outlier:9:3.5|median:5|ema:0.3|kalman:0.001:0.01"
+    Temperature compensations always come first wherever they are described,
+    they correct raw distances so the other stages, the range first, only see corrected ones
+    """
+
+    def __init__(self, filters: list[ADValueFilter]) -> None:
+        self.filters: list[ADValueFilter] = filters
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def __repr__(self) -> str:
+        return f'{[type(i).__name__ for i in self.filters]}'
+
+    @staticmethod
+    def from_description(description: str, latest_value: Callable[[str], float]) -> ADFilterChain:
+        """
+        Build a chain from its description, latest_value returns the last value of a service by name
+        """
+        filters: list[ADValueFilter] = []
+        for stage in filter(None, map(str.strip, description.split("|"))):
+            name, *parameters = stage.split(":")
+            try:
+                if name == "outlier":
+                    filters.append(ADOutlierFilter(int(parameters[0]) if len(parameters) > 0 else 9, float(parameters[1]) if len(parameters) > 1 else 3.5))
+                elif name == "median":
+                    filters.append(ADMedianFilter(*map(int, parameters[:1])))
+                elif name == "ema":
+                    filters.append(ADEMAFilter(*map(float, parameters[:1])))
+                elif name == "kalman":
+                    filters.append(ADKalmanFilter(*map(float, parameters[:2])))
+                elif name == "range":
+                    filters.append(ADRangeFilter(float(parameters[0]), float(parameters[1])))
+                elif name == "temperature":
+                    source: str = parameters[0] if len(parameters) != 0 else "20"
+                    try:
+                        constant: float = float(source)
+                        filters.append(ADTemperatureCompensation(lambda constant=constant: constant))
+                    except ValueError:
+                        filters.append(ADTemperatureCompensation(lambda source=source: latest_value(source)))
+                else:
+                    logging.warning(f"Unknown value filter \"{name}\" in \"{description}\"")
+            except (IndexError, ValueError) as e:
+                logging.warning(f"Invalid value filter \"{stage}\" in \"{description}\": {e}")
+        filters.sort(key=lambda value_filter: not isinstance(value_filter, ADTemperatureCompensation))
+        return ADFilterChain(filters)
+
+    def process(self, batch: list[dict]) -> list[dict]:
+        """
+        Filter the numeric "value" of a batch of values, the values without one are left untouched
+        """
+        indices: list[int] = [i for i, values in enumerate(batch) if is_number(values.get("value"))]
+        if len(self.filters) == 0 or len(indices) == 0:
+            return batch
+        samples: numpy.ndarray = numpy.fromiter((batch[i]["value"] for i in indices), dtype=numpy.float64, count=len(indices))
+        kept: numpy.ndarray = numpy.ones(len(samples), dtype=bool)
+        for value_filter in self.filters:
+            if not kept.any():
+                break
+            filtered, mask = value_filter.process(samples[kept])
+            samples[kept] = filtered
+            kept[kept] = mask
+        rejected: set[int] = set()
+        filtered_batch: list[dict] = [*batch]
+        for position, i in enumerate(indices):
+            if not kept[position]:
+                rejected.add(i)
+            else:
+                filtered_batch[i] = {**batch[i], "value": float(samples[position])}
+        return [values for i, values in enumerate(filtered_batch) if i not in rejected]
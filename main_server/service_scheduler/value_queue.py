@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import threading
+from typing import Awaitable, Callable
+
+from logger.logger import logging
+
+OVERFLOW_POLICY_DROP_OLDEST: str = "drop-oldest"
+"""When the queue is full, the oldest pending value is discarded"""
+
+OVERFLOW_POLICY_COALESCE: str = "coalesce"
+"""When the queue is full, the newest pending value is replaced by the incoming one"""
+
+OVERFLOW_POLICY_BLOCK: str = "block"
+"""When the queue is full, the producer thread waits for the event loop to make room"""
+
+OVERFLOW_POLICIES: list[str] = [OVERFLOW_POLICY_DROP_OLDEST, OVERFLOW_POLICY_COALESCE, OVERFLOW_POLICY_BLOCK]
+
+
+class ADValueQueue:
+    """
+    Bounded thread-safe handoff between a service worker thread and the event loop
+    Any thread can put() values, a single asyncio task drains them in batches
+    """
+
+    def __init__(self, name: str, maxsize: int, policy: str) -> None:
+        if policy not in OVERFLOW_POLICIES:
+            logging.warning(f"Unknown overflow policy \"{policy}\" for <{name}>, using \"{OVERFLOW_POLICY_DROP_OLDEST}\"")
+            policy = OVERFLOW_POLICY_DROP_OLDEST
+        self.name: str = name
+        self.maxsize: int = max(1, maxsize)
+        self.policy: str = policy
+        self.dropped: int = 0
+        """Number of values discarded because the queue was full or closed"""
+
+        self.coalesced: int = 0
+        """Number of values merged into a pending one because the queue was full"""
+
+        self.values: collections.deque[dict] = collections.deque()
+        self.condition: threading.Condition = threading.Condition()
+        self.loop: asyncio.AbstractEventLoop = None
+        self.wakeup: asyncio.Event = None
+        self.task: asyncio.Task = None
+        self.wakeup_pending: bool = False
+        self.closed: bool = True
+
+    def __repr__(self) -> str:
+        return f'{self.name}[{len(self.values)}/{self.maxsize}, {self.policy}]'
+
+    def start(self, consumer: Callable[[list[dict]], Awaitable[None]]) -> None:
+        """
+        Start draining the queue from the running event loop,
+        the consumer is awaited with every batch of pending values
+        """
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        with self.condition:
+            self.values.clear()
+            self.wakeup_pending = False
+            self.closed = False
+        self.task = self.loop.create_task(self.drain(consumer))
+
+    def close(self) -> None:
+        """
+        Stop draining the queue, pending values are discarded
+        and producers blocked on a full queue are released
+        """
+        with self.condition:
+            self.closed = True
+            self.dropped += len(self.values)
+            self.values.clear()
+            self.condition.notify_all()
+        if self.task is not None:
+            if not self.loop.is_closed():
+                self.task.cancel()
+            self.task = None
+        if self.dropped != 0 or self.coalesced != 0:
+            logging.info(f"Value queue <{self.name}> closed with {self.dropped} dropped and {self.coalesced} coalesced value(s)")
+
+    def put(self, value: dict) -> None:
+        """
+        Enqueue a value from any thread, it never waits on the clients
+        and only waits on the event loop with the block policy
+        """
+        with self.condition:
+            if self.closed:
+                self.dropped += 1
+                return
+            if len(self.values) >= self.maxsize:
+                if self.policy == OVERFLOW_POLICY_COALESCE:
+                    self.values[-1] = value
+                    self.coalesced += 1
+                    return
+                elif self.policy == OVERFLOW_POLICY_BLOCK:
+                    while len(self.values) >= self.maxsize and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        self.dropped += 1
+                        return
+                else:
+                    self.values.popleft()
+                    self.dropped += 1
+            self.values.append(value)
+            if self.wakeup_pending:
+                return
+            self.wakeup_pending = True
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def drain(self, consumer: Callable[[list[dict]], Awaitable[None]]) -> None:
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            with self.condition:
+                batch: list[dict] = list(self.values)
+                self.values.clear()
+                self.wakeup_pending = False
+                self.condition.notify_all()
+            try:
+                await consumer(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Value queue <{self.name}> consumer failed: {e}")
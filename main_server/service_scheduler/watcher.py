@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+from typing import Awaitable, Callable
+
+from logger.logger import logging
+
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_FROM: int = 0x00000040
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_DELETE: int = 0x00000200
+IN_NONBLOCK: int = 0o4000
+IN_CLOEXEC: int = 0o2000000
+
+WATCHED_EVENTS: int = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+"""Modifications are only reported once the file is closed, when it is fully written"""
+
+EVENT_HEADER: struct.Struct = struct.Struct("iIII")
+"""Watch descriptor, mask, cookie and name length of an inotify event"""
+
+
+class ADServiceWatcher:
+    """
+    Watch the service directory and report the modules that were changed, added or removed
+    inotify is read by the event loop itself, the modification times are polled where it isn't available
+    Changes are debounced since editors usually write a file through several operations
+    """
+
+    DEBOUNCE_SECONDS: float = 0.3
+    """Quiet time waited after the last change of a file before reporting it"""
+
+    POLL_PERIOD_SECONDS: float = 1.0
+    """Period at which the directory is scanned when inotify is not available"""
+
+    def __init__(self, directory: str, extension: str, on_change: Callable[[set[str]], Awaitable[None]]) -> None:
+        self.directory: str = directory
+        self.extension: str = extension
+        self.on_change: Callable[[set[str]], Awaitable[None]] = on_change
+        self.loop: asyncio.AbstractEventLoop = None
+        self.fd: int = -1
+        self.poll_task: asyncio.Task = None
+        self.pending: set[str] = set()
+        """Paths changed since the last report"""
+
+        self.flush_handle: asyncio.TimerHandle = None
+        self.mtimes: dict[str, float] = {}
+
+    def __repr__(self) -> str:
+        return f'ADServiceWatcher({self.directory}, {"inotify" if self.fd >= 0 else "polling"})'
+
+    def start(self) -> None:
+        """
+        Start watching from the running event loop
+        """
+        self.loop = asyncio.get_running_loop()
+        self.fd = self.inotify_watch()
+        if self.fd >= 0:
+            self.loop.add_reader(self.fd, self.read_events)
+        else:
+            self.mtimes = self.scan()
+            self.poll_task = self.loop.create_task(self.poll())
+        logging.info(f"Watching service changes with {self}")
+
+    def stop(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        if self.fd >= 0:
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = -1
+        if self.poll_task is not None and not self.poll_task.get_loop().is_closed():
+            self.poll_task.cancel()
+        self.poll_task = None
+
+    def inotify_watch(self) -> int:
+        """
+        inotify file descriptor watching the directory, -1 if inotify can't be used
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd: int = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify is not available ({e}), falling back to polling")
+            return -1
+        if fd < 0:
+            logging.warning(f"inotify_init1 failed ({os.strerror(ctypes.get_errno())}), falling back to polling")
+            return -1
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), WATCHED_EVENTS) < 0:
+            logging.warning(f"Failed to watch \"{self.directory}\" ({os.strerror(ctypes.get_errno())}), falling back to polling")
+            os.close(fd)
+            return -1
+        return fd
+
+    def read_events(self) -> None:
+        try:
+            buffer: bytes = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset: int = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            _, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            name: str = os.fsdecode(buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+            if name.endswith(self.extension) and not name.startswith("."):
+                self.changed(os.path.join(self.directory, name))
+
+    def scan(self) -> dict[str, float]:
+        mtimes: dict[str, float] = {}
+        for filename in os.listdir(self.directory):
+            filepath: str = os.path.join(self.directory, filename)
+            if filename.endswith(self.extension) and os.path.isfile(filepath):
+                try:
+                    mtimes[filepath] = os.path.getmtime(filepath)
+                except OSError:
+                    pass
+        return mtimes
+
+    async def poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.POLL_PERIOD_SECONDS)
+            mtimes: dict[str, float] = self.scan()
+            for filepath in mtimes.keys() | self.mtimes.keys():
+                if mtimes.get(filepath) != self.mtimes.get(filepath):
+                    self.changed(filepath)
+            self.mtimes = mtimes
+
+    def changed(self, filepath: str) -> None:
+        self.pending.add(filepath)
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        self.flush_handle = self.loop.call_later(self.DEBOUNCE_SECONDS, self.flush)
+
+    def flush(self) -> None:
+        self.flush_handle = None
+        changed, self.pending = self.pending, set()
+        self.loop.create_task(self.on_change(changed))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from typing import Callable, TextIO
+import io
+import threading
+
+from ad_types.configuration import ADConfiguration
+
+from hal.camera import ADFrame, PIXEL_FORMAT_JPEG, open_camera
+
+from logger.logger import logging
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TIERS: dict[str, dict] = {
+    "low": {"scale": 4, "quality": 40},
+    "medium": {"scale": 2, "quality": 60},
+    "high": {"scale": 1, "quality": 85},
+}
+"""Each tier divides the resolution of the camera by its scale, its quality is used when Pillow can encode JPEG"""
+
+
+def render_tier(frame: ADFrame, tier: dict) -> tuple[bytes | memoryview, dict]:
+    """
+    Downscale a raw frame by keeping one pixel out of scale, and encode it as JPEG
+    when Pillow is installed, JPEG frames of the camera are sent as they are
+    """
+    if frame.pixel_format == PIXEL_FORMAT_JPEG:
+        return frame.data, {"format": PIXEL_FORMAT_JPEG, "width": frame.width, "height": frame.height}
+    pixels = frame.pixels()[::tier["scale"], ::tier["scale"]]
+    height, width, channels = pixels.shape
+    if Image is not None:
+        output: io.BytesIO = io.BytesIO()
+        Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels).save(output, "JPEG", quality=tier["quality"])
+        return output.getbuffer(), {"format": PIXEL_FORMAT_JPEG, "width": width, "height": height}
+    data: bytes | memoryview = frame.data if tier["scale"] == 1 else pixels.tobytes()
+    return data, {"format": frame.pixel_format, "width": width, "height": height}
+
+
+class Service:
+    TIERS: dict[str, dict] = TIERS
+    DEFAULT_TIER: str = "low"
+
+    def setup(self, configuration: ADConfiguration, callable_publish_frame: Callable[[str, bytes, dict], None], log_file: TextIO) -> bool:
+        """
+        Function called the first time the service is loaded
+        """
+        try:
+            self.camera = open_camera(configuration.camera_source, configuration.camera_resolution, configuration.camera_rate)
+        except (OSError, ValueError) as e:
+            logging.critical(f"Failed to open the camera {configuration.camera_source}: {e}")
+            return False
+        log_file.write(f"Streaming {self.camera}{'' if Image is not None else ' without Pillow, raw frames are sent'}\n")
+        self.publish_frame = callable_publish_frame
+        self.tiers: set[str] = set()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.capture, name="backup_camera")
+        self.thread.start()
+        return True
+
+    def set_tiers(self, tiers: set[str]) -> None:
+        """
+        Function called with the tiers having subscribers, the set is replaced at once for the capture thread
+        """
+        self.tiers = tiers
+
+    def capture(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                frame: ADFrame = self.camera.read()
+            except OSError as e:
+                logging.error(f"Failed to read a frame from {self.camera}: {e}")
+                self.stopped.wait(1)
+                continue
+            if frame is None:
+                continue
+            for tier in self.tiers:
+                data, metadata = render_tier(frame, TIERS[tier])
+                self.publish_frame(tier, data, {**metadata, "captured_ns": frame.timestamp_ns})
+
+    def cleanup(self) -> None:
+        """
+        Function called when the service is unloaded
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.camera.close()
+
+    def post(self, values: dict) -> None:
+        """
+        Function called when new values are to be used
+        """
+        pass
@@ -2,50 +2,74 @@
 
 from __future__ import annotations
 
-from typing import Callable, TextIO
-import time
+from typing import Awaitable, Callable, TextIO
+import asyncio
 
 from ad_types.configuration import ADConfiguration
 
-from websocket_scheduler.client import ADClient
+from hal.hal import get_hardware
 
-from logger.logger import logging
+from service_scheduler.sampling import ADSamplingJob, sampling_scheduler
 
-import threading
+from logger.logger import logging
 
 TEMPERATURE_SYSFILE: str = "/sys/class/thermal/thermal_zone0/temp"
 
 class Service:
-    def worker(self):
-        self.running = True
-        while self.running:
-            try:
-                with open(TEMPERATURE_SYSFILE, "r") as file:
-                    line: str = file.readline()
-                    self.callable({"value": float(line) / 1000, "unit": "°C"})
-            except Exception as e:
-                logging.warning(f"Failed to retrieve temperature from {TEMPERATURE_SYSFILE}: {e}")
-            time.sleep(1)
-
-    def setup(self, configuration: ADConfiguration, callable_async_get: Callable[[dict], None], log_file: TextIO) -> bool:
+    SAMPLE_RATE_HZ: float = 1.0
+    """Rate at which the temperature is read when the subscribers don't ask for one"""
+
+    MAX_SAMPLE_RATE_HZ: float = 10.0
+    """Fastest rate a subscriber can get"""
+
+    IDLE_SAMPLE_RATE_HZ: float = 0.2
+    """Rate the reading backs off to while the temperature doesn't move"""
+
+    IDLE_DEADBAND_CELSIUS: float = 0.5
+    """Change of temperature under which a sample is idle"""
+
+    def setup(self, configuration: ADConfiguration, log_file: TextIO) -> bool:
         """
         Function called the first time the service is loaded
-        the passed callable_async_get is a function that should be called whenever new values are ready
         """
         self.log_file = log_file
-        self.callable = callable_async_get
-        self.thread = threading.Thread(target=self.worker)
-        self.thread.start()
+        return True
+
+    async def run(self, emit: Callable[[dict], Awaitable[None]]) -> None:
+        """
+        Task reading the board temperature from the sampling scheduler until it is cancelled,
+        reading a sysfs file doesn't block so the samples run on the event loop
+        """
+        self.emit = emit
+        self.last_temperature: float = None
+        job: ADSamplingJob = sampling_scheduler.register("board_temperature", self.sample, self.SAMPLE_RATE_HZ, self.MAX_SAMPLE_RATE_HZ, self.IDLE_SAMPLE_RATE_HZ)
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            job.close()
+
+    async def sample(self) -> bool:
+        """
+        The sample is idle when the temperature stayed within the deadband
+        """
+        try:
+            temperature: float = float(get_hardware().sysfs.read(TEMPERATURE_SYSFILE)) / 1000
+        except Exception as e:
+            logging.warning(f"Failed to retrieve temperature from {TEMPERATURE_SYSFILE}: {e}")
+            return True
+        await self.emit({"value": temperature, "unit": "°C"})
+        if self.last_temperature is not None and abs(temperature - self.last_temperature) < self.IDLE_DEADBAND_CELSIUS:
+            return False
+        self.last_temperature = temperature
         return True
 
     def cleanup(self) -> None:
         """
         Function called when the service is unloaded
         """
-        self.running = False
-        self.thread.join()
+        pass
 
-    def post(self, values: dict) -> None:
+    async def post(self, values: dict) -> None:
         """
         Function called when new values are to be used
         """
@@ -2,23 +2,91 @@
 
 from __future__ import annotations
 
+import threading
 import time
 
-import GPIO
+from hal.hal import get_hardware
 
 from logger.logger import logging
 
+GPIO = get_hardware().gpio
+"""GPIO of the hardware backend, importing this module fails where the backend has no GPIO"""
+
+HCSR04_ERROR_TIMEOUT: str = "timeout"
+"""No echo edge was seen before the end of the measurement window"""
+
+HCSR04_ERROR_MISSED_EDGE: str = "missed-edge"
+"""The echo pin was still high from a previous echo when the sensor was triggered"""
+
+HCSR04_ERROR_TOO_CLOSE: str = "too-close"
+"""The echo came back too early to be a real obstacle"""
+
+HCSR04_ERROR_CANCELLED: str = "cancelled"
+"""The sensor was cancelled while measuring"""
+
+
+class HCSR04Measurement:
+    """
+    Result of a HCSR04 ranging, either a distance or an error
+    """
+
+    __slots__ = ("distance_meter", "error", "echo_ns", "attempts")
+
+    def __init__(self, distance_meter: float = None, error: str = None, echo_ns: int = 0, attempts: int = 1) -> None:
+        self.distance_meter: float = distance_meter
+        """Distance to the obstacle in meter, None on error"""
+
+        self.error: str = error
+        """One of the HCSR04_ERROR_* values, None on success"""
+
+        self.echo_ns: int = echo_ns
+        """Measured width of the echo pulse in nanoseconds"""
+
+        self.attempts: int = attempts
+        """Number of pings needed to get this result"""
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return f'{self.distance_meter:.3f}m ({self.attempts} attempt(s))'
+        return f'error: {self.error} ({self.attempts} attempt(s))'
+
+
 class HCSR04:
     """
     HCSR04 ultrasound sensor
     https://raspberry-lab.fr/Composants/Mesure-de-distance-avec-HC-SR04-Raspberry-Francais/Images/Schema-Branchement-Raspberry-Model.3-HC-SR04.png
+    The echo pulse is timed with GPIO edge callbacks when the GPIO module supports them,
+    otherwise it is polled with a deadline, in both cases with time.perf_counter_ns
+    Polling is only accurate to POLL_INTERVAL_SECONDS plus the scheduling jitter of the thread
     """
 
     MAX_SENSOR_FAILURE_FOR_RESET: int = 10
-    """Max number of iterations before stating that the sensor needs to be reset"""
+    """Max number of failed measurements before stating that the sensor needs to be reset"""
+
+    MAX_ATTEMPTS_PER_MEASUREMENT: int = 3
+    """Max number of pings sent to get a single measurement"""
+
+    MEASUREMENT_TIMEOUT_SECONDS: float = 0.03
+    """Max time waited for each echo edge, a 4 meter round trip takes around 24ms"""
+
+    POLL_INTERVAL_SECONDS: float = 0.0001
+    """
+    Time slept between two reads of the echo pin when polling, each edge is seen up to this late,
+    so a polled distance is only accurate to around 1.7cm plus the scheduling jitter of the thread
+    """
 
-    MAX_TICK_TO_STALL: int = 1000
-    """Max number of loop iteration before stating that the sensor stalled"""
+    ECHO_SETTLE_SECONDS: float = 0.06
+    """Time waited after a ping before sending the next one, the datasheet asks for 60ms cycles"""
+
+    RESET_DELAY_SECONDS: float = 0.5
+    """Time waited after cleaning up and after setting up the GPIO again when resetting the sensor"""
+
+    MIN_RANGE_HANDLED_METER: float = 0.02
+    """Min range handled by the sensor in meter, anything closer is a failure"""
 
     MAX_RANGE_HANDLED_METER: float = 4.0
     """Max range handled by the sensor in meter"""
@@ -31,20 +99,61 @@ class HCSR04:
         self.echo_pin: int = echo_pin
         self.iscancel: bool = False
         self.sensor_failure: int = 0
+        self.use_edge_detection: bool = False
+        self.cancelled: threading.Event = threading.Event()
+        self.echo_received: threading.Event = threading.Event()
+        self.rise_ns: int = None
+        self.fall_ns: int = None
+        self.listening: bool = False
+        """The edge callbacks time the echo of the current ping"""
 
     def cancel(self) -> None:
         self.iscancel = True
+        self.cancelled.set()
+        self.echo_received.set()
 
     def setup(self) -> None:
+        self.iscancel = False
+        self.cancelled.clear()
+        self.echo_received.clear()
+        """A cancelled sensor measures again once it is set up again"""
+        self.setup_gpio()
+
+    def setup_gpio(self) -> None:
         GPIO.setup(self.trigger_pin, GPIO.OUT)
         GPIO.setup(self.echo_pin, GPIO.IN)
         GPIO.output(self.trigger_pin, False)
+        self.use_edge_detection = False
+        if hasattr(GPIO, "add_event_detect"):
+            try:
+                GPIO.add_event_detect(self.echo_pin, GPIO.BOTH, callback=self.on_echo_edge)
+                self.use_edge_detection = True
+            except Exception as e:
+                logging.warning(f"HCSR04 edge detection unavailable on GPIO {self.echo_pin}, polling instead: {e}")
 
     def cleanup(self) -> None:
+        if self.use_edge_detection:
+            GPIO.remove_event_detect(self.echo_pin)
         GPIO.cleanup(self.trigger_pin)
         GPIO.cleanup(self.echo_pin)
 
-    def getDistanceInMeter(self) -> float:
+    def on_echo_edge(self, channel: int) -> None:
+        """
+        Called by the GPIO module from its own thread on both edges of the echo pin
+        The level of the pin may have changed again by the time the callback runs for a short echo,
+        so it isn't read: the first edge after the trigger is the rising one and the next one the falling one
+        """
+        now: int = time.perf_counter_ns()
+        if not self.listening:
+            return
+        if self.rise_ns is None:
+            self.rise_ns = now
+        else:
+            self.fall_ns = now
+            self.listening = False
+            self.echo_received.set()
+
+    def trigger(self) -> None:
         GPIO.output(self.trigger_pin, True)
         """Put high state in the trigger GPIO"""
 
@@ -54,51 +163,120 @@ class HCSR04:
         GPIO.output(self.trigger_pin, False)
         """Put low state in the trigger GPIO"""
 
-        counter = 0
-        while GPIO.input(self.echo_pin) == 0 and self.iscancel == False:
-            """Wait for the ultrasound to be sent"""
-            counter += 1
-            if counter > self.MAX_TICK_TO_STALL:
-                logging.warning("HCSR-04 sensor stalled")
-                return self.getDistanceInMeter()
+    def wait_echo_edges(self) -> str:
+        """
+        Wait for the echo pulse using the edge callbacks, returns an error or None
+        """
+        received: bool = self.echo_received.wait(self.MEASUREMENT_TIMEOUT_SECONDS * 2)
+        self.listening = False
+        if self.iscancel:
+            return HCSR04_ERROR_CANCELLED
+        if not received:
+            return HCSR04_ERROR_TIMEOUT
+        return None
 
-        start_time: float = time.time()
+    def poll_echo_edges(self) -> str:
+        """
+        Wait for the echo pulse by polling the echo pin until a deadline, returns an error or None
+        """
+        timeout_ns: int = int(self.MEASUREMENT_TIMEOUT_SECONDS * 1e9)
+        deadline_ns: int = time.perf_counter_ns() + timeout_ns
+        while GPIO.input(self.echo_pin) == 0:
+            """Wait for the ultrasound to be sent"""
+            if self.iscancel:
+                return HCSR04_ERROR_CANCELLED
+            if time.perf_counter_ns() > deadline_ns:
+                return HCSR04_ERROR_TIMEOUT
+            time.sleep(self.POLL_INTERVAL_SECONDS)
+        self.rise_ns = time.perf_counter_ns()
         """Get the exact time when we sent the ultrasound"""
 
-        counter = 0
-        while GPIO.input(self.echo_pin) == 1 and self.iscancel == False:
+        deadline_ns = self.rise_ns + timeout_ns
+        while GPIO.input(self.echo_pin) == 1:
             """Wait for the ultrasound to be received"""
-            counter += 1
-            if counter > self.MAX_TICK_TO_STALL:
-                logging.warning("HCSR-04 sensor stalled")
-                return self.getDistanceInMeter()
-
-        stop_time: float = time.time()
+            if self.iscancel:
+                return HCSR04_ERROR_CANCELLED
+            if time.perf_counter_ns() > deadline_ns:
+                return HCSR04_ERROR_TIMEOUT
+            time.sleep(self.POLL_INTERVAL_SECONDS)
+        self.fall_ns = time.perf_counter_ns()
         """Get the exact time when we received the ultrasound"""
+        return None
 
-        elapsed_seconds: float = stop_time - start_time
-        """Compute the time elapsed between sending and receiving the ultrasound"""
+    def ping(self) -> HCSR04Measurement:
+        """
+        Send a single ultrasound and time its echo
+        """
+        self.rise_ns = None
+        self.fall_ns = None
+        self.echo_received.clear()
+        if GPIO.input(self.echo_pin) == 1:
+            return HCSR04Measurement(error=HCSR04_ERROR_MISSED_EDGE)
+            """The echo of a previous ping is still going on, its falling edge would be taken for a rising one"""
+        self.listening = self.use_edge_detection
+        self.trigger()
 
-        distance_meter: float = (
-            elapsed_seconds * self.SOUND_SPEED_IN_AIR_METER_PER_SECOND) / 2.0
+        error: str = self.wait_echo_edges() if self.use_edge_detection else self.poll_echo_edges()
+        if error is not None:
+            return HCSR04Measurement(error=error)
 
-        if distance_meter < 0.02:
-            self.sensor_failure += 1
-            if self.sensor_failure > self.MAX_SENSOR_FAILURE_FOR_RESET:
-                self.cleanup()
-                time.sleep(0.5)
-                self.setup()
-                time.sleep(0.5)
-                logging.warning("HCSR04 sensor failed, reseting...")
-                return self.getDistanceInMeter()
-        else:
-            self.sensor_failure = 0
+        echo_ns: int = self.fall_ns - self.rise_ns
+        """Compute the time elapsed between sending and receiving the ultrasound"""
 
+        distance_meter: float = (echo_ns / 1e9 * self.SOUND_SPEED_IN_AIR_METER_PER_SECOND) / 2.0
         """
         Compute the distance travelled by the sound
         Multiply the speed of the sound (m/s) by the elapsed time (s)
         Divide the distance by 2 because the sound is making a forward/backward travel
         """
 
-        return distance_meter if distance_meter < self.MAX_RANGE_HANDLED_METER / 2 else self.MAX_RANGE_HANDLED_METER / 2
-        """Return the distance but divide the max distance handled by 2 to avoid any hardware problem"""
+        if distance_meter < self.MIN_RANGE_HANDLED_METER:
+            return HCSR04Measurement(error=HCSR04_ERROR_TOO_CLOSE, echo_ns=echo_ns)
+
+        return HCSR04Measurement(distance_meter, echo_ns=echo_ns)
+        """The distance is not clamped to the range handled yet, it may first be compensated for the temperature"""
+
+    def reset(self) -> None:
+        logging.warning("HCSR04 sensor failed, reseting...")
+        self.cleanup()
+        self.cancelled.wait(self.RESET_DELAY_SECONDS)
+        self.setup_gpio()
+        self.cancelled.wait(self.RESET_DELAY_SECONDS)
+        self.sensor_failure = 0
+
+    def measure(self) -> HCSR04Measurement:
+        """
+        Get a measurement, retrying a bounded number of pings
+        and resetting the sensor after too many consecutive failures
+        """
+        measurement: HCSR04Measurement = None
+        for attempt in range(1, self.MAX_ATTEMPTS_PER_MEASUREMENT + 1):
+            if attempt > 1:
+                self.cancelled.wait(self.ECHO_SETTLE_SECONDS)
+                """Let the echo of the failed ping die out before sending the next one"""
+            if self.iscancel:
+                return HCSR04Measurement(error=HCSR04_ERROR_CANCELLED, attempts=attempt)
+            measurement = self.ping()
+            measurement.attempts = attempt
+            if measurement.ok:
+                self.sensor_failure = 0
+                return measurement
+            if measurement.error == HCSR04_ERROR_TIMEOUT:
+                logging.warning("HCSR-04 sensor stalled")
+            self.sensor_failure += 1
+            if self.sensor_failure > self.MAX_SENSOR_FAILURE_FOR_RESET:
+                self.reset()
+        return measurement
+
+    def getDistanceInMeter(self) -> float:
+        """
+        Get the distance in meter, measuring again until a measurement succeeds,
+        a cancelled sensor gives the farthest distance returned, as if nothing was in range
+        """
+        while True:
+            measurement: HCSR04Measurement = self.measure()
+            if measurement.ok:
+                return min(measurement.distance_meter, self.MAX_RANGE_HANDLED_METER / 2)
+                """Return the distance but divide the max distance handled by 2 to avoid any hardware problem"""
+            if measurement.error == HCSR04_ERROR_CANCELLED or self.cancelled.wait(self.ECHO_SETTLE_SECONDS):
+                return self.MAX_RANGE_HANDLED_METER / 2
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+from typing import Callable, TextIO
+
+from ad_types.configuration import ADConfiguration
+
+from service_scheduler.sampling import ADSamplingJob, SAMPLING_OVERRUN, sampling_scheduler
+
+from services.sensors.HCSR04 import HCSR04, HCSR04Measurement, HCSR04_ERROR_CANCELLED
+
+from utils.utils import parse_sensor_pins
+
+from logger.logger import logging
+
+
+class HCSR04Array:
+    """
+    Set of HCSR04 sensors measured one at a time by the thread of the array, in the order they become due
+    The sampling job of each sensor only marks it as due so that the threads of the sampling scheduler
+    never wait for an echo, measurements are serialized with a settle gap after each echo
+    so that a sensor never hears the ping of another one
+    """
+
+    SAMPLE_RATE_HZ: float = 1 / 0.3
+    """Rate at which each sensor is measured when its subscribers don't ask for one"""
+
+    MAX_SAMPLE_RATE_HZ: float = 10.0
+    """Fastest rate a subscriber can get, a sensor still waiting for its turn when it is due again counts an overrun"""
+
+    IDLE_SAMPLE_RATE_HZ: float = 1.0
+    """Rate a sensor backs off to while the distance doesn't move"""
+
+    IDLE_DEADBAND_METER: float = 0.005
+    """Change of distance under which a measurement is idle"""
+
+    instance: HCSR04Array = None
+    """Array shared by every HCSR04 service of the process"""
+
+    def __init__(self) -> None:
+        self.sensors: dict[str, tuple[HCSR04, Callable[[str, HCSR04Measurement], None]]] = {}
+        self.jobs: dict[str, ADSamplingJob] = {}
+        self.last_distances: dict[str, float] = {}
+        self.idle: dict[str, bool] = {}
+        """Whether the last measurement of each sensor was idle, reported to its sampling job"""
+
+        self.due: collections.deque[str] = collections.deque()
+        """Sensors waiting for their turn, oldest first"""
+
+        self.measuring: str = None
+        self.condition: threading.Condition = threading.Condition()
+        self.thread: threading.Thread = None
+
+    @staticmethod
+    def get() -> HCSR04Array:
+        if HCSR04Array.instance is None:
+            HCSR04Array.instance = HCSR04Array()
+        return HCSR04Array.instance
+
+    def __repr__(self) -> str:
+        return f'HCSR04Array{[*self.sensors.keys()]}'
+
+    def register(self, name: str, trigger_pin: int, echo_pin: int, callback: Callable[[str, HCSR04Measurement], None]) -> None:
+        """
+        Add a sensor to the array, the callback is called from the thread of the array with every measurement
+        """
+        sensor: HCSR04 = HCSR04(trigger_pin, echo_pin)
+        sensor.setup()
+        with self.condition:
+            self.sensors[name] = (sensor, callback)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker, name="hcsr04-array", daemon=True)
+                self.thread.start()
+        self.jobs[name] = sampling_scheduler.register(name, lambda: self.request(name), self.SAMPLE_RATE_HZ, self.MAX_SAMPLE_RATE_HZ, self.IDLE_SAMPLE_RATE_HZ)
+        logging.info(f"HCSR04 <{name}> added to {self} (trigger: {trigger_pin}, echo: {echo_pin})")
+
+    def unregister(self, name: str) -> None:
+        """
+        Remove a sensor from the array, a measurement in progress is cancelled and waited for
+        """
+        if name not in self.sensors:
+            return
+        sensor, _ = self.sensors[name]
+        sensor.cancel()
+        self.jobs.pop(name).close()
+        with self.condition:
+            self.sensors.pop(name)
+            self.last_distances.pop(name, None)
+            self.idle.pop(name, None)
+            if name in self.due:
+                self.due.remove(name)
+            while self.measuring == name:
+                self.condition.wait()
+            sensor.cleanup()
+            if len(self.sensors) == 0:
+                self.thread = None
+                self.condition.notify_all()
+        logging.info(f"HCSR04 <{name}> removed from {self}")
+
+    def request(self, name: str) -> bool | str:
+        """
+        Sampling job of a sensor, it queues the sensor for its turn and reports whether its last measurement was idle,
+        or an overrun when the sensor is still waiting for its previous turn
+        """
+        with self.condition:
+            if name not in self.sensors:
+                return False
+            if name in self.due:
+                return SAMPLING_OVERRUN
+            self.due.append(name)
+            self.condition.notify_all()
+            return not self.idle.get(name, False)
+
+    def worker(self) -> None:
+        """
+        Thread of the array measuring the due sensors one after the other
+        """
+        thread: threading.Thread = threading.current_thread()
+        while True:
+            with self.condition:
+                while len(self.due) == 0 and self.thread is thread:
+                    self.condition.wait()
+                if self.thread is not thread:
+                    return
+                name: str = self.due.popleft()
+                sensor, callback = self.sensors[name]
+                self.measuring = name
+            measurement: HCSR04Measurement = sensor.measure()
+            with self.condition:
+                self.measuring = None
+                self.condition.notify_all()
+                if name in self.sensors:
+                    self.record(name, measurement)
+            callback(name, measurement)
+            time.sleep(HCSR04.ECHO_SETTLE_SECONDS)
+            """Let the echo die out before triggering the next sensor"""
+
+    def record(self, name: str, measurement: HCSR04Measurement) -> None:
+        """
+        Called with the condition held, a measurement is idle when the distance didn't move
+        """
+        if not measurement.ok:
+            self.idle[name] = False
+            return
+        last_distance: float = self.last_distances.get(name)
+        self.idle[name] = last_distance is not None and abs(measurement.distance_meter - last_distance) < self.IDLE_DEADBAND_METER
+        if not self.idle[name]:
+            self.last_distances[name] = measurement.distance_meter
+
+
+class HCSR04ArrayService:
+    """
+    HC SR04 ultrasound sensor service publishing a single sensor of the shared HCSR04Array
+    The service scheduler builds one per entry of the distance_sensors configuration, named after the sensor
+    """
+
+    FILTERS: str = f"range:{HCSR04.MIN_RANGE_HANDLED_METER}:{HCSR04.MAX_RANGE_HANDLED_METER / 2}|outlier:9:3.5|median:3"
+    """
+    Value filters applied to the distances before they are sent, see ADFilterChain
+    The range stage clamps the distances to half the range handled to avoid any hardware problem,
+    a temperature compensation added by the service_filters configuration runs before it
+    """
+
+    def __init__(self, sensor_name: str) -> None:
+        self.sensor_name: str = sensor_name
+        """Name of the sensor in the distance_sensors configuration"""
+
+    def on_measurement(self, name: str, measurement: HCSR04Measurement) -> None:
+        if measurement.ok:
+            self.notify({"value": measurement.distance_meter, "unit": "m"})
+            """Send the sensor values to the subscribed clients"""
+        elif measurement.error != HCSR04_ERROR_CANCELLED:
+            logging.warning(f"Failed to measure distance of <{name}>: {measurement}")
+
+    def setup(self, configuration: ADConfiguration, callable_async_get: Callable[[dict], None], log_file: TextIO) -> bool:
+        """
+        Function called the first time the service is loaded
+        the passed callable_async_get is a function that should be called whenever new values are ready
+        """
+        pins: tuple[int, int] = parse_sensor_pins(configuration.distance_sensors).get(self.sensor_name)
+        if pins is None:
+            logging.critical(f"Distance sensor <{self.sensor_name}> isn't in the distance_sensors configuration anymore")
+            return False
+        self.logfile = log_file
+        self.notify = callable_async_get
+        HCSR04Array.get().register(self.sensor_name, *pins, self.on_measurement)
+        return True
+
+    def cleanup(self) -> None:
+        """
+        Function called when the service is unloaded
+        """
+        HCSR04Array.get().unregister(self.sensor_name)
+
+    def post(self, values: dict) -> None:
+        """
+        Function called when new values are to be used
+        """
+        pass
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from services.sensors.HCSR04Array import HCSR04ArrayService as Service
+"""
+The service scheduler builds one service per entry of the distance_sensors configuration from this module,
+the module is loaded once per sensor but they all import, and so share, the same HCSR04Array
+"""
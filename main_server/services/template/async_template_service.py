@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable, TextIO
+import asyncio
+
+from ad_types.configuration import ADConfiguration
+
+from logger.logger import logging
+
+
+class Service:
+    def setup(self, configuration: ADConfiguration, log_file: TextIO) -> bool:
+        """
+        Function called the first time the service is loaded
+        """
+        return True
+
+    async def run(self, emit: Callable[[dict], Awaitable[None]]) -> None:
+        """
+        Task started the first time the service is loaded and cancelled when it is unloaded
+        the passed emit coroutine should be awaited whenever new values are ready
+        """
+        while True:
+            await asyncio.sleep(1)
+            await emit({"cm": 35})
+
+    def cleanup(self) -> None:
+        """
+        Function called when the service is unloaded
+        """
+        pass
+
+    async def post(self, values: dict) -> None:
+        """
+        Function called when new values are to be used
+        """
+        pass
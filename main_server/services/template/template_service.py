@@ -3,21 +3,21 @@
 from __future__ import annotations
 
 from typing import Callable, TextIO
-import time
 
 from ad_types.configuration import ADConfiguration
 
 from logger.logger import logging
 
-import threading
+from service_scheduler.sampling import ADSamplingJob, sampling_scheduler
 
 
 class Service:
-    def loop(self):
-        self.running = True
-        while self.running:
-            time.sleep(1)
-            self.callable({"cm": 35})
+    def sample(self) -> None:
+        """
+        Called by the sampling scheduler at the rate asked by the subscribers, 1Hz by default
+        returning False instead tells it nothing changed so it can back off
+        """
+        self.callable({"cm": 35})
 
     def setup(self, configuration: ADConfiguration, callable_async_get: Callable[[dict], None], log_file: TextIO) -> bool:
         """
@@ -25,16 +25,14 @@ class Service:
         the passed callable_async_get is a function that should be called whenever new values are ready
         """
         self.callable = callable_async_get
-        self.thread = threading.Thread(target=self.loop)
-        self.thread.start()
+        self.job: ADSamplingJob = sampling_scheduler.register("template_service", self.sample, 1.0, max_rate=10.0)
         return True
 
     def cleanup(self) -> None:
         """
         Function called when the service is unloaded
         """
-        self.running = False
-        self.thread.join()
+        self.job.close()
 
     def post(self, values: dict) -> None:
         """
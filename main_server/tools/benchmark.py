@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+import socketio
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from ad_types.configuration import ADConfiguration
+from hal.hal import setup_hardware
+from logger.logger import setupLogger
+from websocket_scheduler.websocket_scheduler import WebsocketScheduler
+from websocket_scheduler.wire_format import msgpack
+
+SYNTHETIC_SERVICE: str = '''#!/usr/bin/env python3
+
+import threading
+import time
+
+RATE_HZ: float = {rate}
+
+
+class Service:
+    def setup(self, configuration, callable_async_get, log_file) -> bool:
+        self.notify = callable_async_get
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.publish, name="{name}")
+        self.thread.start()
+        return True
+
+    def publish(self) -> None:
+        period: float = 1 / RATE_HZ
+        deadline: float = time.monotonic()
+        sequence: int = 0
+        while not self.stopped.is_set():
+            deadline += period
+            sequence += 1
+            self.notify({{"value": sequence, "sent_ns": time.monotonic_ns()}})
+            self.stopped.wait(max(0.0, deadline - time.monotonic()))
+
+    def cleanup(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def post(self, values: dict) -> None:
+        pass
+'''
+"""Threaded service publishing its sequence number and the monotonic time at which notify() is called"""
+
+
+def write_synthetic_services(directory: str, count: int, rate_hz: float) -> list[str]:
+    names: list[str] = [f'synthetic_{i}' for i in range(count)]
+    for name in names:
+        with open(os.path.join(directory, f'{name}.py'), "w") as file:
+            file.write(SYNTHETIC_SERVICE.format(rate=rate_hz, name=name))
+    return names
+
+
+async def run_clients(port: int, clients: int, services: list[str], wire_format: str, warmup: float, duration: float, results: multiprocessing.Queue) -> dict:
+    """
+    Connect the clients, subscribe them to every service and measure the latency of the values
+    received after the warmup, monotonic clocks are shared by the processes of the machine
+    """
+    latencies: list[int] = []
+    received: list[int] = [0]
+    measuring: list[bool] = [False]
+
+    def on_values(data) -> None:
+        if measuring[0]:
+            values: dict = msgpack.unpackb(data)[2] if isinstance(data, bytes) else data["values"]
+            latencies.append(time.monotonic_ns() - values["sent_ns"])
+            received[0] += 1
+
+    async def connect() -> socketio.AsyncClient:
+        client: socketio.AsyncClient = socketio.AsyncClient()
+        client.on("notify_values", on_values)
+        await client.connect(f'http://127.0.0.1:{port}?wire_format={wire_format}', transports=["websocket"])
+        for service in services:
+            await client.emit("subscribe", {"service_name": service})
+        return client
+
+    connected: list[socketio.AsyncClient] = await asyncio.gather(*[connect() for _ in range(clients)])
+    await asyncio.sleep(warmup)
+    measuring[0] = True
+    results.put(None)
+    """Tell the daemon to start measuring its cpu usage"""
+
+    start: float = time.monotonic()
+    await asyncio.sleep(duration)
+    measuring[0] = False
+    elapsed: float = time.monotonic() - start
+    await asyncio.gather(*[client.disconnect() for client in connected])
+    return {"latencies_ns": latencies, "received": received[0], "elapsed": elapsed}
+
+
+def clients_process(port: int, clients: int, services: list[str], wire_format: str, warmup: float, duration: float, results: multiprocessing.Queue) -> None:
+    results.put(asyncio.run(run_clients(port, clients, services, wire_format, warmup, duration, results)))
+
+
+def current_rss_bytes() -> int:
+    with open("/proc/self/statm", "r") as file:
+        return int(file.read().split()[1]) * resource.getpagesize()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def benchmark(args: argparse.Namespace, directory: str) -> dict:
+    configuration: ADConfiguration = ADConfiguration()
+    configuration.services_directory_path = os.path.join(directory, "services")
+    configuration.logging_directory = os.path.join(directory, "logs")
+    configuration.hardware_backend = "simulated"
+    configuration.websocket_scheduler_port = args.port
+    os.makedirs(configuration.services_directory_path)
+    services: list[str] = write_synthetic_services(configuration.services_directory_path, args.services, args.rate)
+
+    setupLogger("WARNING", os.path.join(configuration.logging_directory, configuration.logging_filename))
+    setup_hardware(configuration)
+    scheduler: WebsocketScheduler = WebsocketScheduler(configuration)
+    scheduler.register_callbacks()
+    server: uvicorn.Server = uvicorn.Server(uvicorn.Config(scheduler.app, host="127.0.0.1", port=args.port, log_level="warning", ws="websockets"))
+    serving: asyncio.Task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    context = multiprocessing.get_context("spawn")
+    results: multiprocessing.Queue = context.Queue()
+    processes: list[multiprocessing.Process] = []
+    for i in range(args.client_processes):
+        clients: int = args.clients // args.client_processes + (1 if i < args.clients % args.client_processes else 0)
+        processes.append(context.Process(target=clients_process, args=(args.port, clients, services, args.wire_format, args.warmup, args.duration, results)))
+    for process in processes:
+        process.start()
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    for _ in processes:
+        await loop.run_in_executor(None, results.get)
+    cpu_start: float = time.process_time()
+    wall_start: float = time.monotonic()
+    await asyncio.sleep(args.duration)
+    cpu_seconds: float = time.process_time() - cpu_start
+    wall_seconds: float = time.monotonic() - wall_start
+    rss_bytes: int = current_rss_bytes()
+    reports: list[dict] = [await loop.run_in_executor(None, results.get) for _ in processes]
+    for process in processes:
+        await loop.run_in_executor(None, process.join)
+
+    dropped: int = sum(service.queue.dropped for service in scheduler.service_scheduler.services.values())
+    server.should_exit = True
+    await serving
+    scheduler.service_scheduler.stop()
+
+    latencies_ms: numpy.ndarray = numpy.concatenate([numpy.array(report["latencies_ns"], numpy.int64) for report in reports]) / 1e6
+    received: int = sum(report["received"] for report in reports)
+    elapsed: float = max(report["elapsed"] for report in reports)
+    expected: float = args.clients * args.services * args.rate
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": {"clients": args.clients, "services": args.services, "rate_hz": args.rate, "wire_format": args.wire_format, "duration_seconds": args.duration, "client_processes": args.client_processes},
+        "latency_ms": {
+            "p50": float(numpy.percentile(latencies_ms, 50)) if len(latencies_ms) != 0 else None,
+            "p99": float(numpy.percentile(latencies_ms, 99)) if len(latencies_ms) != 0 else None,
+            "max": float(numpy.max(latencies_ms)) if len(latencies_ms) != 0 else None,
+        },
+        "updates_per_second": received / elapsed,
+        "expected_updates_per_second": expected,
+        "delivered_ratio": received / elapsed / expected,
+        "service_queue_dropped": dropped,
+        "daemon_cpu_percent": 100 * cpu_seconds / wall_seconds,
+        "daemon_rss_mb": rss_bytes / 1024 / 1024,
+    }
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Measure the fan-out latency and throughput of an in-process Auto-Doodle daemon"
+    )
+    parser.add_argument("--clients", type=int, default=10, help="number of Socket.IO clients")
+    parser.add_argument("--services", type=int, default=1, help="number of synthetic services, every client subscribes to all of them")
+    parser.add_argument("--rate", type=float, default=20, help="rate of each synthetic service in Hz")
+    parser.add_argument("--duration", type=float, default=10, help="measurement duration in seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="time waited after the subscriptions before measuring")
+    parser.add_argument("--wire-format", default="json", help="wire format negotiated by the clients (json or msgpack)")
+    parser.add_argument("--client-processes", type=int, default=1, help="number of processes running the clients")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="JSON file the results are appended to, one line per run")
+    args = parser.parse_args(argv[1:])
+
+    with tempfile.TemporaryDirectory(prefix="ad-benchmark-") as directory:
+        report: dict = asyncio.run(benchmark(args, directory))
+    print(json.dumps(report, indent=4))
+    if args.output is not None:
+        with open(args.output, "a") as file:
+            file.write(json.dumps(report) + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
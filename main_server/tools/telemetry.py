@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sys
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from service_scheduler.recorder import ADTelemetryFile, TELEMETRY_EXTENSION, read_service
+
+
+def parse_time(value: str) -> int:
+    """
+    Nanoseconds since epoch of an ISO date or of a number of seconds ago when prefixed by a minus sign
+    """
+    if value.startswith("-"):
+        return int((datetime.datetime.now().timestamp() - float(value[1:])) * 1e9)
+    return int(datetime.datetime.fromisoformat(value).timestamp() * 1e9)
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="telemetry",
+        description="Read back the samples recorded by the services of Auto-Doodle"
+    )
+    parser.add_argument("recording_directory", help="recording directory of the daemon")
+    parser.add_argument("service_name", nargs="?", help="service to read, the recorded services are listed when omitted")
+    parser.add_argument("--start", type=parse_time, help="ISO date or -seconds ago of the first sample")
+    parser.add_argument("--end", type=parse_time, help="ISO date or -seconds ago after the last sample")
+    parser.add_argument("--csv", action="store_true", help="print every sample instead of a summary")
+    args = parser.parse_args(argv[1:])
+
+    if args.service_name is None:
+        for filename in sorted(os.listdir(args.recording_directory)):
+            if filename.endswith(TELEMETRY_EXTENSION):
+                telemetry_file: ADTelemetryFile = ADTelemetryFile(os.path.join(args.recording_directory, filename))
+                print(f'{filename[:-len(TELEMETRY_EXTENSION)]}: {telemetry_file.count} samples')
+                telemetry_file.close()
+        return 0
+
+    timestamps, values = read_service(args.recording_directory, args.service_name, args.start, args.end)
+    if args.csv:
+        print("timestamp_ns,value")
+        for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+            print(f'{timestamp},{value}')
+        return 0
+    if len(timestamps) == 0:
+        print(f'No sample of {args.service_name} in this range')
+        return 0
+    first: datetime.datetime = datetime.datetime.fromtimestamp(timestamps[0] / 1e9)
+    last: datetime.datetime = datetime.datetime.fromtimestamp(timestamps[-1] / 1e9)
+    print(f'{args.service_name}: {len(values)} samples from {first} to {last}')
+    print(f'min {numpy.min(values):g}, max {numpy.max(values):g}, mean {numpy.mean(values):g}, std {numpy.std(values):g}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -5,8 +5,23 @@ from __future__ import annotations
 from typing import Any
 import os
 
+from logger.logger import logging
+
 def get_object_member_variables(obj: object) -> dict[str, Any]:
     return {attr:getattr(obj, attr) for attr in dir(obj) if not callable(getattr(obj, attr)) and not attr.startswith("__")}
 
 def get_matching_filenames_in_directory(directory_path: str, extension: str) -> list[str]:
-    return list(filter(lambda filepath: filepath.endswith(extension), filter(os.path.isfile, map(lambda filename: os.path.join(directory_path, filename), os.listdir(directory_path)))))
\ No newline at end of file
+    return list(filter(lambda filepath: filepath.endswith(extension), filter(os.path.isfile, map(lambda filename: os.path.join(directory_path, filename), os.listdir(directory_path)))))
+
+def parse_sensor_pins(description: str) -> dict[str, tuple[int, int]]:
+    """
+    Parse a "name:trigger_pin:echo_pin,name:trigger_pin:echo_pin" description into {name: (trigger_pin, echo_pin)}
+    """
+    sensors: dict[str, tuple[int, int]] = {}
+    for entry in filter(None, map(str.strip, description.split(","))):
+        try:
+            name, trigger_pin, echo_pin = entry.split(":")
+            sensors[name] = (int(trigger_pin), int(echo_pin))
+        except ValueError:
+            logging.warning(f"Invalid HCSR04 sensor description \"{entry}\", expected name:trigger_pin:echo_pin")
+    return sensors
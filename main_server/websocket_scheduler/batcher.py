@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+
+from .wire_format import WIRE_FORMAT_JSON
+
+from logger.logger import logging
+
+
+async def send_batch(client, batch_wire_format: str, payloads: list) -> None:
+    """
+    Send already encoded notify_values payloads of a single wire format as one notify_batch frame:
+    {"updates": [...]} in json, {"wire_format": format, "payload": bytes, "updates": [...]} in a binary format,
+    the binary payloads being concatenated as struct records have a fixed size and msgpack objects can be streamed,
+    and the values the format can't encode, already sent as json dicts, being the updates
+    """
+    if len(payloads) == 0:
+        return
+    updates: list[dict] = [payload for payload in payloads if not isinstance(payload, bytes)]
+    if batch_wire_format == WIRE_FORMAT_JSON:
+        await client.send("notify_batch", {"updates": updates})
+        return
+    binary: bytes = b"".join(payload for payload in payloads if isinstance(payload, bytes))
+    await client.send("notify_batch", {"wire_format": batch_wire_format, "payload": binary, "updates": updates})
+
+
+class ADClientBatcher:
+    """
+    Per client batching window merging the updates of every subscribed service
+    into a single notify_batch frame, flushes are aligned on a grid of the window
+    so that every client using the same window is flushed at the same time
+    A batcher holds the payloads of a single wire format, the one of the subscriptions made with it
+    """
+
+    def __init__(self, client, window: float, batch_wire_format: str) -> None:
+        self.client = client
+        self.window: float = window
+        """Batching window in seconds"""
+
+        self.wire_format: str = batch_wire_format
+        self.payloads: list = []
+        self.flush_handle: asyncio.TimerHandle = None
+        self.flush_tasks: set[asyncio.Task] = set()
+
+    def __repr__(self) -> str:
+        return f'batcher({self.window * 1000:.0f}ms {self.wire_format}, {len(self.payloads)} pending)'
+
+    def add(self, payload) -> None:
+        """
+        Add a notify_values payload already encoded in the wire format of the batcher to the next frame
+        """
+        self.payloads.append(payload)
+        if self.flush_handle is None:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            delay: float = self.window - loop.time() % self.window
+            self.flush_handle = loop.call_later(delay, self.schedule_flush)
+
+    def schedule_flush(self) -> None:
+        self.flush_handle = None
+        task: asyncio.Task = asyncio.get_running_loop().create_task(self.flush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    async def flush(self) -> None:
+        """
+        Send the pending payloads as a single notify_batch frame
+        """
+        payloads, self.payloads = self.payloads, []
+        try:
+            await send_batch(self.client, self.wire_format, payloads)
+        except Exception as e:
+            logging.warning(f"Failed to flush batch of {self.client}: {e}")
+
+    def close(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.payloads = []
@@ -2,46 +2,104 @@
 
 from __future__ import annotations
 
+import math
 import socketio
+import time
 
-from service_scheduler.service import ADServiceWrapper
+from .wire_format import WIRE_FORMAT_JSON
+from .batcher import ADClientBatcher
 
 from logger.logger import logging
 
 class ADClient:
+    MAX_BATCH_WINDOW_MS: float = 1000.0
+    """Longest batching window a client can ask for"""
+
     def __init__(self, sid: str, server) -> None:
         self.server = server
         self.sid = sid
-        self.subscribed_services: list[ADServiceWrapper] = []
         self.connected = True
         self.username = "anonymous"
+        self.wire_format: str = WIRE_FORMAT_JSON
+        """Encoding of the values sent to this client, applied to its next subscriptions"""
+
+        self.batch_window_ms: float = 0.0
+        """Batching window of this client in milliseconds, applied to its next subscriptions, 0 to send values right away"""
+
+        self.batchers: dict[tuple[float, str], ADClientBatcher] = {}
+        """Every batcher of this client by window and wire format, the previous subscriptions keep the batcher they were made with"""
+
+        self.backlog_since: float = None
+        """Monotonic time since which the socket queue of this client is not empty, None when it was empty"""
+
+        self.session = None
+        """ADSession of this client, its token lets the client resume its subscriptions from another connection"""
 
     def __repr__(self) -> str:
         return f'{self.username}@{self.sid}'
 
-    def unsubscribe(self, service: ADServiceWrapper) -> bool:
-        try:
-            self.subscribed_services.remove(service)
-            return True
-        except:
-            return False
-
-    def unsubscribe_all(self) -> None:
-        for service in self.subscribed_services:
-            service.unsubscribe(self)
-        self.subscribed_services = []
-
-    def subscribe(self, service: ADServiceWrapper) -> bool:
-        if service not in self.subscribed_services:
-            self.subscribed_services.append(service)
-            return True
-        return False
-
-    def close(self) -> None:
+    async def close(self) -> None:
         if self.connected == True:
             self.connected = False
-            self.unsubscribe_all()
+            for batcher in self.batchers.values():
+                batcher.close()
+
+    def set_batch_window(self, window_ms: float) -> None:
+        """
+        Set the batching window of the next subscriptions, 0 disables batching,
+        the previous subscriptions keep the batcher they were made with
+        ValueError is raised when the window isn't a number between 0 and MAX_BATCH_WINDOW_MS
+        """
+        if not math.isfinite(window_ms) or not 0 <= window_ms <= self.MAX_BATCH_WINDOW_MS:
+            raise ValueError(f"batch window must be between 0 and {self.MAX_BATCH_WINDOW_MS:g}ms")
+        self.batch_window_ms = window_ms
+
+    @property
+    def batcher(self) -> ADClientBatcher:
+        """
+        Batcher of the next subscriptions, for the batching window and the wire format of this client,
+        so that each flush is a single frame, None to send values right away
+        """
+        if self.batch_window_ms == 0:
+            return None
+        key: tuple[float, str] = (self.batch_window_ms, self.wire_format)
+        if key not in self.batchers:
+            self.batchers[key] = ADClientBatcher(self, self.batch_window_ms / 1000, self.wire_format)
+        return self.batchers[key]
+
+    async def join(self, room: str) -> None:
+        await self.server.enter_room(self.sid, room)
+
+    async def leave(self, room: str) -> None:
+        await self.server.leave_room(self.sid, room)
+
+    def pending_packets(self) -> int:
+        """
+        Number of packets queued by engine.io and not yet written to the socket of this client,
+        checked on every broadcast, which also tracks since when the client is behind
+        """
+        eio_sid = self.server.manager.eio_sid_from_sid(self.sid, "/")
+        socket = self.server.eio.sockets.get(eio_sid)
+        pending_packets: int = socket.queue.qsize() if socket is not None else 0
+        if pending_packets == 0:
+            self.backlog_since = None
+        elif self.backlog_since is None:
+            self.backlog_since = time.monotonic()
+        return pending_packets
+
+    def send_lag(self) -> float:
+        """
+        Seconds since the socket queue of this client was last seen empty
+        """
+        return time.monotonic() - self.backlog_since if self.backlog_since is not None else 0.0
+
+    async def call(self, event, packet, timeout: float):
+        """
+        Send a packet and wait for the client to acknowledge it,
+        socketio.exceptions.TimeoutError is raised when it doesn't in time
+        """
+        return await self.server.call(event, packet, to=self.sid, timeout=timeout)
 
     async def send(self, event, packet) -> None:
-        logging.debug(f"Sending {packet} to {self.sid}")
+        logging.debug("Sending %s to %s", packet, self.sid)
         await self.server.emit(event, packet, to=self.sid)
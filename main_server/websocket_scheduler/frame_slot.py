@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import asyncio
+
+import socketio
+
+from logger.logger import logging
+
+FRAME_EVENT: str = "frame"
+"""Event of the frames, a dict of the frame metadata with the frame itself as a binary attachment"""
+
+
+def frame_bytes(payload: dict) -> dict:
+    """
+    Socket.IO only sends bytes as binary attachments, a memoryview frame is copied once
+    by the first slot sending it and the payload shared by the slots keeps the copy
+    """
+    if isinstance(payload["frame"], memoryview):
+        payload["frame"] = payload["frame"].tobytes()
+    return payload
+
+
+class ADFrameSlot:
+    """
+    Single slot drop-to-latest buffer of a client subscribed to a frame stream:
+    a frame is only sent once the socket queue of the client is empty and a newer
+    frame replaces the waiting one, so a slow viewer only ever gets the latest frame
+    Frames written to the socket can still wait in the kernel buffers, acknowledging
+    clients get the next frame once they handled the previous one instead
+    """
+
+    DRAIN_POLL_SECONDS: float = 0.005
+    """Period at which the socket queue of a client is checked while it is behind"""
+
+    ACK_TIMEOUT_SECONDS: float = 5.0
+    """Time after which an unacknowledged frame is given up and the latest one is sent"""
+
+    def __init__(self, client, tier: str, acknowledged: bool = False) -> None:
+        self.client = client
+        self.tier: str = tier
+        self.acknowledged: bool = acknowledged
+        """The client acknowledges each frame, the next one is only sent after it"""
+
+        self.payload: dict = None
+        """Frame waiting to be sent"""
+
+        self.ready: asyncio.Event = asyncio.Event()
+        self.sent: int = 0
+        self.dropped: int = 0
+        """Frames replaced by a newer one before being sent"""
+
+        self.task: asyncio.Task = asyncio.get_running_loop().create_task(self.send_frames())
+
+    def __repr__(self) -> str:
+        return f'frame slot({self.tier}{", acknowledged" if self.acknowledged else ""}, {self.sent} sent, {self.dropped} dropped)'
+
+    def put(self, payload: dict) -> None:
+        if self.payload is not None:
+            self.dropped += 1
+        self.payload = payload
+        self.ready.set()
+
+    async def send_frames(self) -> None:
+        while self.client.connected:
+            await self.ready.wait()
+            while self.client.connected and self.client.pending_packets() != 0:
+                await asyncio.sleep(self.DRAIN_POLL_SECONDS)
+            payload, self.payload = self.payload, None
+            self.ready.clear()
+            if payload is None or not self.client.connected:
+                continue
+            """The slot was emptied by close() or the client left while it was behind"""
+            try:
+                if self.acknowledged:
+                    await self.client.call(FRAME_EVENT, frame_bytes(payload), self.ACK_TIMEOUT_SECONDS)
+                else:
+                    await self.client.send(FRAME_EVENT, frame_bytes(payload))
+                self.sent += 1
+            except socketio.exceptions.TimeoutError:
+                logging.warning(f"{self.client} didn't acknowledge a frame within {self.ACK_TIMEOUT_SECONDS}s")
+            except Exception as e:
+                logging.warning(f"Failed to send a frame to {self.client}: {e}")
+
+    def close(self) -> None:
+        self.task.cancel()
+        self.payload = None
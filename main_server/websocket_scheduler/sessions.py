@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import secrets
+import time
+
+from service_scheduler.subscription_filter import ADSubscriptionFilter
+
+from logger.logger import logging
+
+SUBSCRIPTION_OPTIONS: list[str] = [*ADSubscriptionFilter.OPTIONS, "tier", "frame_ack"]
+"""Subscribe packet keys kept by a session to make the same subscriptions again"""
+
+
+class ADSession:
+    """
+    Subscriptions of a client kept under a token, so that the client can take them back
+    from a new connection once its previous one is lost
+    """
+
+    __slots__ = ("token", "client", "subscriptions", "detached_at")
+
+    def __init__(self, token: str, client) -> None:
+        self.token: str = token
+        self.client = client
+        """Client using the session, None once it disconnected"""
+
+        self.subscriptions: dict[str, dict] = {}
+        """Options of each subscription, with the wire format and batching window of the client when it was made"""
+
+        self.detached_at: float = None
+
+    def __repr__(self) -> str:
+        return f'session({len(self.subscriptions)} subscription(s){", detached" if self.client is None else ""})'
+
+    def remember(self, service_name: str, client, data: dict) -> None:
+        options: dict = {key: data[key] for key in SUBSCRIPTION_OPTIONS if key in data}
+        options["wire_format"] = client.wire_format
+        options["batch_window_ms"] = client.batch_window_ms
+        self.subscriptions[service_name] = options
+
+    def forget(self, service_name: str) -> None:
+        self.subscriptions.pop(service_name, None)
+
+
+class ADSessionRegistry:
+    """
+    Sessions of the connected clients and of the disconnected ones which can still be resumed,
+    expired sessions are dropped whenever a session is created or looked up
+    """
+
+    def __init__(self, linger: float) -> None:
+        self.linger: float = linger
+        """Seconds a detached session can be resumed for"""
+
+        self.sessions: dict[str, ADSession] = {}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def create(self, client) -> ADSession:
+        self.expire()
+        session: ADSession = ADSession(secrets.token_urlsafe(16), client)
+        self.sessions[session.token] = session
+        return session
+
+    def get(self, token: str) -> ADSession:
+        self.expire()
+        return self.sessions.get(token)
+
+    def detach(self, session: ADSession) -> None:
+        """
+        Keep the session of a disconnected client for linger seconds, a session without subscriptions isn't worth keeping
+        """
+        session.client = None
+        if len(session.subscriptions) == 0:
+            self.discard(session)
+            return
+        session.detached_at = time.monotonic()
+
+    def discard(self, session: ADSession) -> None:
+        self.sessions.pop(session.token, None)
+
+    def expire(self) -> None:
+        now: float = time.monotonic()
+        expired: list[ADSession] = [session for session in self.sessions.values() if session.client is None and now - session.detached_at > self.linger]
+        for session in expired:
+            self.discard(session)
+        if len(expired) != 0:
+            logging.info(f"{len(expired)} session(s) expired without being resumed")
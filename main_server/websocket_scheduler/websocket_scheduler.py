@@ -5,48 +5,132 @@ from __future__ import annotations
 import uvicorn
 import socketio
 import asyncio
+import math
+import signal
+import time
+import urllib.parse
 
 from ad_types.configuration import ADConfiguration
 
 from logger.logger import logging, LOG_FORMAT
 
 from .client import ADClient
+from .sessions import ADSession, ADSessionRegistry
+from . import wire_format
+from service_scheduler.service import ADServiceWrapper
 from service_scheduler.service_scheduler import ADServiceScheduler
+from service_scheduler.subscription_filter import ADSubscriptionFilter
+from service_scheduler.subscriptions import is_pattern
+from service_scheduler.command_queue import ADCommand
+from service_scheduler.time_series import HISTORY_MODE_BUCKETS, HISTORY_MODES, HISTORY_MAX_POINTS, HISTORY_MAX_WINDOW_SECONDS
+from metrics.metrics import metrics, ADMetricsApp
+from profiler.profiler import ADProfiler
 
 
 class WebsocketScheduler:
     """Websocket scheduler to handle packets and commands
     """
 
-    def __init__(self, configuration: ADConfiguration) -> None:
+    def __init__(self, configuration: ADConfiguration, hub_link=None) -> None:
+        self.startup_start: float = time.perf_counter()
+        self.hub_link = hub_link
+        """ADHubLink of a websocket worker whose services run in the hub, None when the services run here"""
+
+        socketio_logger: logging.Logger = logging.getLogger("socketio")
+        socketio_logger.setLevel(logging.DEBUG if configuration.logging_level.upper() == "DEBUG" else logging.WARNING)
+        """Socket.IO logs every emitted packet at the info level, which is only kept when debugging"""
+
         self.server = socketio.AsyncServer(
-            logger=logging.getLogger(), async_mode="asgi")
+            logger=socketio_logger, async_mode="asgi", transports=["websocket"] if hub_link is not None else None)
+        """Long polling requests of a client would be spread over the workers sharing the port"""
 
-        self.app = socketio.ASGIApp(self.server)
+        self.app = socketio.ASGIApp(self.server, other_asgi_app=ADMetricsApp(self), on_startup=self.on_startup)
+        """Prometheus metrics are served at /metrics next to Socket.IO"""
 
         self.clients: dict[str, ADClient] = {}
 
+        self.sessions: ADSessionRegistry = ADSessionRegistry(configuration.session_linger_seconds)
+        """Sessions of the clients, kept session_linger_seconds after they disconnect so they can be resumed"""
+
         self.service_scheduler: ADServiceScheduler = ADServiceScheduler(
-            configuration)
+            configuration, self.server, hub_link.service_wrapper if hub_link is not None else ADServiceWrapper)
+
+        self.uvicorn_server: uvicorn.Server = None
 
         self.configuration = configuration
 
+        self.profiler: ADProfiler = ADProfiler(configuration.logging_directory)
+
         logging.info(
             f"Scheduler started with {self.service_scheduler} service(s)")
 
+    async def on_startup(self) -> None:
+        if self.hub_link is not None:
+            await self.hub_link.connect(self.service_scheduler, self.on_hub_lost)
+        else:
+            self.service_scheduler.watch()
+        logging.info(f"Websocket scheduler listening {(time.perf_counter() - self.startup_start) * 1000:.1f}ms after its creation")
+        metrics.start_loop_monitor()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self.on_profile_signal)
+
+    def on_hub_lost(self) -> None:
+        if self.uvicorn_server is not None:
+            self.uvicorn_server.should_exit = True
+
+    def on_profile_signal(self) -> None:
+        """
+        SIGUSR1 starts a profile of profiling_duration seconds or ends the running one
+        """
+        if not self.profiler.stop():
+            self.profiler.start(self.configuration.profiling_duration)
+
     def client_from_sid(self, sid: str) -> ADClient:
         return self.clients[sid]
 
+    def requested_services(self, data: dict) -> list[str]:
+        """
+        Services named by a subscribe or unsubscribe packet, either a "service_name",
+        which can be a glob pattern, or a "service_names" list, None when there is neither
+        """
+        if isinstance(data.get("service_names"), list):
+            return self.service_scheduler.match([str(i) for i in data["service_names"]])
+        if "service_name" in data:
+            return self.service_scheduler.match([str(data["service_name"])])
+        return None
+
+    @staticmethod
+    def is_bulk(data: dict) -> bool:
+        """
+        Bulk and pattern requests are answered with the lists of succeeded and failed services
+        """
+        return "service_names" in data or is_pattern(str(data.get("service_name", "")))
+
     def register_callbacks(self):
         @self.server.event
         async def connect(sid, environ):
             client: ADClient = ADClient(sid, self.server)
+            query: dict[str, list[str]] = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+            if "wire_format" in query:
+                requested_wire_format: str = query["wire_format"][0]
+                if not wire_format.is_available(requested_wire_format):
+                    raise socketio.exceptions.ConnectionRefusedError(f"unsupported wire format {requested_wire_format}")
+                client.wire_format = requested_wire_format
+            if "batch_window_ms" in query:
+                try:
+                    client.set_batch_window(float(query["batch_window_ms"][0]))
+                except ValueError:
+                    raise socketio.exceptions.ConnectionRefusedError(f"invalid batch window {query['batch_window_ms'][0]}")
             self.clients[sid] = client
+            client.session = self.sessions.create(client)
+            await client.send("session", {"token": client.session.token})
 
         @self.server.event
-        def disconnect(sid):
+        async def disconnect(sid):
             client: ADClient = self.client_from_sid(sid)
-            client.close()
+            await self.service_scheduler.unsubscribe_all(client)
+            await client.close()
+            if client.session is not None:
+                self.sessions.detach(client.session)
             self.clients.pop(sid)
 
         @self.server.event
@@ -62,46 +146,213 @@ class WebsocketScheduler:
         @self.server.event
         async def get_subscriptions(sid, data) -> None:
             client: ADClient = self.client_from_sid(sid)
-            await client.send('get_subscriptions', {"subscriptions": [service.name for service in client.subscribed_services]})
+            await client.send('get_subscriptions', {"subscriptions": [subscription.service_name for subscription in self.service_scheduler.subscriptions.of_client(client)]})
 
         @self.server.event
         async def subscribe(sid, data) -> None:
             client: ADClient = self.client_from_sid(sid)
-            if not "service_name" in data:
+            service_names: list[str] = self.requested_services(data)
+            if service_names is None:
                 logging.warning(
-                    f"client {sid.client} missing \"service_name\" key in subscribe packet")
-                await client.send("subscribe", {"error": f"missing \"service_name\" key in packet"})
+                    f"client {client} missing \"service_name\" key in subscribe packet")
+                await client.send("subscribe", {"error": f"missing \"service_name\" or \"service_names\" key in packet"})
                 return
 
-            service_name: str = data["service_name"]
-            if not await self.service_scheduler.subscribe(service_name, client):
-                await client.send("subscribe", {"error": f"fail to subscribe to service {service_name}"})
+            if "wire_format" in data:
+                if not wire_format.is_available(data["wire_format"]):
+                    await client.send("subscribe", {"error": f"unsupported wire format {data['wire_format']}, available ones are {[i for i in wire_format.WIRE_FORMATS if wire_format.is_available(i)]}"})
+                    return
+                client.wire_format = data["wire_format"]
+
+            if "batch_window_ms" in data:
+                try:
+                    client.set_batch_window(float(data["batch_window_ms"]))
+                except (TypeError, ValueError):
+                    await client.send("subscribe", {"error": f"invalid \"batch_window_ms\" {data['batch_window_ms']}"})
+                    return
+
+            try:
+                ADSubscriptionFilter.from_options(data)
+            except (TypeError, ValueError) as e:
+                await client.send("subscribe", {"error": f"invalid subscribe options: {e}"})
+                return
+
+            subscribed: list[str] = []
+            failed: list[str] = []
+            for service_name in service_names:
+                subscription_filter: ADSubscriptionFilter = ADSubscriptionFilter.from_options(data)
+                """Each subscription keeps its own filter state"""
+                if await self.service_scheduler.subscribe(service_name, client, subscription_filter, data.get("tier"), bool(data.get("frame_ack", False))):
+                    subscribed.append(service_name)
+                    client.session.remember(service_name, client, data)
+                else:
+                    failed.append(service_name)
+
+            if self.is_bulk(data):
+                await client.send("subscribe", {"message": f"subscribed to {len(subscribed)} service(s)", "subscribed": subscribed, "failed": failed})
+            elif len(failed) != 0:
+                await client.send("subscribe", {"error": f"fail to subscribe to service {failed[0]}"})
             else:
-                await client.send("subscribe", {"message": f"successfully subscribed to service {service_name}"})
+                await client.send("subscribe", {"message": f"successfully subscribed to service {subscribed[0]}"})
+
+        @self.server.event
+        async def resume(sid, data) -> None:
+            """
+            Take back the subscriptions of the session "token" given to a previous connection,
+            with the "sequences" of the last values the client got from each service to be sent the ones it missed,
+            the services without a sequence, or whose missed values are gone, are sent a snapshot of their latest values
+            """
+            client: ADClient = self.client_from_sid(sid)
+            if not isinstance(data, dict) or not isinstance(data.get("token"), str) or not isinstance(data.get("sequences", {}), dict):
+                await client.send("resume", {"error": "expected a \"token\" and an optional \"sequences\" dict of service names to sequence numbers in packet"})
+                return
+            try:
+                sequences: dict[str, int] = {str(service_name): int(sequence) for service_name, sequence in data.get("sequences", {}).items()}
+            except (TypeError, ValueError) as e:
+                await client.send("resume", {"error": f"invalid sequence number: {e}"})
+                return
+            session: ADSession = self.sessions.get(data["token"])
+            if session is None or session is client.session:
+                await client.send("resume", {"error": "unknown or expired session"})
+                return
+            if session.client is not None:
+                previous: ADClient = session.client
+                logging.info(f"{client} takes the session of {previous} over")
+                previous.session = None
+                await self.service_scheduler.unsubscribe_all(previous)
+                await self.server.disconnect(previous.sid)
+            self.sessions.discard(client.session)
+            for service_name, options in client.session.subscriptions.items():
+                session.subscriptions.setdefault(service_name, options)
+            client.session, session.client = session, client
+
+            subscribed: list[str] = []
+            failed: list[str] = []
+            for service_name, options in [*session.subscriptions.items()]:
+                if self.service_scheduler.subscriptions.get(client, service_name) is not None:
+                    subscribed.append(service_name)
+                    continue
+                client.wire_format = options["wire_format"]
+                client.set_batch_window(options["batch_window_ms"])
+                if await self.service_scheduler.subscribe(service_name, client, ADSubscriptionFilter.from_options(options), options.get("tier"), bool(options.get("frame_ack", False)), sequences.get(service_name)):
+                    subscribed.append(service_name)
+                else:
+                    failed.append(service_name)
+                    session.forget(service_name)
+            logging.info(f"{client} resumed its {session}")
+            await client.send("resume", {"message": f"resumed {len(subscribed)} subscription(s)", "token": session.token, "subscribed": subscribed, "failed": failed})
+
+        @self.server.event
+        async def get_history(sid, data) -> None:
+            """
+            Values of "service_name" over the last "window_seconds" (60 by default) in a single answer of at most "max_points" points (500 by default),
+            as min/max/mean "buckets" of equal duration or as the samples kept by "lttb" downsampling, depending on "mode"
+            """
+            client: ADClient = self.client_from_sid(sid)
+            if not isinstance(data, dict) or not "service_name" in data:
+                await client.send("get_history", {"error": "missing \"service_name\" key in packet"})
+                return
+            try:
+                window_seconds: float = float(data.get("window_seconds", 60))
+                max_points: int = int(data.get("max_points", 500))
+            except (TypeError, ValueError, OverflowError) as e:
+                await client.send("get_history", {"service_name": data["service_name"], "error": f"invalid history options: {e}"})
+                return
+            mode: str = data.get("mode", HISTORY_MODE_BUCKETS)
+            if mode not in HISTORY_MODES or not math.isfinite(window_seconds) or not 0 < window_seconds <= HISTORY_MAX_WINDOW_SECONDS or not 3 <= max_points <= HISTORY_MAX_POINTS:
+                await client.send("get_history", {"service_name": data["service_name"], "error": f"expected a \"mode\" among {HISTORY_MODES}, a \"window_seconds\" in ]0, {HISTORY_MAX_WINDOW_SECONDS}] and \"max_points\" between 3 and {HISTORY_MAX_POINTS}"})
+                return
+            history: dict = await self.service_scheduler.get_history(str(data["service_name"]), window_seconds, max_points, mode)
+            if history is None:
+                await client.send("get_history", {"service_name": data["service_name"], "error": f"no history for service {data['service_name']}"})
+                return
+            await client.send("get_history", history)
+
+        @self.server.event
+        async def post(sid, data) -> None:
+            """
+            Hand values to post() of a running service, the command is acknowledged with a post event
+            carrying its "id", the echoed "timestamp" and the time it took, a "coalesce" key replaces
+            the pending command posted with the same key, true using the service name as key
+            """
+            client: ADClient = self.client_from_sid(sid)
+            if not isinstance(data, dict) or not "service_name" in data or not isinstance(data.get("values"), dict):
+                await client.send("post", {"error": f"expected a \"service_name\" and a \"values\" dict in packet"})
+                return
+            service_name: str = data["service_name"]
+            coalesce = data.get("coalesce")
+            key: str = service_name if coalesce is True else str(coalesce) if coalesce not in (None, False) else None
+            command: ADCommand = ADCommand(client, data["values"], data.get("id"), key, data.get("timestamp"))
+            if not self.service_scheduler.post(service_name, command):
+                await client.send("post", {"service_name": service_name, "id": command.command_id, "error": f"service {service_name} isn't running, subscribe to it first"})
+
+        @self.server.event
+        async def profile(sid, data) -> None:
+            client: ADClient = self.client_from_sid(sid)
+            data = data if data is not None else {}
+            if not isinstance(data, dict):
+                await client.send("profile", {"error": "expected an options dict in packet"})
+                return
+            if data.get("action", "start") == "stop":
+                if self.profiler.stop():
+                    await client.send("profile", {"message": "profile stopping"})
+                else:
+                    await client.send("profile", {"error": "no profile running"})
+                return
+            try:
+                task: asyncio.Task = self.profiler.start(float(data.get("duration_seconds", self.configuration.profiling_duration)), bool(data.get("tracemalloc", False)))
+            except (TypeError, ValueError) as e:
+                await client.send("profile", {"error": f"invalid profile options: {e}"})
+                return
+            if task is None:
+                await client.send("profile", {"error": "a profile is already running"})
+                return
+            logging.info(f"{client} started a profile")
+            await client.send("profile", {"message": "profile started"})
+            files: list[str] = await task
+            if client.connected:
+                await client.send("profile", {"message": "profile written", "files": files})
 
         @self.server.event
         async def on_unsubscribe(sid, data) -> None:
             client: ADClient = self.client_from_sid(sid)
-            if not "service_name" in data:
+            service_names: list[str] = self.requested_services(data)
+            if service_names is None:
                 logging.warning(
-                    f"client {sid.client} missing \"service_name\" key in subscribe packet")
-                await sid.client.send("subscribe", {"error": f"missing \"service_name\" key in packet"})
+                    f"client {client} missing \"service_name\" key in unsubscribe packet")
+                await client.send("subscribe", {"error": f"missing \"service_name\" or \"service_names\" key in packet"})
                 return
 
-            service_name: str = data["service_name"]
-            if not await self.service_scheduler.unsubscribe(service_name, client):
-                await client.send("subscribe", {"error": f"failed to unsubscribed from service {service_name}"})
+            unsubscribed: list[str] = []
+            failed: list[str] = []
+            for service_name in service_names:
+                if await self.service_scheduler.unsubscribe(service_name, client):
+                    unsubscribed.append(service_name)
+                    client.session.forget(service_name)
+                else:
+                    failed.append(service_name)
+
+            if self.is_bulk(data):
+                await client.send("subscribe", {"message": f"unsubscribed from {len(unsubscribed)} service(s)", "unsubscribed": unsubscribed, "failed": failed})
+            elif len(failed) != 0:
+                await client.send("subscribe", {"error": f"failed to unsubscribed from service {failed[0]}"})
             else:
-                await client.send("subscribe", {"message": f"successfully unsubscribed from service {service_name}"})
+                await client.send("subscribe", {"message": f"successfully unsubscribed from service {unsubscribed[0]}"})
 
-    def start(self) -> None:
+    def start(self, sockets: list = None) -> None:
+        """
+        Serve the websocket port, or the given listening sockets shared by the websocket workers
+        """
         logging.info("Websocket scheduler started")
         self.register_callbacks()
         try:
             log_config = uvicorn.config.LOGGING_CONFIG
             log_config["formatters"]["access"]["fmt"] = LOG_FORMAT
             log_config["formatters"]["default"]["fmt"] = LOG_FORMAT
-            uvicorn.run(self.app, host="127.0.0.1", port=self.configuration.websocket_scheduler_port, log_level=self.configuration.logging_level.lower(), ws="websockets", log_config=log_config)
+            self.uvicorn_server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.configuration.websocket_scheduler_port, log_level=self.configuration.logging_level.lower(), ws="websockets", log_config=log_config))
+            self.uvicorn_server.run(sockets=sockets)
+        except KeyboardInterrupt:
+            pass
         except Exception as e:
             logging.warning(f"Application stopped: {e}")
         logging.info("Websocket scheduler stopped")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+WIRE_FORMAT_JSON: str = "json"
+"""Default wire format, values are sent as {"service": name, "values": values, "seq": sequence} dicts"""
+
+WIRE_FORMAT_MSGPACK: str = "msgpack"
+"""MessagePack encoded [service_id, timestamp_ns, value, sequence] arrays, the value being the whole values dict for non scalar services"""
+
+WIRE_FORMAT_STRUCT: str = "struct"
+"""Fixed STRUCT_LAYOUT records, only used for scalar values, other values fall back to json"""
+
+WIRE_FORMATS: list[str] = [WIRE_FORMAT_JSON, WIRE_FORMAT_MSGPACK, WIRE_FORMAT_STRUCT]
+
+STRUCT_LAYOUT: str = "<HdQQ"
+"""Little endian uint16 service id, float64 value, uint64 timestamp in nanoseconds since epoch and uint64 sequence number"""
+
+STRUCT_PACKER: struct.Struct = struct.Struct(STRUCT_LAYOUT)
+
+
+def is_available(wire_format: str) -> bool:
+    if wire_format == WIRE_FORMAT_MSGPACK:
+        return msgpack is not None
+    return wire_format in WIRE_FORMATS
+
+
+def scalar_value(values: dict, unit: str) -> float:
+    """
+    Return the value of a {"value": number, "unit": unit} dict
+    or None when the values can't be sent without their keys
+    """
+    value = values.get("value")
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+    if any(key != "value" and key != "unit" for key in values) or values.get("unit") != unit:
+        return None
+    return value
+
+
+def encode(wire_format: str, service_id: int, service_name: str, unit: str, values: dict, timestamp_ns: int, sequence: int):
+    """
+    Encode the values of a service in the given wire format, the sequence number of the values
+    grows by one with every value of the service and is what resuming clients send back,
+    units and service names are not part of binary payloads, clients get them from the schema
+    """
+    if wire_format == WIRE_FORMAT_JSON:
+        return {"service": service_name, "values": values, "seq": sequence}
+    value: float = scalar_value(values, unit)
+    if wire_format == WIRE_FORMAT_MSGPACK:
+        return msgpack.packb([service_id, timestamp_ns, values if value is None else value, sequence])
+    if value is None:
+        return {"service": service_name, "values": values, "seq": sequence}
+    return STRUCT_PACKER.pack(service_id, value, timestamp_ns, sequence)
+
+
+def schema(service_id: int, service_name: str, unit: str) -> dict:
+    """
+    Schema of a service sent once to the binary clients
+    """
+    return {"id": service_id, "service": service_name, "unit": unit, "layout": STRUCT_LAYOUT}